@@ -1,9 +1,9 @@
-from flask import Flask, request, jsonify, send_file, url_for
+from flask import Flask, request, jsonify, send_file, url_for, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
 import os
-from models import db, Location, Item, Tag, ItemType, ItemProperty, ItemPropertyValue, ItemCategory, User, Role
+from models import db, Location, Item, Tag, ItemType, ItemProperty, ItemPropertyValue, ItemCategory, ItemFile, User, Role, Job, UploadSession, item_tags, update_property_values
 from datetime import timedelta, datetime
 from functools import wraps
 import qrcode
@@ -11,10 +11,35 @@ from PIL import Image
 from io import BytesIO
 import uuid
 from werkzeug.utils import secure_filename
-from sqlalchemy import and_
-from sqlalchemy.orm import aliased
+from sqlalchemy import and_, select
+from sqlalchemy.orm import aliased, selectinload
 import mimetypes
 from dotenv import load_dotenv
+from pagination import encode_cursor, decode_cursor, keyset_after, CursorError
+from serializers import item_load_options, load_item, serialize_item, serialize_file
+from file_manifest import absolute_storage_path, record_item_file, add_item_file, remove_item_file, main_image_names
+from blobs import store_stream
+from upload_sessions import (create_session, write_chunk, finish_session, discard_session, expire_sessions,
+                             serialize_upload, UploadError)
+from utils import normalize_filename
+from search import index_items, remove_items
+from filters import apply_item_filters, FilterError
+from facets import compute_facets
+from item_import import read_csv, import_items
+from export import export_items, EXPORT_FORMATS
+from bulk import parse_operation, run_bulk, BulkError
+from thumbnails import render_thumbnails, thumbnail_options, get_thumbnail, pick_size, FORMATS as THUMBNAIL_FORMATS
+from versions import conditional, ITEM_TABLES
+from database import configure_database, init_engines
+from cache import reference_cache
+from auth import require_permission, current_user_can
+from jobs import job_queue, serialize_job
+from scan import resolve_codes, serialize_scan, MAX_CODES
+from location_tree import check_parent, item_counts, serialize_location, LocationError
+from kits import add_subitem, remove_subitem, expand_kit, KitError
+from graph import link_graph, add_link, remove_link, unlink_items, item_summaries, GraphError, MAX_HOPS
+from labels import (render_qr, qr_payload, parse_label_request, label_rows, render_label_sheets, LabelError,
+                    QR_FORMATS, QR_SIZES)
 
 # Load environment variables
 load_dotenv()
@@ -48,34 +73,57 @@ def unauthorized_callback(error):
 
 # Database configuration
 db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inventory.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SQLALCHEMY_DATABASE_URI', f'sqlite:///{db_path}')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# SQLite profile, see database.py: WAL, one queued writer connection and a pool of read-only ones
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # milliseconds
+app.config['SQLITE_WRITE_TIMEOUT'] = float(os.environ.get('SQLITE_WRITE_TIMEOUT', 30))  # seconds in the queue
+app.config['SQLITE_READ_POOL_SIZE'] = int(os.environ.get('SQLITE_READ_POOL_SIZE', 8))
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+app.config['SQLITE_CACHE_SIZE'] = int(os.environ.get('SQLITE_CACHE_SIZE', -32000))  # negative: KiB per connection
+configure_database(app)
 
 # Upload configuration
 app.config['UPLOAD_FOLDER'] = os.path.join(app.static_folder, 'uploads')
 app.config['PICTURES_FOLDER'] = os.path.join(app.static_folder, 'pictures')
+# Content-addressed store for new files, see blobs.py
+app.config['BLOBS_FOLDER'] = os.path.join(app.static_folder, 'blobs')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx'}
+# Chunked uploads, each chunk is a request of its own below MAX_CONTENT_LENGTH
+app.config['MAX_UPLOAD_SIZE'] = int(os.environ.get('MAX_UPLOAD_SIZE', 2 * 1024 * 1024 * 1024))
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024
+app.config['UPLOAD_SESSION_TTL'] = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 60 * 60))
+
+# Thumbnail edge lengths in pixels, served via ?size= on the image and file endpoints
+app.config['THUMBNAIL_SIZES'] = [int(size) for size in os.environ.get('THUMBNAIL_SIZES', '128,512,1280').split(',')]
+app.config['THUMBNAIL_QUALITY'] = 82
+
+# Item list pagination
+app.config['ITEMS_PAGE_SIZE'] = int(os.environ.get('ITEMS_PAGE_SIZE', 100))
+app.config['ITEMS_MAX_PAGE_SIZE'] = int(os.environ.get('ITEMS_MAX_PAGE_SIZE', 1000))
+app.config['ITEMS_STREAM_BATCH_SIZE'] = 500
+app.config['ITEMS_IMPORT_CHUNK_SIZE'] = int(os.environ.get('ITEMS_IMPORT_CHUNK_SIZE', 2000))
+app.config['ITEMS_BULK_CHUNK_SIZE'] = int(os.environ.get('ITEMS_BULK_CHUNK_SIZE', 500))
+# Seconds before commits of other worker processes show up in ETags
+app.config['CHANGE_VERSION_TTL'] = float(os.environ.get('CHANGE_VERSION_TTL', 1.0))
+# Upper bound on the age of cached locations, types, tags and categories
+app.config['REFERENCE_CACHE_TTL'] = float(os.environ.get('REFERENCE_CACHE_TTL', 300))
+
+# Background jobs, threads run the jobs and processes their image work
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_PROCESS_WORKERS'] = int(os.environ.get('JOB_PROCESS_WORKERS', min(4, os.cpu_count() or 1)))
 
 # Create upload directories
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'items'), exist_ok=True)
 os.makedirs(app.config['PICTURES_FOLDER'], exist_ok=True)
 os.makedirs(os.path.join(app.config['PICTURES_FOLDER'], 'items'), exist_ok=True)
+os.makedirs(app.config['BLOBS_FOLDER'], exist_ok=True)
 
 db.init_app(app)
-
-def require_permission(permission):
-    def decorator(fn):
-        @wraps(fn)
-        def wrapper(*args, **kwargs):
-            user_id = int(get_jwt_identity())
-            user = User.query.get(user_id)
-            if not user or not user.has_permission(permission):
-                return jsonify({'error': 'Insufficient permissions'}), 403
-            return fn(*args, **kwargs)
-        return wrapper
-    return decorator
+init_engines(app, db)
+job_queue.init_app(app)
 
 @app.route('/api/auth/login', methods=['POST'])
 def login():
@@ -174,86 +222,72 @@ def get_current_user():
 # Protect existing routes with JWT and permissions
 @app.route('/api/items', methods=['GET', 'POST'])
 @jwt_required()
+@conditional(*ITEM_TABLES)
 def get_or_create_items():
     if request.method == 'GET':
         try:
             # Build query
-            query = Item.query
-
-            # Apply search filter
-            if request.args.get('search'):
-                search = f"%{request.args.get('search')}%"
-                query = query.filter(Item.name.ilike(search))
+            query = Item.query.options(*item_load_options())
 
-            # Apply location filter
-            if request.args.get('location_id'):
-                query = query.filter(Item.location_id == request.args.get('location_id'))
+            # Apply search, location, type and property filters
+            query, rank = apply_item_filters(query, request.args)
 
-            # Apply item type filter
-            if request.args.get('item_type_id'):
-                query = query.filter(Item.item_type_id == request.args.get('item_type_id'))
+            # Search results are ordered by relevance, everything else by creation.
+            # Keyset pagination on (sort key, id) keeps deep pages as cheap as the first one
+            sort_key = rank if rank is not None else Item.created_at
+            sort_columns = (sort_key, Item.id)
+            query = query.add_columns(sort_key.label('sort_key')).order_by(*sort_columns)
 
-            # Apply property filters
-            for key, value in request.args.items():
-                if key.startswith('property_'):
+            cursor = request.args.get('cursor')
+            if cursor:
+                last_key, last_id = decode_cursor(cursor, 2)
+                if rank is None:
                     try:
-                        property_id = int(key.split('_')[1])
-                        # Join with property values and filter
-                        query = query.join(ItemPropertyValue).filter(
-                            ItemPropertyValue.property_id == property_id,
-                            ItemPropertyValue.value_text.ilike(f'%{value}%')
-                        )
-                    except (ValueError, IndexError):
-                        continue
-
-            # Execute query and get items
-            items = query.all()
-
-            # Get files for each item
-            result = []
-            for item in items:
-                # Get item files
-                type_folder = normalize_filename(item.item_type.name)
-                item_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'items', type_folder, item.id)
-                files = []
-                if os.path.exists(item_folder):
-                    for filename in os.listdir(item_folder):
-                        file_path = os.path.join(item_folder, filename)
-                        if os.path.isfile(file_path):
-                            files.append(get_file_info(item.id, type_folder, filename, file_path))
-
-                result.append({
-                    'id': item.id,
-                    'name': item.name,
-                    'location_id': item.location_id,
-                    'item_type_id': item.item_type_id,
-                    'created_at': item.created_at.isoformat(),
-                    'location': {
-                        'id': item.location.id,
-                        'name': item.location.name
-                    } if item.location else None,
-                    'item_type': {
-                        'id': item.item_type.id,
-                        'name': item.item_type.name,
-                        'normalized_name': normalize_filename(item.item_type.name)  # Add normalized name
-                    },
-                    'property_values': [{
-                        'property_id': value.property_id,
-                        'property_name': value.property.name,
-                        'property_type': value.property.property_type,
-                        'value': value.get_typed_value()
-                    } for value in item.property_values],
-                    'files': files
-                })
-
-            return jsonify(result)
+                        last_key = datetime.fromisoformat(last_key)
+                    except (TypeError, ValueError):
+                        raise CursorError('Invalid cursor')
+                query = query.filter(keyset_after(sort_columns, [last_key, last_id]))
+
+            limit = request.args.get('limit', type=int)
+            if limit is not None or cursor:
+                limit = max(1, min(limit or app.config['ITEMS_PAGE_SIZE'], app.config['ITEMS_MAX_PAGE_SIZE']))
+
+            # Stream newline-delimited JSON, one item per line, without building the full list
+            if request.args.get('format') == 'ndjson':
+                if limit is not None:
+                    query = query.limit(limit)
+
+                def generate():
+                    for item, _ in query.yield_per(app.config['ITEMS_STREAM_BATCH_SIZE']):
+                        yield app.json.dumps(serialize_item(item)) + '\n'
+
+                return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+            # Without limit/cursor the full list is returned as before
+            if limit is None:
+                return jsonify([serialize_item(item) for item, _ in query.all()])
+
+            rows = query.limit(limit + 1).all()
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last_item, last_key = rows[-1]
+                next_cursor = encode_cursor([last_key if rank is not None else last_key.isoformat(), last_item.id])
+
+            return jsonify({
+                'items': [serialize_item(item) for item, _ in rows],
+                'next_cursor': next_cursor
+            })
+
+        except (CursorError, FilterError) as e:
+            return jsonify({'error': str(e)}), 400
 
         except Exception as e:
             print(f"Error fetching items: {str(e)}")
             return jsonify({'error': str(e)}), 500
 
     elif request.method == 'POST':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('edit_items'):
+        if not current_user_can('edit_items'):
             return jsonify({'error': 'Insufficient permissions'}), 403
 
         try:
@@ -282,96 +316,156 @@ def get_or_create_items():
                         value.set_typed_value(pv_data['value'])
                         db.session.add(value)
 
+            db.session.flush()
+            index_items([item.id], replace=False)
             db.session.commit()
 
-            return jsonify({
-                'id': item.id,
-                'name': item.name,
-                'location_id': item.location_id,
-                'item_type_id': item.item_type_id,
-                'created_at': item.created_at.isoformat(),
-                'location': {
-                    'id': item.location.id,
-                    'name': item.location.name
-                } if item.location else None,
-                'item_type': {
-                    'id': item.item_type.id,
-                    'name': item.item_type.name
-                },
-                'property_values': [{
-                    'property_id': value.property_id,
-                    'property_name': value.property.name,
-                    'property_type': value.property.property_type,
-                    'value': value.get_typed_value()
-                } for value in item.property_values],
-                'files': []
-            }), 201
+            return jsonify(serialize_item(load_item(item.id))), 201
 
         except Exception as e:
             db.session.rollback()
             print(f"Error creating item: {str(e)}")
             return jsonify({'error': str(e)}), 500
 
-@app.route('/api/items/<item_id>', methods=['GET', 'PUT', 'DELETE'])
+@app.route('/api/items/facets', methods=['GET'])
 @jwt_required()
+@require_permission('view_items')
+@conditional(*ITEM_TABLES)
+def get_item_facets():
+    try:
+        buckets = max(1, min(request.args.get('buckets', 10, type=int), 50))
+        return jsonify(compute_facets(request.args, buckets))
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error computing facets: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/items/import', methods=['POST'])
+@jwt_required()
+@require_permission('add_items')
+def import_items_endpoint():
+    """Import a JSON array or CSV upload of items of one item type"""
+    item_type_id = request.args.get('item_type_id') or request.form.get('item_type_id')
+    try:
+        upload = request.files.get('file')
+        if upload:
+            rows = read_csv(upload.read())
+        elif request.mimetype == 'text/csv':
+            rows = read_csv(request.get_data())
+        else:
+            data = request.get_json(silent=True)
+            if isinstance(data, dict):
+                item_type_id = item_type_id or data.get('item_type_id')
+                data = data.get('items')
+            if not isinstance(data, list):
+                return jsonify({'error': 'Expected a JSON array of items or a CSV file'}), 400
+            rows = data
+
+        if not item_type_id:
+            return jsonify({'error': 'item_type_id is required'}), 400
+        item_type = ItemType.query.options(selectinload(ItemType.properties)).get(item_type_id)
+        if not item_type:
+            return jsonify({'error': 'Item type not found'}), 404
+
+        result = import_items(item_type, rows, app.config['ITEMS_IMPORT_CHUNK_SIZE'])
+        status = 400 if result['failed'] and not result['imported'] else 200
+        return jsonify(result), status
+    except UnicodeDecodeError:
+        return jsonify({'error': 'CSV files must be UTF-8 encoded'}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error importing items: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/items/export', methods=['GET'])
+@jwt_required()
+@require_permission('view_items')
+def export_items_endpoint():
+    """Stream the items of one item type as CSV or JSON Lines, one column per property"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format, use one of {', '.join(EXPORT_FORMATS)}"}), 400
+    item_type_id = request.args.get('item_type_id')
+    if not item_type_id:
+        return jsonify({'error': 'item_type_id is required'}), 400
+    item_type = ItemType.query.get_or_404(item_type_id)
+
+    try:
+        chunks = export_items(item_type, request.args, export_format, app.config['ITEMS_STREAM_BATCH_SIZE'])
+        # Fail before the response starts, e.g. on invalid filters
+        first = next(chunks, '')
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        yield first
+        yield from chunks
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = app.response_class(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="{normalize_filename(item_type.name)}.{export_format}"'
+    )
+    return response
+
+@app.route('/api/items/bulk', methods=['POST'])
+@jwt_required()
+def bulk_update_items():
+    """Move, retag or delete the items given by ids or by a list filter"""
+    try:
+        operation = parse_operation(request.get_json(silent=True))
+    except (BulkError, TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    if not current_user_can('delete_items' if operation['delete'] else 'edit_items'):
+        return jsonify({'error': 'Insufficient permissions'}), 403
+
+    progress = run_bulk(operation, app.config['ITEMS_BULK_CHUNK_SIZE'])
+    try:
+        # Counts the targets, invalid filters fail here before anything changed
+        status = next(progress)
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Report progress as newline-delimited JSON, one line per committed chunk
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            yield app.json.dumps(status) + '\n'
+            try:
+                for step in progress:
+                    yield app.json.dumps(step) + '\n'
+            except Exception as e:
+                print(f"Error in bulk operation: {str(e)}")
+                yield app.json.dumps({'error': str(e)}) + '\n'
+
+        return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    try:
+        for status in progress:
+            pass
+        return jsonify(status)
+    except Exception as e:
+        print(f"Error in bulk operation: {str(e)}")
+        return jsonify({'error': str(e), 'processed': status['processed'], 'total': status['total']}), 500
+
+@app.route('/api/items/<item_id>', methods=['GET', 'PUT', 'PATCH', 'DELETE'])
+@jwt_required()
+@conditional(*ITEM_TABLES)
 def get_update_delete_item(item_id):
-    item = Item.query.get_or_404(item_id)
+    item = load_item(item_id)
     
     if request.method == 'GET':
-        # Get files from filesystem
-        type_folder = normalize_filename(item.item_type.name)
-        item_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'items', type_folder, item_id)
-        files = []
-        if os.path.exists(item_folder):
-            for filename in os.listdir(item_folder):
-                file_path = os.path.join(item_folder, filename)
-                if os.path.isfile(file_path):
-                    files.append(get_file_info(item_id, type_folder, filename, file_path))
-
-        return jsonify({
-            'id': item.id,
-            'name': item.name,
-            'location_id': item.location_id,
-            'item_type_id': item.item_type_id,
-            'created_at': item.created_at.isoformat(),
-            'location': {
-                'id': item.location.id,
-                'name': item.location.name
-            } if item.location else None,
-            'item_type': {
-                'id': item.item_type.id,
-                'name': item.item_type.name,
-                'normalized_name': normalize_filename(item.item_type.name)
-            },
-            'property_values': [{
-                'property_id': value.property_id,
-                'property_name': value.property.name,
-                'property_type': value.property.property_type,
-                'value': value.get_typed_value()
-            } for value in item.property_values],
-            'files': files
-        })
+        return jsonify(serialize_item(item))
     
-    elif request.method == 'PUT':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('edit_items'):
+    elif request.method in ('PUT', 'PATCH'):
+        if not current_user_can('edit_items'):
             return jsonify({'error': 'Insufficient permissions'}), 403
         
         # Handle image upload if present
         if 'image' in request.files:
             file = request.files['image']
             if file.filename != '' and allowed_file(file.filename):
-                # Create type-specific folder
-                type_folder = normalize_filename(item.item_type.name)
-                item_folder = os.path.join(app.config['PICTURES_FOLDER'], 'items', type_folder)
-                os.makedirs(item_folder, exist_ok=True)
-                
-                # Use item_id as filename with original extension
-                ext = os.path.splitext(file.filename)[1].lower()
-                safe_filename = f"{item_id}{ext}"
-                file_path = os.path.join(item_folder, safe_filename)
-                
-                # Save new file
-                file.save(file_path)
+                save_item_image(item, file)
         
         # Handle form data
         data = request.form.to_dict() if request.form else request.json
@@ -392,72 +486,38 @@ def get_update_delete_item(item_id):
                 import json
                 property_values = json.loads(property_values)
             
-            # Remove existing property values
-            for pv in item.property_values:
-                db.session.delete(pv)
+            # Either [{'property_id': 1, 'value': ...}, ...] or {'1': ..., ...}
+            if isinstance(property_values, dict):
+                submitted = {int(property_id): value for property_id, value in property_values.items()}
+            else:
+                submitted = {int(pv_data['property_id']): pv_data.get('value') for pv_data in property_values}
             
-            # Add new property values
-            for pv_data in property_values:
-                # Get the property first
-                property = ItemProperty.query.get(pv_data['property_id'])
-                if property and property.item_type_id == item.item_type_id:
-                    value = ItemPropertyValue(
-                        item=item,
-                        property=property
-                    )
-                    value.set_typed_value(pv_data['value'])
-                    db.session.add(value)
+            # PUT replaces all values, PATCH only touches the submitted ones
+            try:
+                update_property_values(item, submitted, partial=(request.method == 'PATCH'))
+            except ValueError as e:
+                db.session.rollback()
+                return jsonify({'error': str(e)}), 400
         
+        if db.session.dirty or db.session.new or db.session.deleted:
+            index_items([item.id])
         db.session.commit()
         
-        # Get updated files from filesystem
-        type_folder = normalize_filename(item.item_type.name)
-        item_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'items', type_folder, item_id)
-        files = []
-        if os.path.exists(item_folder):
-            for filename in os.listdir(item_folder):
-                file_path = os.path.join(item_folder, filename)
-                if os.path.isfile(file_path):
-                    files.append(get_file_info(item_id, type_folder, filename, file_path))
-        
         # Return updated item
-        return jsonify({
-            'id': item.id,
-            'name': item.name,
-            'location_id': item.location_id,
-            'item_type_id': item.item_type_id,
-            'created_at': item.created_at.isoformat(),
-            'location': {
-                'id': item.location.id,
-                'name': item.location.name
-            } if item.location else None,
-            'item_type': {
-                'id': item.item_type.id,
-                'name': item.item_type.name
-            },
-            'property_values': [{
-                'property_id': value.property_id,
-                'property_name': value.property.name,
-                'property_type': value.property.property_type,
-                'value': value.get_typed_value()
-            } for value in item.property_values],
-            'files': files
-        })
+        return jsonify(serialize_item(load_item(item_id)))
     
     elif request.method == 'DELETE':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('delete_items'):
+        if not current_user_can('delete_items'):
             return jsonify({'error': 'Insufficient permissions'}), 403
         
         # Delete item's files
-        type_folder = normalize_filename(item.item_type.name)
-        item_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'items', type_folder, item_id)
-        if os.path.exists(item_folder):
-            for filename in os.listdir(item_folder):
-                file_path = os.path.join(item_folder, filename)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-            os.rmdir(item_folder)
+        for item_file in list(item.files):
+            remove_item_file(item_file)
+        for upload in UploadSession.query.filter_by(item_id=item.id):
+            discard_session(upload)
         
+        remove_items([item.id])
+        unlink_items([item.id])
         db.session.delete(item)
         db.session.commit()
         return jsonify({'message': 'Item deleted successfully'})
@@ -466,50 +526,57 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
-def normalize_filename(filename):
-    """Normalize filename by replacing umlauts and special characters"""
-    replacements = {
-        'ä': 'ae',
-        'ö': 'oe',
-        'ü': 'ue',
-        'ß': 'ss',
-        ' ': '_'
-    }
-    filename = filename.lower()
-    for char, replacement in replacements.items():
-        filename = filename.replace(char, replacement)
-    return secure_filename(filename)
-
-def get_file_info(item_id, type_folder, filename, file_path):
-    """Get file information including the correct relative path"""
-    # Determine if the file is an image based on its extension
-    is_image = any(filename.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif'])
-    
-    if is_image:
-        # For images, use {type_folder}/{item_id}.jpg format
-        ext = os.path.splitext(filename)[1].lower()
-        relative_path = f'pictures/items/{type_folder}/{item_id}{ext}'
-    else:
-        # For other files, keep them in uploads with original names
-        relative_path = os.path.join('uploads', 'items', type_folder, str(item_id), filename).replace('\\', '/')
-    
-    return {
-        'filename': relative_path,
-        'original_filename': filename,
-        'size': os.path.getsize(file_path),
-        'mime_type': mimetypes.guess_type(filename)[0],
-        'is_image': is_image
-    }
-
-def get_storage_folder(item_id, type_folder, filename):
-    """Determine the correct storage folder based on file type"""
-    is_image = any(filename.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif'])
-    if is_image:
-        # For images, store in pictures/items/{type_folder}
-        return os.path.join(app.config['PICTURES_FOLDER'], 'items', type_folder)
-    else:
-        # For other files, keep the full path structure
-        return os.path.join(app.config['UPLOAD_FOLDER'], 'items', type_folder, str(item_id))
+def save_item_image(item, file):
+    """Store the item's main image, recorded under the name {item_id}{ext}"""
+    ext = os.path.splitext(file.filename)[1].lower()
+    name = f"{item.id}{ext}"
+    blob = store_stream(file.stream, ext)
+    previous = ItemFile.query.filter(ItemFile.item_id == item.id,
+                                     ItemFile.original_filename.in_(main_image_names(item.id))).all()
+    for item_file in previous:
+        if item_file.original_filename == name and item_file.blob_sha256 == blob.sha256:
+            return item_file
+
+    # Record the new image before dropping the old one, they may share their content
+    item_file = record_item_file(item, blob, name)
+    for old_file in previous:
+        remove_item_file(old_file)
+    job_queue.enqueue('process_file', item_file=item_file)
+    return item_file
+
+@job_queue.handler('process_file')
+def process_item_file(job):
+    """Post-process an uploaded file, rendering the thumbnails of images"""
+    item_file = db.session.get(ItemFile, job.item_file_id)
+    if item_file is None:
+        return  # Deleted before the job ran
+    file_path = absolute_storage_path(item_file.filename)
+    if item_file.is_image:
+        job_queue.run_cpu(render_thumbnails, file_path, *thumbnail_options())
+
+def send_image(file_path):
+    """Send an image, or its thumbnail when a size is requested"""
+    size = request.args.get('size', type=int)
+    if not size:
+        return send_file(file_path)
+
+    thumbnail_format = request.args.get('format')
+    negotiated = thumbnail_format is None
+    if negotiated:
+        accepts_webp = any(value == 'image/webp' for value, _ in request.accept_mimetypes)
+        thumbnail_format = 'webp' if accepts_webp else 'jpeg'
+    if thumbnail_format not in THUMBNAIL_FORMATS:
+        return jsonify({'error': f"Unsupported format, use one of {', '.join(THUMBNAIL_FORMATS)}"}), 400
+
+    try:
+        thumbnail = get_thumbnail(file_path, pick_size(size), thumbnail_format)
+    except Exception as e:
+        print(f"Error generating thumbnail for {file_path}: {str(e)}")
+        return send_file(file_path)
+    response = send_file(thumbnail, mimetype=f'image/{thumbnail_format}')
+    if negotiated:
+        response.vary.add('Accept')
+    return response
 
 @app.route('/api/items/<item_id>/files', methods=['GET'])
 @jwt_required()
@@ -517,23 +584,15 @@ def get_item_files(item_id):
     if not get_jwt_identity():
         return jsonify({'error': 'Insufficient permissions'}), 403
         
-    item = Item.query.get_or_404(item_id)
-    type_folder = normalize_filename(item.item_type.name)
-    item_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'items', type_folder, item_id)
-    
-    files = []
-    if os.path.exists(item_folder):
-        for filename in os.listdir(item_folder):
-            file_path = os.path.join(item_folder, filename)
-            if os.path.isfile(file_path):
-                files.append(get_file_info(item_id, type_folder, filename, file_path))
+    Item.query.get_or_404(item_id)
+    files = ItemFile.query.filter_by(item_id=item_id).order_by(ItemFile.is_image.desc(), ItemFile.id).all()
     
-    return jsonify({'files': files})
+    return jsonify({'files': [serialize_file(item_file) for item_file in files]})
 
 @app.route('/api/items/<item_id>/files', methods=['POST'])
 @jwt_required()
 def upload_item_files(item_id):
-    if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('edit_items'):
+    if not current_user_can('edit_items'):
         return jsonify({'error': 'Insufficient permissions'}), 403
         
     item = Item.query.get_or_404(item_id)
@@ -544,72 +603,224 @@ def upload_item_files(item_id):
     files = request.files.getlist('files[]')
     uploaded_files = []
     
-    # Create type and item specific folders
-    type_folder = normalize_filename(item.item_type.name)
-    
     for file in files:
         if file.filename == '':
             continue
             
         if file and allowed_file(file.filename):
-            # Save file with original filename (sanitized)
+            # Store content once, the item refers to it under its original filename (sanitized)
             safe_filename = secure_filename(file.filename)
+            blob = store_stream(file.stream, os.path.splitext(safe_filename)[1])
             
-            # Get the appropriate storage folder
-            item_folder = get_storage_folder(item_id, type_folder, safe_filename)
-            os.makedirs(item_folder, exist_ok=True)
-            
-            file_path = os.path.join(item_folder, safe_filename)
-            
-            # If file exists, append number
-            base, ext = os.path.splitext(safe_filename)
-            counter = 1
-            while os.path.exists(file_path):
-                safe_filename = f"{base}_{counter}{ext}"
-                file_path = os.path.join(item_folder, safe_filename)
-                counter += 1
-            
-            # Save file
-            file.save(file_path)
-            
-            # Get file info using the helper function
-            file_info = get_file_info(item_id, type_folder, safe_filename, file_path)
-            uploaded_files.append(file_info)
+            # Add it to the manifest, processing continues in the background
+            item_file = add_item_file(item, blob, safe_filename)
+            uploaded_files.append((item_file, job_queue.enqueue('process_file', item_file=item_file)))
+    
+    db.session.commit()
+    
+    return jsonify({
+        'files': [serialize_file(item_file) for item_file, _ in uploaded_files],
+        'jobs': [serialize_job(job) for _, job in uploaded_files]
+    })
+
+@app.route('/api/items/<item_id>/jobs', methods=['GET'])
+@jwt_required()
+@require_permission('view_items')
+def get_item_jobs(item_id):
+    """Processing state of the item's files, latest job per file"""
+    Item.query.get_or_404(item_id)
+    jobs = Job.query.filter_by(item_id=item_id).order_by(Job.id.desc()).limit(100).all()
+    latest = {}
+    for job in jobs:
+        latest.setdefault(job.item_file_id, job)
+    files = {item_file.id: item_file for item_file in ItemFile.query.filter(ItemFile.id.in_(latest))}
+    return jsonify({'files': [{
+        **serialize_job(job),
+        'filename': files[file_id].filename if file_id in files else None,
+        'original_filename': files[file_id].original_filename if file_id in files else None
+    } for file_id, job in latest.items()]})
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+@jwt_required()
+@require_permission('view_items')
+def get_job(job_id):
+    return jsonify(serialize_job(Job.query.get_or_404(job_id)))
+
+@app.route('/api/items/<item_id>/subitems', methods=['POST'])
+@jwt_required()
+@require_permission('edit_items')
+def create_subitem(item_id):
+    """Add {"subitem_id": ...} to the item's sub-items"""
+    Item.query.get_or_404(item_id)
+    try:
+        add_subitem(item_id, (request.json or {}).get('subitem_id'))
+    except KitError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status
+    db.session.commit()
+    return jsonify({'message': 'Sub-item added successfully'}), 201
+
+@app.route('/api/items/<item_id>/subitems/<subitem_id>', methods=['DELETE'])
+@jwt_required()
+@require_permission('edit_items')
+def delete_subitem(item_id, subitem_id):
+    if not remove_subitem(item_id, subitem_id):
+        db.session.rollback()
+        return jsonify({'error': 'Not a sub-item of this item'}), 404
+    db.session.commit()
+    return jsonify({'message': 'Sub-item removed successfully'})
+
+@app.route('/api/items/<item_id>/kit', methods=['GET'])
+@jwt_required()
+@require_permission('view_items')
+@conditional(*ITEM_TABLES)
+def get_item_kit(item_id):
+    """The item's sub-items to any depth as a flattened pack list with counts"""
+    kit = expand_kit(item_id)
+    if kit is None:
+        return jsonify({'error': 'Item not found'}), 404
+    return jsonify(kit)
+
+@app.route('/api/items/<item_id>/links', methods=['GET', 'POST'])
+@jwt_required()
+@require_permission({'GET': 'view_items', 'POST': 'edit_items'})
+@conditional('items', 'item_types', 'item_links')
+def item_links_view(item_id):
+    """Linked items up to ?hops= links away in either direction (GET) or link {"item_id": ...} (POST)"""
+    Item.query.get_or_404(item_id)
+    if request.method == 'POST':
+        try:
+            add_link(item_id, (request.json or {}).get('item_id'))
+        except GraphError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), e.status
+        db.session.commit()
+        return jsonify({'message': 'Items linked successfully'}), 201
     
-    return jsonify({'files': uploaded_files})
+    hops = request.args.get('hops', 1, type=int)
+    if not 1 <= hops <= MAX_HOPS:
+        return jsonify({'error': f'hops must be between 1 and {MAX_HOPS}'}), 400
+    distances = link_graph.neighbourhood(item_id, hops)
+    items, truncated = item_summaries(distances)
+    return jsonify({'id': item_id, 'hops': hops, 'count': len(distances), 'items': items, 'truncated': truncated})
+
+@app.route('/api/items/<item_id>/links/<other_id>', methods=['DELETE'])
+@jwt_required()
+@require_permission('edit_items')
+def delete_item_link(item_id, other_id):
+    if not remove_link(item_id, other_id):
+        db.session.rollback()
+        return jsonify({'error': 'Items are not linked'}), 404
+    db.session.commit()
+    return jsonify({'message': 'Link removed successfully'})
+
+@app.route('/api/items/<item_id>/component', methods=['GET'])
+@jwt_required()
+@require_permission('view_items')
+@conditional('items', 'item_types', 'item_links')
+def get_item_component(item_id):
+    """Every item connected to the item through links, e.g. everything of one production"""
+    Item.query.get_or_404(item_id)
+    adjacency = link_graph.component(item_id)
+    distances = {item_id: 0, **link_graph.neighbourhood(item_id, None)}
+    items, truncated = item_summaries(distances)
+    return jsonify({
+        'id': item_id,
+        'size': len(distances),
+        'links': sum(len(neighbours) for neighbours in adjacency.values()) // 2,
+        'items': items,
+        'truncated': truncated
+    })
+
+@app.route('/api/items/<item_id>/uploads', methods=['POST'])
+@jwt_required()
+@require_permission('edit_items')
+def create_upload(item_id):
+    """Start a chunked upload, chunks are sent with PUT /api/uploads/<id>"""
+    item = Item.query.get_or_404(item_id)
+    data = request.json or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type'}), 400
+    
+    expire_sessions()
+    try:
+        upload = create_session(item, filename, data.get('size'))
+    except UploadError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status
+    db.session.commit()
+    return jsonify(serialize_upload(upload)), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+@jwt_required()
+@require_permission('edit_items')
+def upload_session(upload_id):
+    """Offset to resume from (GET), the next chunk with a Content-Range header (PUT) or abort (DELETE)"""
+    upload = UploadSession.query.get_or_404(upload_id)
+    
+    if request.method == 'PUT':
+        try:
+            write_chunk(upload, request.stream, request.headers.get('Content-Range'))
+        except UploadError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e), 'offset': db.session.get(UploadSession, upload_id).received}), e.status
+    
+    elif request.method == 'DELETE':
+        discard_session(upload)
+        db.session.commit()
+        return jsonify({'message': 'Upload discarded'})
+    
+    return jsonify(serialize_upload(upload))
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+@require_permission('edit_items')
+def complete_upload(upload_id):
+    """Add a completely received upload to the item's files, optionally checking its sha256"""
+    upload = UploadSession.query.get_or_404(upload_id)
+    item = Item.query.get_or_404(upload.item_id)
+    data = request.get_json(silent=True) or {}
+    try:
+        blob = finish_session(upload, data.get('sha256'))
+    except UploadError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status
+    
+    item_file = add_item_file(item, blob, upload.filename)
+    job = job_queue.enqueue('process_file', item_file=item_file)
+    db.session.commit()
+    return jsonify({'file': serialize_file(item_file), 'job': serialize_job(job)})
 
 @app.route('/api/items/<item_id>/files/<path:filename>', methods=['DELETE'])
 @jwt_required()
 def delete_item_file(item_id, filename):
-    if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('edit_items'):
+    if not current_user_can('edit_items'):
         return jsonify({'error': 'Insufficient permissions'}), 403
         
     item = Item.query.get_or_404(item_id)
     
-    # Ensure the file is in the correct folder
-    type_folder = normalize_filename(item.item_type.name)
-    item_folder = get_storage_folder(item_id, type_folder, filename)
-    file_path = os.path.join(item_folder, secure_filename(os.path.basename(filename)))
-    
-    if not os.path.exists(file_path):
+    # Files are addressed by their stored name or their static-relative path
+    item_file = ItemFile.query.filter(
+        ItemFile.item_id == item.id,
+        (ItemFile.original_filename == filename) | (ItemFile.filename == filename)
+    ).first()
+    if not item_file:
         return jsonify({'error': 'File not found'}), 404
     
-    # Delete physical file
-    os.remove(file_path)
-    
-    # Remove folder if empty
-    if not os.listdir(item_folder):
-        os.rmdir(item_folder)
+    # Delete physical file and its manifest entry
+    remove_item_file(item_file)
+    db.session.commit()
     
     return jsonify({'message': 'File deleted successfully'})
 
 @app.route('/api/items/<item_id>/image', methods=['POST'])
 @jwt_required()
 def upload_item_image(item_id):
-    if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('edit_items'):
+    if not current_user_can('edit_items'):
         return jsonify({'error': 'Insufficient permissions'}), 403
         
-    item = Item.query.get_or_404(item_id)
+    item = load_item(item_id)
     
     if 'image' not in request.files:
         return jsonify({'error': 'No image file provided'}), 400
@@ -619,44 +830,10 @@ def upload_item_image(item_id):
         return jsonify({'error': 'No selected file'}), 400
         
     if file and allowed_file(file.filename):
-        # Create type-specific folder
-        type_folder = normalize_filename(item.item_type.name)
-        item_folder = os.path.join(app.config['PICTURES_FOLDER'], 'items', type_folder)
-        os.makedirs(item_folder, exist_ok=True)
-        
-        # Use item_id as filename with original extension
-        ext = os.path.splitext(file.filename)[1].lower()
-        safe_filename = f"{item_id}{ext}"
-        file_path = os.path.join(item_folder, safe_filename)
-        
-        # Save new file
-        file.save(file_path)
-        
-        # Get file info using the helper function
-        file_info = get_file_info(item_id, type_folder, safe_filename, file_path)
+        save_item_image(item, file)
+        db.session.commit()
         
-        return jsonify({
-            'id': item.id,
-            'name': item.name,
-            'location_id': item.location_id,
-            'item_type_id': item.item_type_id,
-            'created_at': item.created_at.isoformat(),
-            'location': {
-                'id': item.location.id,
-                'name': item.location.name
-            } if item.location else None,
-            'item_type': {
-                'id': item.item_type.id,
-                'name': item.item_type.name
-            },
-            'property_values': [{
-                'property_id': value.property_id,
-                'property_name': value.property.name,
-                'property_type': value.property.property_type,
-                'value': value.get_typed_value()
-            } for value in item.property_values],
-            'files': [file_info]
-        })
+        return jsonify(serialize_item(load_item(item_id)))
     
     return jsonify({'error': 'Invalid file type'}), 400
 
@@ -674,6 +851,16 @@ def get_users():
         'created_at': user.created_at.isoformat()
     } for user in users])
 
+@app.route('/api/cache/stats', methods=['GET'])
+@jwt_required()
+@require_permission('manage_users')
+def get_cache_stats():
+    return jsonify({
+        'reference_data': reference_cache.stats(),
+        'qr_codes': render_qr.cache_info()._asdict(),
+        'item_graph': link_graph.stats()
+    })
+
 @app.route('/api/users/<int:user_id>', methods=['GET', 'PUT', 'DELETE'])
 @jwt_required()
 @require_permission('manage_users')
@@ -723,26 +910,19 @@ def handle_user(user_id):
 
 @app.route('/api/locations', methods=['GET', 'POST'])
 @jwt_required()
+@require_permission({'GET': 'view_items', 'POST': 'add_locations'})
+@conditional('locations')
 def get_or_create_locations():
     if request.method == 'GET':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('view_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
         try:
-            locations = Location.query.all()
-            return jsonify([{
-                'id': location.id,
-                'name': location.name,
-                'description': location.description,
-                'parent_id': location.parent_id,
-                'created_at': location.created_at.isoformat()
-            } for location in locations])
+            return reference_cache.respond(['locations'], lambda: [
+                serialize_location(location) for location in Location.query.all()
+            ])
         except Exception as e:
             print(f"Error in get_locations: {str(e)}")
             return jsonify({'error': str(e)}), 500
     
     elif request.method == 'POST':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('add_locations'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
         try:
             data = request.json
             if not data or not data.get('name'):
@@ -753,55 +933,54 @@ def get_or_create_locations():
                 description=data.get('description'),
                 parent_id=data.get('parent_id')
             )
+            check_parent(location, location.parent_id)
             db.session.add(location)
             db.session.commit()
             
-            return jsonify({
-                'id': location.id,
-                'name': location.name,
-                'description': location.description,
-                'parent_id': location.parent_id,
-                'created_at': location.created_at.isoformat()
-            }), 201
+            return jsonify(serialize_location(location)), 201
+        except LocationError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             db.session.rollback()
             print(f"Error creating location: {str(e)}")
             return jsonify({'error': str(e)}), 500
 
-@app.route('/api/locations/<int:location_id>', methods=['GET', 'PUT', 'DELETE'])
+@app.route('/api/locations/counts', methods=['GET'])
 @jwt_required()
-def handle_location(location_id):
-    if request.method == 'GET':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('view_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-    elif request.method == 'PUT':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('edit_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-    elif request.method == 'DELETE':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('delete_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
+@require_permission('view_items')
+@conditional('locations', 'items')
+def get_location_counts():
+    """Items per location, directly in it and rolled up over everything below it"""
+    return reference_cache.respond(['locations', 'items'], item_counts)
 
+@app.route('/api/locations/<location_id>', methods=['GET', 'PUT', 'DELETE'])
+@jwt_required()
+@require_permission({'GET': 'view_items', 'PUT': 'edit_items', 'DELETE': 'delete_items'})
+def handle_location(location_id):
     location = Location.query.get_or_404(location_id)
     
     if request.method == 'GET':
-        return jsonify({
-            'id': location.id,
-            'name': location.name,
-            'description': location.description,
-            'parent_id': location.parent_id,
-            'created_at': location.created_at.isoformat()
-        })
+        return jsonify(serialize_location(location))
     
     elif request.method == 'PUT':
         data = request.json
+        try:
+            check_parent(location, data.get('parent_id', location.parent_id))
+        except LocationError as e:
+            return jsonify({'error': str(e)}), 400
+        renamed = data.get('name', location.name) != location.name
         location.name = data.get('name', location.name)
         location.description = data.get('description', location.description)
         location.parent_id = data.get('parent_id', location.parent_id)
         
+        # The location name is part of the search index of its items
+        if renamed:
+            index_items(select(Item.id).where(Item.location_id == location.id))
         db.session.commit()
         return jsonify({'message': 'Location updated successfully'})
     
     elif request.method == 'DELETE':
+        # Locations below move up to the parent of the deleted one
         db.session.delete(location)
         db.session.commit()
         return jsonify({'message': 'Location deleted successfully'})
@@ -809,12 +988,13 @@ def handle_location(location_id):
 @app.route('/api/item_types', methods=['GET'])
 @jwt_required()
 @require_permission('view_items')
+@conditional('item_types')
 def get_item_types():
-    try:
+    def build():
         print("Fetching item types...")
-        item_types = ItemType.query.all()
+        item_types = ItemType.query.options(selectinload(ItemType.properties)).all()
         print(f"Found {len(item_types)} item types")
-        return jsonify([{
+        return [{
             'id': item_type.id,
             'name': item_type.name,
             'description': item_type.description,
@@ -826,7 +1006,10 @@ def get_item_types():
                 'required': prop.required,
                 'options': prop.options
             } for prop in item_type.properties]
-        } for item_type in item_types])
+        } for item_type in item_types]
+
+    try:
+        return reference_cache.respond(['item_types'], build)
     except Exception as e:
         import traceback
         print(f"Error in get_item_types: {str(e)}")
@@ -836,17 +1019,8 @@ def get_item_types():
 
 @app.route('/api/item_types/<int:item_type_id>', methods=['GET', 'PUT', 'DELETE'])
 @jwt_required()
+@require_permission({'GET': 'view_items', 'PUT': 'edit_items', 'DELETE': 'delete_items'})
 def handle_item_type(item_type_id):
-    if request.method == 'GET':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('view_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-    elif request.method == 'PUT':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('edit_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-    elif request.method == 'DELETE':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('delete_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-
     item_type = ItemType.query.get_or_404(item_type_id)
     
     if request.method == 'GET':
@@ -865,6 +1039,7 @@ def handle_item_type(item_type_id):
     
     elif request.method == 'PUT':
         data = request.json
+        renamed = data.get('name', item_type.name) != item_type.name
         item_type.name = data.get('name', item_type.name)
         item_type.description = data.get('description', item_type.description)
         
@@ -886,6 +1061,9 @@ def handle_item_type(item_type_id):
                     )
                     item_type.properties.append(new_prop)
         
+        # The type name is part of the search index of its items
+        if renamed:
+            index_items(select(Item.id).where(Item.item_type_id == item_type.id))
         db.session.commit()
         return jsonify({'message': 'Item type updated successfully'})
     
@@ -897,28 +1075,19 @@ def handle_item_type(item_type_id):
 @app.route('/api/tags', methods=['GET'])
 @jwt_required()
 @require_permission('view_items')
+@conditional('tags')
 def get_tags():
-    tags = Tag.query.all()
-    return jsonify([{
+    return reference_cache.respond(['tags'], lambda: [{
         'id': tag.id,
         'name': tag.name,
         'color': tag.color,
         'created_at': tag.created_at.isoformat()
-    } for tag in tags])
+    } for tag in Tag.query.all()])
 
 @app.route('/api/tags/<int:tag_id>', methods=['GET', 'PUT', 'DELETE'])
 @jwt_required()
+@require_permission({'GET': 'view_items', 'PUT': 'edit_items', 'DELETE': 'delete_items'})
 def handle_tag(tag_id):
-    if request.method == 'GET':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('view_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-    elif request.method == 'PUT':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('edit_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-    elif request.method == 'DELETE':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('delete_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-
     tag = Tag.query.get_or_404(tag_id)
     
     if request.method == 'GET':
@@ -931,9 +1100,13 @@ def handle_tag(tag_id):
     
     elif request.method == 'PUT':
         data = request.json
+        renamed = data.get('name', tag.name) != tag.name
         tag.name = data.get('name', tag.name)
         tag.color = data.get('color', tag.color)
         
+        # Tag names are part of the search index of the tagged items
+        if renamed:
+            index_items(select(item_tags.c.item_id).where(item_tags.c.tag_id == tag.id))
         db.session.commit()
         return jsonify({'message': 'Tag updated successfully'})
     
@@ -985,30 +1158,21 @@ def format_property_value(value, property_type):
 @app.route('/api/categories', methods=['GET'])
 @jwt_required()
 @require_permission('view_items')
+@conditional('item_categories')
 def get_categories():
-    categories = ItemCategory.query.all()
-    return jsonify([{
+    return reference_cache.respond(['item_categories'], lambda: [{
         'id': category.id,
         'name': category.name,
         'description': category.description,
         'icon': category.icon,
         'color': category.color,
         'created_at': category.created_at.isoformat()
-    } for category in categories])
+    } for category in ItemCategory.query.all()])
 
 @app.route('/api/categories/<int:category_id>', methods=['GET', 'PUT', 'DELETE'])
 @jwt_required()
+@require_permission({'GET': 'view_items', 'PUT': 'edit_items', 'DELETE': 'delete_items'})
 def handle_category(category_id):
-    if request.method == 'GET':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('view_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-    elif request.method == 'PUT':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('edit_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-    elif request.method == 'DELETE':
-        if not get_jwt_identity() or not User.query.get(get_jwt_identity()).has_permission('delete_items'):
-            return jsonify({'error': 'Insufficient permissions'}), 403
-
     category = ItemCategory.query.get_or_404(category_id)
     
     if request.method == 'GET':
@@ -1118,40 +1282,107 @@ def create_item_type():
 @jwt_required()
 def get_item_image(item_id):
     item = Item.query.get_or_404(item_id)
-    type_folder = normalize_filename(item.item_type.name)
     
-    # Check for any image file with the item_id as name
-    image_folder = os.path.join(app.config['PICTURES_FOLDER'], 'items', type_folder)
-    if not os.path.exists(image_folder):
-        return jsonify({'error': 'Image not found'}), 404
-        
-    # Look for any image file with the item_id as name
-    for ext in ['.jpg', '.jpeg', '.png', '.gif']:
-        image_path = os.path.join(image_folder, f"{item_id}{ext}")
+    # The main image is recorded with the item_id as name
+    item_file = ItemFile.query.filter(ItemFile.item_id == item.id,
+                                      ItemFile.original_filename.in_(main_image_names(item.id))).first()
+    if item_file:
+        image_path = absolute_storage_path(item_file.filename)
         if os.path.exists(image_path):
-            return send_file(image_path)
+            return send_image(image_path)
     
     return jsonify({'error': 'Image not found'}), 404
 
+def send_qr(kind, model, object_id):
+    """QR code of an item or location, ?size= in pixels and ?format=png|svg"""
+    if not db.session.execute(select(model.id).where(model.id == object_id)).first():
+        return jsonify({'error': f'{model.__name__} not found'}), 404
+    qr_format = request.args.get('format', 'png')
+    if qr_format not in QR_FORMATS:
+        return jsonify({'error': f"Unsupported format, use one of {', '.join(QR_FORMATS)}"}), 400
+    size = request.args.get('size', 256, type=int)
+    if not QR_SIZES[0] <= size <= QR_SIZES[1]:
+        return jsonify({'error': f'size must be between {QR_SIZES[0]} and {QR_SIZES[1]}'}), 400
+    
+    # Codes never change for an id, clients may keep them
+    response = app.response_class(render_qr(qr_payload(kind, object_id), size, qr_format),
+                                  mimetype=QR_FORMATS[qr_format])
+    response.set_etag(f'{kind}-{object_id}-{size}-{qr_format}')
+    response.cache_control.private = True
+    response.cache_control.max_age = 30 * 24 * 60 * 60
+    return response.make_conditional(request)
+
+@app.route('/api/items/<item_id>/qr', methods=['GET'])
+@jwt_required()
+@require_permission('view_items')
+def get_item_qr(item_id):
+    return send_qr('item', Item, item_id)
+
+@app.route('/api/locations/<location_id>/qr', methods=['GET'])
+@jwt_required()
+@require_permission('view_items')
+def get_location_qr(location_id):
+    return send_qr('location', Location, location_id)
+
+@app.route('/api/scan/<path:code>', methods=['GET'])
+@jwt_required()
+@require_permission('view_items')
+def scan_code(code):
+    """Resolve a scanned code (item:<id>, location:<id> or a bare id) to a compact summary"""
+    row = resolve_codes([code])[code]
+    if row is None:
+        return jsonify({'error': 'Unknown code', 'code': code, 'found': False}), 404
+    return jsonify(serialize_scan(code, row))
+
+@app.route('/api/scan', methods=['POST'])
+@jwt_required()
+@require_permission('view_items')
+def scan_codes():
+    """Resolve many scanned codes at once, results keep the order of codes"""
+    codes = (request.json or {}).get('codes')
+    if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+        return jsonify({'error': 'codes must be a list of strings'}), 400
+    if len(codes) > MAX_CODES:
+        return jsonify({'error': f'At most {MAX_CODES} codes per request'}), 400
+    
+    resolved = resolve_codes(codes)
+    return jsonify({'results': [serialize_scan(code, resolved[code]) for code in codes]})
+
+@app.route('/api/labels', methods=['POST'])
+@jwt_required()
+@require_permission('view_items')
+def create_label_sheets():
+    """Printable A4 label sheets as PDF for item or location ids, or an item filter"""
+    try:
+        kind, ids, filters, columns, rows = parse_label_request(request.json)
+        labels = label_rows(kind, ids, filters)
+    except (FilterError, LabelError) as e:
+        return jsonify({'error': str(e)}), 400
+    if not labels:
+        return jsonify({'error': 'Nothing to print'}), 404
+    
+    pdf = render_label_sheets(labels, columns, rows, job_queue.map_cpu)
+    response = app.response_class(pdf, mimetype='application/pdf')
+    response.headers['Content-Disposition'] = f'inline; filename="{kind}-labels.pdf"'
+    return response
+
 @app.route('/api/items/<item_id>/files/<path:filename>', methods=['GET'])
 @jwt_required()
 def download_item_file(item_id, filename):
     item = Item.query.get_or_404(item_id)
-    type_folder = normalize_filename(item.item_type.name)
-    
-    # Check if it's an image file
-    is_image = any(filename.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif'])
-    if is_image:
-        image_folder = os.path.join(app.config['PICTURES_FOLDER'], 'items', type_folder)
-        file_path = os.path.join(image_folder, secure_filename(os.path.basename(filename)))
-    else:
-        item_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'items', type_folder, item_id)
-        file_path = os.path.join(item_folder, secure_filename(os.path.basename(filename)))
     
-    if not os.path.exists(file_path):
+    # Files are addressed by their stored name or their static-relative path
+    item_file = ItemFile.query.filter(
+        ItemFile.item_id == item.id,
+        (ItemFile.original_filename == filename) | (ItemFile.filename == filename)
+    ).first()
+    file_path = absolute_storage_path(item_file.filename) if item_file else None
+    if not file_path or not os.path.exists(file_path):
         return jsonify({'error': 'File not found'}), 404
         
-    return send_file(file_path)
+    if item_file.is_image:
+        return send_image(file_path)
+    return send_file(file_path, mimetype=item_file.mime_type, download_name=item_file.original_filename)
 
 if __name__ == '__main__':
     with app.app_context():
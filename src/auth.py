@@ -0,0 +1,88 @@
+import threading
+from datetime import datetime
+from functools import wraps
+from flask import request, jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from models import db, User
+from versions import current_versions, on_tables_changed
+
+# Tables whose changes can alter what a user may do
+AUTH_TABLES = ('users', 'roles')
+
+
+class PermissionCache:
+    """Permissions per user id, resolved from the database and kept until users or roles change
+
+    Commits in this process drop the entries right away, commits of other
+    processes are noticed through the change versions stored with each entry.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._permissions = {}
+
+    def get(self, user_id):
+        versions = current_versions()
+        state = tuple(versions.get(table, (0, None))[0] for table in AUTH_TABLES)
+        with self._lock:
+            entry = self._permissions.get(user_id)
+            if entry and entry[0] == state:
+                return entry[1]
+        user = db.session.get(User, user_id)
+        permissions = frozenset()
+        if user and user.is_active:
+            permissions = frozenset(permission for role in user.roles for permission in role.permissions)
+        with self._lock:
+            self._permissions[user_id] = (state, permissions)
+        return permissions
+
+    def invalidate(self, tables=None):
+        if tables is None or set(tables) & set(AUTH_TABLES):
+            with self._lock:
+                self._permissions.clear()
+
+
+permission_cache = PermissionCache()
+on_tables_changed(permission_cache.invalidate)
+
+
+def _claims_current(claims):
+    """Whether the token was issued after the last change to users and roles"""
+    if 'permissions' not in claims or 'iat' not in claims:
+        return False
+    versions = current_versions()
+    changed = [versions[table][1] for table in AUTH_TABLES if table in versions and versions[table][1]]
+    if not changed:
+        return True
+    # iat has second resolution, a token from the second of the change is not trusted
+    return datetime.utcfromtimestamp(claims['iat']) > max(changed)
+
+
+def current_permissions():
+    """Permissions of the authenticated user
+
+    Comes from the token claims as long as no user or role was edited after
+    the token was issued, otherwise from the permission cache.
+    """
+    claims = get_jwt()
+    if _claims_current(claims):
+        return frozenset(claims['permissions'])
+    identity = get_jwt_identity()
+    return permission_cache.get(int(identity)) if identity else frozenset()
+
+
+def current_user_can(permission):
+    return permission in current_permissions()
+
+
+def require_permission(permission):
+    """Require a permission, or a {method: permission} mapping for routes serving several methods"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            required = permission.get(request.method) if isinstance(permission, dict) else permission
+            if required and not current_user_can(required):
+                return jsonify({'error': 'Insufficient permissions'}), 403
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,276 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from PIL import Image
+from sqlalchemy import event, select, func
+from sqlalchemy.engine import Engine
+from models import db, Item, ItemType, Tag, Location, ItemFile, User, Role, item_subitems, item_links, location_closure
+from jobs import job_queue
+from file_manifest import remove_item_file
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, queries, errors):
+    """Latency percentiles in milliseconds and SQL statements per request"""
+    latencies = sorted(latencies)
+    summary = {'requests': len(latencies), 'errors': errors}
+    for percent in PERCENTILES:
+        summary[f'p{percent}_ms'] = round(percentile(latencies, percent) * 1000, 3)
+    summary['max_ms'] = round(latencies[-1] * 1000, 3)
+    summary['mean_ms'] = round(sum(latencies) / len(latencies) * 1000, 3)
+    summary['queries_mean'] = round(sum(queries) / len(queries), 2)
+    summary['queries_max'] = max(queries)
+    return summary
+
+
+class QueryCounter:
+    """Counts the statements sent to the database while attached, on every engine"""
+
+    def __init__(self, engine=Engine):
+        self.count = 0
+        self._engine = engine
+
+    def _record(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self._engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self._engine, 'before_cursor_execute', self._record)
+
+
+def sample_ids(size=200):
+    """Ids the benchmarks pick their requests from, drawn once per run"""
+    pick = lambda statement: db.session.execute(statement.order_by(func.random()).limit(size)).scalars().all()
+    return {
+        'items': pick(select(Item.id)),
+        'item_types': pick(select(ItemType.id)),
+        'tags': pick(select(Tag.id)),
+        # Locations with something below them, so subtree filters have work to do
+        'parent_locations': pick(select(location_closure.c.ancestor_id).where(location_closure.c.depth == 1)
+                                 .distinct()),
+        'locations': pick(select(Location.id)),
+        'kits': pick(select(item_subitems.c.parent_id).distinct()),
+        'linked': pick(select(item_links.c.item_a_id)),
+        'words': [name.split()[0] for name in pick(select(Item.name))],
+    }
+
+
+def jpeg_bytes(rng):
+    """A small JPEG that differs on every call, so uploads are never deduplicated"""
+    image = Image.effect_noise((256, 192), rng.randint(10, 90)).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+# name: (sampled ids needed, function(pick, index, rng) -> (method, url, keyword arguments of client.open))
+BENCHMARKS = {
+    'items_page': ((), lambda pick, i, rng: ('GET', '/api/items?limit=50', {})),
+    'items_location_subtree': (('parent_locations',), lambda pick, i, rng: (
+        'GET', f"/api/items?limit=50&location_id={pick('parent_locations')}&include_descendants=1", {})),
+    'items_type_tag': (('item_types', 'tags'), lambda pick, i, rng: (
+        'GET', f"/api/items?limit=50&item_type_id={pick('item_types')}&tag_id={pick('tags')}", {})),
+    'items_search': (('words',), lambda pick, i, rng: ('GET', f"/api/items?limit=50&search={pick('words')}", {})),
+    'item_detail': (('items',), lambda pick, i, rng: ('GET', f"/api/items/{pick('items')}", {})),
+    'item_types': ((), lambda pick, i, rng: ('GET', '/api/item_types', {})),
+    'locations_counts': ((), lambda pick, i, rng: ('GET', '/api/locations/counts', {})),
+    'scan': (('items',), lambda pick, i, rng: ('GET', f"/api/scan/item:{pick('items')}", {})),
+    'scan_batch': (('items', 'locations'), lambda pick, i, rng: ('POST', '/api/scan', {'json': {
+        'codes': [f"item:{pick('items')}" for _ in range(25)] +
+                 [f"location:{pick('locations')}" for _ in range(25)]}})),
+    'kit': (('kits',), lambda pick, i, rng: ('GET', f"/api/items/{pick('kits')}/kit", {})),
+    'component': (('linked',), lambda pick, i, rng: ('GET', f"/api/items/{pick('linked')}/component", {})),
+    # Uploads go last, their background jobs would otherwise compete with the other requests for the CPU
+    'upload': (('items',), lambda pick, i, rng: ('POST', f"/api/items/{pick('items')}/files", {
+        'data': {'files[]': (io.BytesIO(jpeg_bytes(rng)), f'benchmark-{i}.jpg')},
+        'content_type': 'multipart/form-data'})),
+}
+
+
+def auth_headers():
+    """Bearer token of a benchmark user holding every permission the benchmarks need"""
+    permissions = ['view_items', 'add_items', 'edit_items', 'delete_items', 'add_locations', 'manage_users']
+    role = Role.query.filter_by(name='benchmark').first()
+    if role is None:
+        role = Role(name='benchmark', permissions=permissions)
+        db.session.add(role)
+    user = User.query.filter_by(username='benchmark').first()
+    if user is None:
+        user = User(username='benchmark', email='benchmark@example.com', is_active=True)
+        user.set_password(os.urandom(16).hex())
+        user.roles.append(role)
+        db.session.add(user)
+    db.session.commit()
+    token = create_access_token(identity=str(user.id),
+                                additional_claims={'roles': ['benchmark'], 'permissions': permissions})
+    return {'Authorization': f'Bearer {token}'}
+
+
+def clean_up(last_file_id):
+    """Remove the benchmark user and role and the files uploaded after last_file_id"""
+    for item_file in ItemFile.query.filter(ItemFile.id > last_file_id):
+        remove_item_file(item_file)
+    for user in User.query.filter_by(username='benchmark'):
+        db.session.delete(user)
+    for role in Role.query.filter_by(name='benchmark'):
+        db.session.delete(role)
+    db.session.commit()
+
+
+def run_benchmarks(app, iterations=200, warmup=20, seed=0, only=None):
+    """Time the hot endpoints with the test client, returns {name: summary}
+
+    Benchmarks without data to work on (no kits, no links) are left out. The
+    benchmark user and the uploaded files are removed again afterwards.
+    """
+    rng = random.Random(seed)
+    results = {}
+    with app.app_context():
+        ids = sample_ids()
+        last_file_id = db.session.scalar(select(func.max(ItemFile.id))) or 0
+        headers = auth_headers()
+        client = app.test_client()
+        pick = lambda key: rng.choice(ids[key])
+        try:
+            for name, (needs, make_request) in BENCHMARKS.items():
+                if (only and name not in only) or not all(ids[key] for key in needs):
+                    continue
+                latencies, queries, errors = [], [], 0
+                for index in range(warmup + iterations):
+                    method, url, kwargs = make_request(pick, index, rng)
+                    with QueryCounter() as counter:
+                        started = time.perf_counter()
+                        response = client.open(url, method=method, headers=headers, **kwargs)
+                        response.get_data()
+                        elapsed = time.perf_counter() - started
+                    if index < warmup:
+                        continue
+                    latencies.append(elapsed)
+                    queries.append(counter.count)
+                    errors += response.status_code >= 400
+                results[name] = summarize(latencies, queries, errors)
+        finally:
+            job_queue.join()
+            db.session.rollback()
+            clean_up(last_file_id)
+    return results
+
+
+def dataset_counts(app):
+    count = lambda table: db.session.scalar(select(func.count()).select_from(table))
+    with app.app_context():
+        return {'items': count(Item), 'locations': count(Location), 'files': count(ItemFile),
+                'subitems': count(item_subitems), 'links': count(item_links)}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, tolerance):
+    """Print the change against a baseline, returns the names of regressed benchmarks
+
+    A benchmark regresses when its median gets slower than the tolerance allows
+    or when it sends at least half a statement more per request on average,
+    smaller differences come from cache expiry.
+    """
+    regressions = []
+    print(f"{'benchmark':<24} {'p50 ms':>20} {'p99 ms':>20} {'queries':>12}")
+    for name, result in current['benchmarks'].items():
+        before = baseline['benchmarks'].get(name)
+        if before is None:
+            print(f"{name:<24} {result['p50_ms']:>20} {result['p99_ms']:>20} {result['queries_mean']:>12}")
+            continue
+        change = lambda key: f"{before[key]} → {result[key]}"
+        print(f"{name:<24} {change('p50_ms'):>20} {change('p99_ms'):>20} {change('queries_mean'):>12}")
+        if (result['p50_ms'] > before['p50_ms'] * (1 + tolerance)
+                or result['queries_mean'] >= before['queries_mean'] + 0.5):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the hot API endpoints and write a JSON baseline')
+    # The benchmarks upload files and add a user, never run them against the configured database
+    parser.add_argument('--database', required=True, help='SQLite file to run against')
+    parser.add_argument('--generate', type=int, metavar='N',
+                        help='Recreate the database with N synthetic items first (see generate_data.py)')
+    parser.add_argument('--storage', help='Folder for uploaded files, defaults to a temporary one')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', action='append', help='Run only this benchmark (repeatable)')
+    parser.add_argument('--output', '-o', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Baseline JSON to compare the results with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed p50 slowdown against the baseline before exiting with 1')
+    options = parser.parse_args()
+
+    # The engine is created when the app module is imported, so point it at
+    # the benchmark database before that happens
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.abspath(options.database)}'
+    from app import app
+    storage = options.storage or tempfile.mkdtemp(prefix='benchmark-')
+    for key, folder in (('UPLOAD_FOLDER', 'uploads'), ('PICTURES_FOLDER', 'pictures'), ('BLOBS_FOLDER', 'blobs')):
+        app.config[key] = os.path.join(storage, folder)
+        os.makedirs(app.config[key], exist_ok=True)
+
+    if options.generate:
+        from generate_data import generate_inventory
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            print(f"Generating {options.generate} items...", flush=True)
+            generate_inventory(options.generate, options.seed)
+
+    results = {
+        'created_at': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'dataset': dataset_counts(app),
+        'iterations': options.iterations,
+        'benchmarks': run_benchmarks(app, options.iterations, options.warmup, options.seed, options.only)
+    }
+
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if options.compare:
+        with open(options.compare, encoding='utf-8') as f:
+            regressions = compare(json.load(f), results, options.tolerance)
+        if regressions:
+            print(f"Slower than the baseline: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        print(json.dumps(results['benchmarks'], indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import shutil
+import uuid
+from flask import current_app
+from sqlalchemy import event, select, exists
+from sqlalchemy.dialects.sqlite import insert
+from models import db, Blob, ItemFile
+from thumbnails import remove_thumbnails
+
+# Read and hash files in pieces of this size
+CHUNK_SIZE = 1024 * 1024
+
+
+def blob_path(blob):
+    return os.path.join(current_app.config['BLOBS_FOLDER'], *blob.filename.split('/')[1:])
+
+
+def temp_path(name=None):
+    """Path for writing a file before its hash is known, on the store's file system"""
+    folder = os.path.join(current_app.config['BLOBS_FOLDER'], 'tmp')
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, name or uuid.uuid4().hex)
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _get_or_create(sha256, size, extension):
+    # Concurrent uploads of the same content must not fail on the primary key
+    db.session.execute(insert(Blob).values(sha256=sha256, size=size, extension=extension.lower())
+                       .on_conflict_do_nothing())
+    return db.session.get(Blob, sha256)
+
+
+def store_temp_file(path, sha256, size, extension):
+    """Move a completely written file into the store, dropping it when the content is stored already"""
+    blob = _get_or_create(sha256, size, extension)
+    target = blob_path(blob)
+    if os.path.exists(target):
+        os.remove(path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+    return blob
+
+
+def store_stream(stream, extension):
+    """Store the content of a file-like object, hashing it while it is written"""
+    path = temp_path()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, 'wb') as f:
+            while chunk := stream.read(CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return store_temp_file(path, digest.hexdigest(), size, extension)
+
+
+def store_copy(source, extension, sha256=None):
+    """Store a copy of a file on disk, hard linked when possible, the source is left in place"""
+    path = temp_path()
+    try:
+        os.link(source, path)
+    except OSError:
+        shutil.copyfile(source, path)
+    return store_temp_file(path, sha256 or hash_file(path), os.path.getsize(path), extension)
+
+
+def delete_after_commit(delete, *args):
+    """Call delete(*args) once the current transaction commits, a rollback keeps the files"""
+    db.session.info.setdefault('pending_deletions', []).append((delete, args))
+
+
+@event.listens_for(db.session, 'after_commit')
+def run_pending_deletions(session):
+    for delete, args in session.info.pop('pending_deletions', []):
+        delete(*args)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def drop_pending_deletions(session):
+    session.info.pop('pending_deletions', None)
+
+
+def _delete_blob_file(path):
+    remove_thumbnails(path)
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def release_blob(sha256):
+    """Delete a blob once no file entry references it any more
+
+    The row goes with the current transaction, the file and its thumbnails
+    only when that commits.
+    """
+    db.session.flush()
+    if db.session.execute(select(exists().where(ItemFile.blob_sha256 == sha256))).scalar():
+        return False
+    blob = db.session.get(Blob, sha256)
+    if blob is None:
+        return False
+    delete_after_commit(_delete_blob_file, blob_path(blob))
+    db.session.delete(blob)
+    return True
+
+
+def collect_garbage():
+    """Delete all blobs without file entries, returns how many were removed"""
+    orphans = db.session.execute(
+        select(Blob.sha256).where(~exists().where(ItemFile.blob_sha256 == Blob.sha256))
+    ).scalars().all()
+    removed = sum(release_blob(sha256) for sha256 in orphans)
+    db.session.commit()
+    return removed
@@ -0,0 +1,169 @@
+from datetime import datetime
+from sqlalchemy import select, insert, update, delete, exists, literal, func, or_
+from models import db, Item, ItemPropertyValue, ItemFile, Location, Tag, UploadSession, item_tags, item_subitems
+from filters import apply_item_filters
+from search import index_items, remove_items
+from file_manifest import delete_stored_file
+from blobs import release_blob
+from versions import mark_changed
+from graph import unlink_items
+from upload_sessions import discard_session
+
+
+class BulkError(ValueError):
+    """Raised for bulk requests that cannot be carried out"""
+
+
+def parse_operation(data):
+    """Validate a bulk request body, returns the normalized operation"""
+    if not isinstance(data, dict):
+        raise BulkError('Expected a JSON object')
+    if ('ids' in data) == ('filter' in data):
+        raise BulkError('Specify either ids or filter')
+    if 'ids' in data and not isinstance(data['ids'], list):
+        raise BulkError('ids must be a list')
+    if 'filter' in data and not isinstance(data['filter'], dict):
+        raise BulkError('filter must be an object')
+    if (data.get('delete') and 'filter' in data and not data.get('all')
+            and not any(value not in (None, '', []) for value in data['filter'].values())):
+        raise BulkError('An empty filter matches every item, pass "all": true to delete them all')
+
+    operation = {
+        'ids': [str(item_id) for item_id in data['ids']] if 'ids' in data else None,
+        'filter': data.get('filter'),
+        'delete': bool(data.get('delete')),
+        'add_tags': [int(tag_id) for tag_id in data.get('add_tags') or []],
+        'remove_tags': [int(tag_id) for tag_id in data.get('remove_tags') or []],
+    }
+    if 'set_location' in data:
+        operation['set_location'] = data['set_location'] or None
+
+    changes = 'set_location' in operation or operation['add_tags'] or operation['remove_tags']
+    if operation['delete'] and changes:
+        raise BulkError('delete cannot be combined with other operations')
+    if not operation['delete'] and not changes:
+        raise BulkError('Nothing to do, use set_location, add_tags, remove_tags or delete')
+
+    if operation.get('set_location') and not db.session.get(Location, operation['set_location']):
+        raise BulkError(f"Unknown location: {operation['set_location']}")
+    tag_ids = set(operation['add_tags']) | set(operation['remove_tags'])
+    if tag_ids:
+        found = set(db.session.execute(select(Tag.id).where(Tag.id.in_(tag_ids))).scalars())
+        if tag_ids - found:
+            raise BulkError(f'Unknown tags: {", ".join(str(tag_id) for tag_id in sorted(tag_ids - found))}')
+    return operation
+
+
+def count_targets(operation):
+    if operation['ids'] is not None:
+        return len(set(operation['ids']))
+    statement, _ = apply_item_filters(select(Item.id), operation['filter'])
+    return db.session.execute(select(func.count()).select_from(statement.subquery())).scalar()
+
+
+def target_chunks(operation, chunk_size):
+    """Yield lists of ids of existing target items, chunk by chunk
+
+    Filter targets are walked in id order with a keyset on the id, so items
+    that leave the filter (moved or deleted) do not shift later chunks.
+    """
+    if operation['ids'] is not None:
+        ids = sorted(set(operation['ids']))
+        for start in range(0, len(ids), chunk_size):
+            chunk = db.session.execute(
+                select(Item.id).where(Item.id.in_(ids[start:start + chunk_size]))
+            ).scalars().all()
+            if chunk:
+                yield chunk
+        return
+
+    statement, _ = apply_item_filters(select(Item.id), operation['filter'])
+    last_id = None
+    while True:
+        page = statement.order_by(Item.id).limit(chunk_size)
+        if last_id is not None:
+            page = page.where(Item.id > last_id)
+        chunk = db.session.execute(page).scalars().all()
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+def _update_chunk(operation, chunk):
+    now = datetime.utcnow()
+    if 'set_location' in operation:
+        db.session.execute(
+            update(Item.__table__).where(Item.id.in_(chunk))
+            .values(location_id=operation['set_location'], updated_at=now)
+        )
+    for tag_id in operation['add_tags']:
+        # Only link items that do not carry the tag yet
+        db.session.execute(insert(item_tags).from_select(
+            ['item_id', 'tag_id'],
+            select(Item.id, literal(tag_id)).where(
+                Item.id.in_(chunk),
+                ~exists().where(item_tags.c.item_id == Item.id, item_tags.c.tag_id == tag_id)
+            )
+        ))
+    if operation['remove_tags']:
+        db.session.execute(delete(item_tags).where(
+            item_tags.c.item_id.in_(chunk), item_tags.c.tag_id.in_(operation['remove_tags'])
+        ))
+    if operation['add_tags'] or operation['remove_tags']:
+        db.session.execute(update(Item.__table__).where(Item.id.in_(chunk)).values(updated_at=now))
+    index_items(chunk)
+
+
+def _delete_chunk(chunk):
+    """Delete items with everything attached to them, returns (filename, blob_sha256) of their files"""
+    files = db.session.execute(
+        select(ItemFile.filename, ItemFile.blob_sha256).where(ItemFile.item_id.in_(chunk))
+    ).all()
+    remove_items(chunk)
+    for upload in UploadSession.query.filter(UploadSession.item_id.in_(chunk)):
+        discard_session(upload)
+    db.session.flush()
+    db.session.execute(delete(ItemFile.__table__).where(ItemFile.item_id.in_(chunk)))
+    db.session.execute(delete(ItemPropertyValue.__table__).where(ItemPropertyValue.item_id.in_(chunk)))
+    db.session.execute(delete(item_tags).where(item_tags.c.item_id.in_(chunk)))
+    db.session.execute(delete(item_subitems).where(
+        or_(item_subitems.c.parent_id.in_(chunk), item_subitems.c.child_id.in_(chunk))
+    ))
+    unlink_items(chunk)
+    db.session.execute(delete(Item.__table__).where(Item.id.in_(chunk)))
+    return files
+
+
+def run_bulk(operation, chunk_size=500):
+    """Apply operation chunk by chunk, one transaction per chunk
+
+    Yields a progress dict after every committed chunk. Files of deleted items
+    are removed from disk once their chunk is committed.
+    """
+    total = count_targets(operation)
+    processed = 0
+    yield {'processed': 0, 'total': total}
+    for chunk in target_chunks(operation, chunk_size):
+        try:
+            if operation['delete']:
+                files = _delete_chunk(chunk)
+            else:
+                files = []
+                _update_chunk(operation, chunk)
+            mark_changed(db.session, 'items')
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        # Objects loaded before the Core statements ran are stale now
+        db.session.expire_all()
+        # Blobs go once nothing references them any more, files of the old layout right away
+        for filename, blob_sha256 in files:
+            if blob_sha256:
+                release_blob(blob_sha256)
+            else:
+                delete_stored_file(filename)
+        db.session.commit()
+        processed += len(chunk)
+        yield {'processed': processed, 'total': total}
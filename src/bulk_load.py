@@ -0,0 +1,344 @@
+import argparse
+import functools
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import chain
+import shortuuid
+from sqlalchemy import insert, select
+from models import db, ItemCategory, ItemType, ItemProperty, Location, Tag, Item, ItemPropertyValue, item_tags
+from item_import import ItemImporter, read_csv, item_rows, scalar_field, MAX_REPORTED_ERRORS
+from location_tree import rebuild_location_tree
+from search import rebuild_search_index
+from versions import mark_changed
+
+# Seed sections in the order they are loaded, later ones refer to earlier ones by name
+SECTIONS = ('categories', 'item_types', 'locations', 'tags', 'items')
+
+# No rollback journal (unless in WAL) and no fsync while loading: a load that
+# fails half way leaves a half-written database behind, so this is for fresh
+# databases only
+LOAD_PRAGMAS = (('journal_mode', 'OFF'), ('synchronous', 'OFF'), ('temp_store', 'MEMORY'),
+                ('cache_size', -256000))
+
+# Their secondary indexes are dropped for the load and built once afterwards,
+# sorting all keys at once beats updating the B-trees row by row
+DEFERRED_INDEX_TABLES = (Item.__table__, ItemPropertyValue.__table__, item_tags)
+
+
+class SeedError(ValueError):
+    """Raised for seed files that cannot be loaded"""
+
+
+def read_seed(path):
+    """{section: rows} of a seed file
+
+    A JSON file is an object holding any of the sections as lists of objects.
+    A CSV file holds the section its name says (tags.csv, locations.csv, ...),
+    files with any other name hold items.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        with open(path, 'rb') as f:
+            rows = read_csv(f.read())
+        section = os.path.splitext(os.path.basename(path))[0].lower()
+        return {section if section in SECTIONS else 'items': rows}
+    if extension != '.json':
+        raise SeedError(f'{path}: seed files must be .json or .csv')
+    with open(path, encoding='utf-8') as f:
+        seed = json.load(f)
+    if not isinstance(seed, dict) or set(seed) - set(SECTIONS):
+        raise SeedError(f'{path}: expected an object with the sections {", ".join(SECTIONS)}')
+    for section, rows in seed.items():
+        if not isinstance(rows, list):
+            raise SeedError(f'{path}: {section} must be a list')
+    return seed
+
+
+@contextmanager
+def loading_pragmas(connection):
+    """Apply LOAD_PRAGMAS to connection for the block and restore the previous settings
+
+    The pragmas go to the sqlite3 connection directly, outside of any
+    transaction; whatever the block left uncommitted is rolled back first.
+    A WAL database stays in WAL, leaving it needs the only connection to the
+    file, and is checkpointed at the end instead.
+    """
+    raw = connection.connection.driver_connection
+    pragma = lambda name: raw.execute(f'PRAGMA {name}').fetchone()[0]
+    previous = [(name, pragma(name)) for name, _ in LOAD_PRAGMAS]
+    wal = pragma('journal_mode') == 'wal'
+    for name, value in LOAD_PRAGMAS:
+        if not (wal and name == 'journal_mode'):
+            raw.execute(f'PRAGMA {name} = {value}')
+    try:
+        yield
+    finally:
+        connection.rollback()
+        for name, value in previous:
+            if not (wal and name == 'journal_mode'):
+                raw.execute(f'PRAGMA {name} = {value}')
+        if wal:
+            raw.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+@contextmanager
+def deferred_indexes(connection, tables=DEFERRED_INDEX_TABLES):
+    """Drop the secondary indexes of tables for the block and build them again at its end"""
+    indexes = [index for table in tables for index in table.indexes]
+    for index in indexes:
+        index.drop(connection, checkfirst=True)
+    connection.commit()
+    try:
+        yield
+    finally:
+        for index in indexes:
+            index.create(connection, checkfirst=True)
+        connection.commit()
+
+
+def executemany(connection, table, rows):
+    """Insert rows with one DBAPI executemany of a compiled INSERT
+
+    Core's executemany converts every bound value by itself; here each
+    column's converter runs once per distinct value, which matters for the
+    timestamps a load shares. Rows need the same keys, including every column
+    with a Python-side default, and hashable values.
+    """
+    columns = list(rows[0])
+    missing = [column.name for column in table.c if column.default is not None and column.name not in columns]
+    if missing:
+        raise ValueError(f"{table.name}: rows need values for {', '.join(missing)}")
+    compiled = insert(table).compile(dialect=connection.dialect, column_keys=columns)
+    values = []
+    for name in compiled.positiontup:
+        column = [row[name] for row in rows]
+        process = table.c[name].type.dialect_impl(connection.dialect).bind_processor(connection.dialect)
+        if process is not None:
+            process = functools.lru_cache(maxsize=None)(process)
+            column = [None if value is None else process(value) for value in column]
+        values.append(column)
+    connection.exec_driver_sql(compiled.string, list(zip(*values)))
+
+
+def _required_name(section, row):
+    name = str(row.get('name') or '').strip() if isinstance(row, dict) else ''
+    if not name:
+        raise SeedError(f'{section}: every row needs a name, got {row!r}')
+    return name
+
+
+class BulkLoader:
+    """Inserts seed sections with Core executemany on one connection
+
+    Reference data (categories, item types, locations, tags) that already
+    exists by name is kept as it is. Item rows go through the same validation
+    as the import endpoint; invalid rows are skipped and reported.
+    """
+
+    def __init__(self, connection, chunk_size=20000):
+        self.connection = connection
+        self.chunk_size = chunk_size
+        self.now = datetime.utcnow()
+        self.stats = {section: 0 for section in SECTIONS}
+        self.stats.update({'properties': 0, 'property_values': 0, 'failed': 0, 'errors': []})
+
+    def _ids_by_name(self, model):
+        return {name: row_id for row_id, name in self.connection.execute(select(model.id, model.name))}
+
+    def _insert(self, table, rows, section):
+        if rows:
+            stamps = {'created_at': self.now, 'updated_at': self.now}
+            self.connection.execute(insert(table), [dict(row, **stamps) for row in rows])
+        self.stats[section] += len(rows)
+
+    def categories(self, rows):
+        existing = self._ids_by_name(ItemCategory)
+        new = {}
+        for row in rows:
+            name = _required_name('categories', row)
+            if name not in existing and name not in new:
+                new[name] = {'name': name, 'description': row.get('description'),
+                             'icon': row.get('icon'), 'color': row.get('color')}
+        self._insert(ItemCategory.__table__, list(new.values()), 'categories')
+
+    def item_types(self, rows):
+        categories = self._ids_by_name(ItemCategory)
+        existing = self._ids_by_name(ItemType)
+        new = {}
+        for row in rows:
+            name = _required_name('item_types', row)
+            category = row.get('category')
+            if category and category not in categories:
+                raise SeedError(f'item_types: unknown category {category!r} of {name!r}')
+            if name not in existing and name not in new:
+                new[name] = {'name': name, 'description': row.get('description'),
+                             'category_id': categories.get(category)}
+        self._insert(ItemType.__table__, list(new.values()), 'item_types')
+
+        # Properties a type does not have yet are added, existing ones are left alone
+        types = self._ids_by_name(ItemType)
+        known = set(self.connection.execute(select(ItemProperty.item_type_id, ItemProperty.name)))
+        properties = []
+        for row in rows:
+            type_id = types[row['name'].strip()]
+            for prop in row.get('properties') or []:
+                prop_name = _required_name('properties', prop)
+                if prop.get('property_type') not in ItemProperty.VALID_PROPERTY_TYPES:
+                    raise SeedError(f"item_types: {row['name']}.{prop_name} has the invalid property type "
+                                    f"{prop.get('property_type')!r}")
+                if (type_id, prop_name) not in known:
+                    known.add((type_id, prop_name))
+                    properties.append({'item_type_id': type_id, 'name': prop_name,
+                                       'property_type': prop['property_type'],
+                                       'required': bool(prop.get('required')),
+                                       'description': prop.get('description'), 'options': prop.get('options'),
+                                       'default_value': prop.get('default_value'), 'image': None})
+        self._insert(ItemProperty.__table__, properties, 'properties')
+
+    def locations(self, rows):
+        """Parents are given by id or name and have to come before their children"""
+        ids = set()
+        by_name = {}
+        for location_id, name in self.connection.execute(select(Location.id, Location.name)):
+            ids.add(location_id)
+            by_name.setdefault(name, location_id)
+        new = []
+        for row in rows:
+            name = _required_name('locations', row)
+            location_id = row.get('id') or shortuuid.uuid()[:8]
+            if location_id in ids:
+                continue
+            parent = row.get('parent') or row.get('parent_id') or None
+            parent_id = parent if parent in ids else by_name.get(parent)
+            if parent and parent_id is None:
+                raise SeedError(f'locations: unknown parent {parent!r} of {name!r}')
+            new.append({'id': location_id, 'name': name, 'description': row.get('description'),
+                        'parent_id': parent_id, 'path': None})
+            ids.add(location_id)
+            by_name.setdefault(name, location_id)
+        self._insert(Location.__table__, new, 'locations')
+
+    def tags(self, rows):
+        existing = self._ids_by_name(Tag)
+        new = {}
+        for row in rows:
+            name = _required_name('tags', row)
+            if name not in existing and name not in new:
+                new[name] = {'name': name, 'color': row.get('color') or 'secondary'}
+        # Tags have no updated_at column
+        if new:
+            self.connection.execute(insert(Tag.__table__), [dict(row, created_at=self.now) for row in new.values()])
+        self.stats['tags'] += len(new)
+
+    def items(self, rows, importers):
+        """importers maps item type ids and lower-case names to ItemImporters"""
+        def fail(number, errors):
+            self.stats['failed'] += 1
+            if len(self.stats['errors']) < MAX_REPORTED_ERRORS:
+                self.stats['errors'].append({'row': number, 'errors': errors})
+
+        def flush(chunk):
+            for table, rows in zip((Item.__table__, ItemPropertyValue.__table__, item_tags),
+                                   item_rows(chunk, self.now)):
+                if rows:
+                    executemany(self.connection, table, rows)
+            self.connection.commit()
+            self.stats['items'] += len(chunk)
+            self.stats['property_values'] += sum(len(values) for _, values, _ in chunk)
+
+        chunk = []
+        for number, row in enumerate(rows, start=1):
+            if not isinstance(row, dict):
+                fail(number, ['Row must be an object'])
+                continue
+            errors = []
+            item_type = (scalar_field(row, 'item_type_id', errors)
+                         or str(scalar_field(row, 'item_type', errors) or '').strip().lower())
+            if errors:
+                fail(number, errors)
+                continue
+            importer = importers.get(item_type)
+            if importer is None:
+                fail(number, [f'Unknown item type: {item_type}' if item_type else 'item_type is required'])
+                continue
+            validated, errors = importer.validate(row)
+            if errors:
+                fail(number, errors)
+                continue
+            chunk.append(validated)
+            if len(chunk) >= self.chunk_size:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+
+
+def _importers():
+    """ItemImporters of all item types by id and lower-case name"""
+    importers = {}
+    for item_type in ItemType.query.all():
+        importer = ItemImporter(item_type)
+        importers[str(item_type.id)] = importers[item_type.id] = importers[item_type.name.lower()] = importer
+    db.session.rollback()
+    return importers
+
+
+def load_seed_files(paths, chunk_size=20000):
+    """Bulk load JSON/CSV seed files, returns the number of rows per section and the item errors
+
+    Everything is written on one connection with LOAD_PRAGMAS applied and the
+    item indexes built after the data. The location tree and search index are
+    rebuilt once at the end.
+    """
+    sections = {section: [] for section in SECTIONS}
+    for path in paths:
+        for section, rows in read_seed(path).items():
+            sections[section].append(rows)
+    db.session.commit()
+
+    with db.engine.connect() as connection:
+        with loading_pragmas(connection):
+            loader = BulkLoader(connection, chunk_size)
+            for section in SECTIONS[:-1]:
+                getattr(loader, section)(list(chain.from_iterable(sections[section])))
+            connection.commit()
+            # Read through the session, which only sees committed reference data
+            importers = _importers()
+            with deferred_indexes(connection):
+                loader.items(chain.from_iterable(sections['items']), importers)
+
+    rebuild_location_tree()
+    rebuild_search_index()
+    # Written with Core statements, so caches and ETags only learn about it here
+    mark_changed(db.session, 'items', 'item_types', 'item_categories', 'tags', 'locations')
+    db.session.commit()
+    return loader.stats
+
+
+def print_stats(stats):
+    print(', '.join(f'{count} {name}' for name, count in stats.items() if name != 'errors'))
+    for error in stats['errors'][:20]:
+        print(f"Row {error['row']}: {'; '.join(error['errors'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk load JSON or CSV seed files into the database')
+    parser.add_argument('paths', nargs='+', help='Seed files, loaded in section order whatever their order')
+    parser.add_argument('--reset', action='store_true', help='Drop all tables first')
+    options = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        if options.reset:
+            db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        print_stats(load_seed_files(options.paths))
+        print(f"Loaded in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
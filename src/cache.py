@@ -0,0 +1,68 @@
+import threading
+import time
+from flask import request, jsonify, current_app
+from versions import current_versions, on_tables_changed
+
+
+class ResponseCache:
+    """Pre-serialized JSON responses of rarely changing endpoints
+
+    Entries are keyed by request path alone, the cached endpoints take no
+    parameters and junk ones must not grow the cache. They remember the
+    versions of the tables they were built from. Commits in this process drop
+    affected entries right away, commits of other processes are noticed through
+    the change versions, and REFERENCE_CACHE_TTL bounds the age of any entry.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def respond(self, tables, build):
+        """Cached response for the current request, build() returns the JSON data on a miss"""
+        key = request.path
+        versions = current_versions()
+        state = tuple(versions.get(table, (0, None))[0] for table in tables)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['state'] == state and entry['expires'] > now:
+                self.hits += 1
+                return current_app.response_class(entry['body'], mimetype='application/json')
+            self.misses += 1
+
+        response = jsonify(build())
+        with self._lock:
+            self._entries[key] = {
+                'tables': set(tables),
+                'state': state,
+                'body': response.get_data(),
+                'expires': now + current_app.config.get('REFERENCE_CACHE_TTL', 300)
+            }
+        return response
+
+    def invalidate(self, tables=None):
+        """Drop entries built from any of tables, or all entries"""
+        with self._lock:
+            if tables is None:
+                self._entries.clear()
+                return
+            for key in [key for key, entry in self._entries.items() if entry['tables'] & set(tables)]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None
+            }
+
+
+reference_cache = ResponseCache()
+on_tables_changed(reference_cache.invalidate)
@@ -0,0 +1,121 @@
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.expression import TextClause, UpdateBase
+from sqlalchemy.sql.ddl import ExecutableDDLElement
+
+# Bind key of the read-only engine next to the default (writer) engine
+READ_BIND = 'reader'
+
+# Leading keywords of text() statements that write
+WRITE_KEYWORDS = ('insert', 'update', 'delete', 'replace', 'create', 'drop', 'alter', 'vacuum', 'reindex',
+                  'analyze')
+
+
+def is_sqlite_file(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def configure_database(app):
+    """SQLite profile: WAL, one writer connection and a pool of read-only connections
+
+    Called before db.init_app(). With a file database the default engine
+    becomes the writer: a single pooled connection that starts transactions
+    with BEGIN IMMEDIATE, so concurrent writes of this process queue for the
+    connection and writes of other processes wait in busy_timeout instead of
+    failing halfway. Reads go to the READ_BIND engine, whose connections are
+    query_only and, thanks to WAL, never wait for the writer.
+    """
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if not is_sqlite_file(uri):
+        return
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {}).update({
+        'pool_size': 1,
+        'max_overflow': 0,
+        'pool_timeout': app.config['SQLITE_WRITE_TIMEOUT'],
+    })
+    app.config.setdefault('SQLALCHEMY_BINDS', {})[READ_BIND] = {
+        'url': uri,
+        'pool_size': app.config['SQLITE_READ_POOL_SIZE'],
+        'max_overflow': app.config['SQLITE_READ_POOL_SIZE'],
+    }
+
+
+def connection_pragmas(config):
+    return [
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('cache_size', config['SQLITE_CACHE_SIZE']),
+        ('temp_store', 'MEMORY'),
+    ]
+
+
+def init_engines(app, db):
+    """Register the connection events on the engines db.init_app() created"""
+    if not is_sqlite_file(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    pragmas = connection_pragmas(app.config)
+    with app.app_context():
+        writer, reader = db.engines[None], db.engines[READ_BIND]
+
+    @event.listens_for(writer, 'connect')
+    def configure_writer(dbapi_connection, connection_record):
+        for name, value in pragmas:
+            dbapi_connection.execute(f'PRAGMA {name} = {value}')
+        # Transactions are started by the begin event below instead of the driver
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer, 'begin')
+    def begin_immediate(connection):
+        # Take the write lock up front, a deferred transaction that reads first
+        # cannot wait for it later and fails with "database is locked"
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+    @event.listens_for(reader, 'connect')
+    def configure_reader(dbapi_connection, connection_record):
+        for name, value in pragmas:
+            dbapi_connection.execute(f'PRAGMA {name} = {value}')
+        dbapi_connection.execute('PRAGMA query_only = 1')
+
+
+def is_write(clause):
+    if isinstance(clause, (UpdateBase, ExecutableDDLElement)):
+        return True
+    if isinstance(clause, TextClause):
+        words = clause.text.split(None, 1)
+        return bool(words) and words[0].lower() in WRITE_KEYWORDS
+    return False
+
+
+class RoutingSession(Session):
+    """Session sending reads to the READ_BIND engine and everything else to the writer
+
+    Once a transaction flushed or wrote, all its statements stay on the writer
+    so they see its own uncommitted changes. Raw connections (session.connection())
+    always come from the writer.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None:
+            return engine
+        if (self.info.get('writing') or self._flushing or (mapper is None and clause is None)
+                or is_write(clause)):
+            self.info['writing'] = True
+            return engine
+        engines = current_app.extensions['sqlalchemy'].engines
+        if engine is not engines[None] or READ_BIND not in engines:
+            return engine
+        return engines[READ_BIND]
+
+
+def release_writer(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('writing', None)
+
+
+event.listen(RoutingSession, 'after_transaction_end', release_writer)
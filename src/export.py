@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import select, func, case
+from models import db, Item, ItemPropertyValue, Location, Tag, item_tags
+from filters import apply_item_filters
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Column holding the value of each property type, image properties have none
+TYPE_COLUMNS = {
+    'text': ItemPropertyValue.value_text,
+    'number': ItemPropertyValue.value_number,
+    'boolean': ItemPropertyValue.value_boolean,
+    'date': ItemPropertyValue.value_date,
+    'item_link': ItemPropertyValue.value_item_id,
+}
+
+# Item columns in front of the property columns; names match what the import accepts
+ITEM_COLUMNS = ['id', 'name', 'location', 'tags', 'created_at']
+
+
+def export_properties(item_type):
+    return [prop for prop in sorted(item_type.properties, key=lambda prop: prop.id)
+            if prop.property_type in TYPE_COLUMNS]
+
+
+def export_statement(item_type, args):
+    """One row per item of item_type with a column per property, filtered like the item list
+
+    Property values are pivoted in SQL with one aggregate per property, so rows
+    come out of the database complete and can be streamed as they arrive.
+    """
+    properties = export_properties(item_type)
+    tags = (
+        select(func.group_concat(Tag.name, ';'))
+        .join(item_tags, item_tags.c.tag_id == Tag.id)
+        .where(item_tags.c.item_id == Item.id)
+        .scalar_subquery()
+    )
+    statement = (
+        select(Item.id, Item.name, Location.name, tags, Item.created_at,
+               *[func.max(case((ItemPropertyValue.property_id == prop.id, TYPE_COLUMNS[prop.property_type])))
+                 for prop in properties])
+        .select_from(Item)
+        .outerjoin(Location, Location.id == Item.location_id)
+        # Joined on item_id alone so SQLite walks the item_id index per item; the
+        # aggregates pick the properties apart
+        .outerjoin(ItemPropertyValue, ItemPropertyValue.item_id == Item.id)
+        .where(Item.item_type_id == item_type.id)
+        .group_by(Item.id)
+        .order_by(Item.id)
+    )
+    statement, _ = apply_item_filters(statement, args)
+    return statement, ITEM_COLUMNS + [prop.name for prop in properties], properties
+
+
+def _format_value(value, property_type=None):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if property_type == 'boolean':
+        return bool(value)
+    return value
+
+
+def export_items(item_type, args, export_format='csv', batch_size=1000):
+    """Yield the export of item_type in chunks of text, memory stays constant in the number of items"""
+    statement, header, properties = export_statement(item_type, args)
+    types = [None] * len(ITEM_COLUMNS) + [prop.property_type for prop in properties]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == 'csv':
+        writer.writerow(header)
+
+    result = db.session.execute(statement, execution_options={'stream_results': True, 'yield_per': batch_size})
+    for rows in result.partitions():
+        for row in rows:
+            values = [_format_value(value, property_type) for value, property_type in zip(row, types)]
+            if export_format == 'csv':
+                writer.writerow(['' if value is None else str(value).lower() if isinstance(value, bool) else value
+                                 for value in values])
+            else:
+                buffer.write(json.dumps(dict(zip(header, values)), ensure_ascii=False) + '\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
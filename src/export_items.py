@@ -0,0 +1,36 @@
+import argparse
+import sys
+from werkzeug.datastructures import MultiDict
+from app import app
+from models import ItemType
+from export import export_items, EXPORT_FORMATS
+
+def main():
+    parser = argparse.ArgumentParser(description='Export all items of an item type, one column per property')
+    parser.add_argument('item_type', help='Item type id or name')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--output', '-o', help='Output file, defaults to stdout')
+    parser.add_argument('--filter', '-f', action='append', default=[], metavar='KEY=VALUE',
+                        help='Item list filter, e.g. location_id=abc or property_3_min=10 (repeatable)')
+    options = parser.parse_args()
+
+    # Same shape as request.args: get() returns one value, getlist() all repeated ones
+    filters = MultiDict(entry.partition('=')[::2] for entry in options.filter)
+
+    with app.app_context():
+        item_type = ItemType.query.filter(
+            (ItemType.id == options.item_type) | (ItemType.name == options.item_type)
+        ).first()
+        if not item_type:
+            sys.exit(f"Item type not found: {options.item_type}")
+
+        output = open(options.output, 'w', encoding='utf-8', newline='') if options.output else sys.stdout
+        try:
+            for chunk in export_items(item_type, filters, options.format):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+if __name__ == '__main__':
+    main()
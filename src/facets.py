@@ -0,0 +1,143 @@
+from sqlalchemy import select, func, case, cast, Integer, distinct
+from models import db, Item, Location, ItemType, ItemCategory, ItemProperty, ItemPropertyValue, Tag, item_tags
+from filters import apply_item_filters
+
+
+def _counts(statement):
+    return [{'id': row[0], 'name': row[1], 'count': row[2]}
+            for row in db.session.execute(statement)]
+
+
+def _option_facets(properties, item_ids):
+    """Count items per option value, options without matches are reported with 0"""
+    if not properties:
+        return {}
+    counts = {}
+    rows = db.session.execute(
+        select(ItemPropertyValue.property_id, ItemPropertyValue.value_text,
+               func.count(distinct(ItemPropertyValue.item_id)))
+        .where(ItemPropertyValue.property_id.in_([prop.id for prop in properties]),
+               ItemPropertyValue.item_id.in_(item_ids))
+        .group_by(ItemPropertyValue.property_id, ItemPropertyValue.value_text)
+    )
+    for property_id, value, count in rows:
+        counts.setdefault(property_id, {})[value] = count
+
+    facets = {}
+    for prop in properties:
+        found = counts.get(prop.id, {})
+        facets[prop.id] = [{'value': option, 'count': found.get(option, 0)} for option in prop.options]
+    return facets
+
+
+def _range_facet(prop, item_ids, bucket_count):
+    """Min, max and equal-width histogram of a number or date property"""
+    if prop.property_type == 'number':
+        column = ItemPropertyValue.value_number
+        position = column
+    else:
+        column = ItemPropertyValue.value_date
+        # julianday() gives dates a numeric scale to bucket on
+        position = func.julianday(column)
+
+    scope = (ItemPropertyValue.property_id == prop.id, ItemPropertyValue.item_id.in_(item_ids), column.isnot(None))
+    low, high, low_position, high_position, count = db.session.execute(
+        select(func.min(column), func.max(column), func.min(position), func.max(position), func.count())
+        .where(*scope)
+    ).one()
+    if count == 0:
+        return {'min': None, 'max': None, 'buckets': []}
+
+    span = high_position - low_position
+    buckets = bucket_count if span > 0 else 1
+    width = span / buckets if span > 0 else 1
+    # The maximum belongs to the last bucket instead of opening a new one
+    bucket = case((position >= high_position, buckets - 1),
+                  else_=cast((position - low_position) / width, Integer))
+    bucket_counts = dict(db.session.execute(
+        select(bucket, func.count()).where(*scope).group_by(bucket)
+    ).all())
+
+    def edge(index):
+        offset = index * width if span > 0 else 0
+        if prop.property_type == 'number':
+            return low + offset
+        return int(low.timestamp() + offset * 86400)
+
+    def value(raw):
+        return raw if prop.property_type == 'number' else int(raw.timestamp())
+
+    return {
+        'min': value(low),
+        'max': value(high),
+        'buckets': [{
+            'from': edge(index),
+            'to': edge(index + 1) if index < buckets - 1 else value(high),
+            'count': bucket_counts.get(index, 0)
+        } for index in range(buckets)]
+    }
+
+
+def compute_facets(args, bucket_count=10):
+    """Facet counts for the items matching the item list filters in args
+
+    Location, type, category and tag counts cover all matching items. Property
+    facets are computed for the properties of the filtered item type only,
+    since property filters are offered per type.
+    """
+    filtered, _ = apply_item_filters(select(Item.id), args)
+    # Never correlate with the items table of the aggregate queries below
+    item_ids = filtered.correlate(None)
+
+    total = db.session.execute(select(func.count()).select_from(filtered.subquery())).scalar()
+
+    facets = {
+        'total': total,
+        'locations': _counts(
+            select(Item.location_id, Location.name, func.count())
+            .outerjoin(Location, Location.id == Item.location_id)
+            .where(Item.id.in_(item_ids))
+            .group_by(Item.location_id, Location.name)
+            .order_by(func.count().desc())
+        ),
+        'item_types': _counts(
+            select(ItemType.id, ItemType.name, func.count())
+            .join(Item, Item.item_type_id == ItemType.id)
+            .where(Item.id.in_(item_ids))
+            .group_by(ItemType.id, ItemType.name)
+            .order_by(func.count().desc())
+        ),
+        'categories': _counts(
+            select(ItemType.category_id, ItemCategory.name, func.count())
+            .select_from(Item)
+            .join(ItemType, ItemType.id == Item.item_type_id)
+            .outerjoin(ItemCategory, ItemCategory.id == ItemType.category_id)
+            .where(Item.id.in_(item_ids))
+            .group_by(ItemType.category_id, ItemCategory.name)
+            .order_by(func.count().desc())
+        ),
+        'tags': _counts(
+            select(Tag.id, Tag.name, func.count(distinct(item_tags.c.item_id)))
+            .join(item_tags, item_tags.c.tag_id == Tag.id)
+            .where(item_tags.c.item_id.in_(item_ids))
+            .group_by(Tag.id, Tag.name)
+            .order_by(func.count(distinct(item_tags.c.item_id)).desc())
+        ),
+        'properties': []
+    }
+
+    if not args.get('item_type_id'):
+        return facets
+
+    properties = ItemProperty.query.filter_by(item_type_id=args.get('item_type_id')).order_by(ItemProperty.id).all()
+    options = _option_facets([prop for prop in properties if prop.options], item_ids)
+    for prop in properties:
+        entry = {'id': prop.id, 'name': prop.name, 'property_type': prop.property_type}
+        if prop.id in options:
+            entry['options'] = options[prop.id]
+        elif prop.property_type in ('number', 'date'):
+            entry.update(_range_facet(prop, item_ids, bucket_count))
+        else:
+            continue
+        facets['properties'].append(entry)
+    return facets
@@ -0,0 +1,206 @@
+import os
+import mimetypes
+from flask import current_app
+from models import db, Item, ItemType, ItemFile, Blob
+from utils import normalize_filename
+from thumbnails import remove_thumbnails
+from blobs import blob_path, hash_file, store_copy, release_blob, delete_after_commit
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif']
+
+
+def is_image_filename(filename):
+    return any(filename.lower().endswith(ext) for ext in IMAGE_EXTENSIONS)
+
+
+def main_image_names(item_id):
+    """Names the item's main image is recorded under, one per image extension"""
+    return [f'{item_id}{ext}' for ext in IMAGE_EXTENSIONS]
+
+
+def relative_storage_path(item_id, type_folder, filename):
+    """Path of a file in the per-type folder layout that predates the blob store"""
+    if is_image_filename(filename):
+        return f'pictures/items/{type_folder}/{filename}'
+    return f'uploads/items/{type_folder}/{item_id}/{filename}'
+
+
+def absolute_storage_path(relative_path):
+    """Resolve a static-relative path against the configured storage folders"""
+    root, _, rest = relative_path.partition('/')
+    if root == 'pictures':
+        return os.path.join(current_app.config['PICTURES_FOLDER'], *rest.split('/'))
+    if root == 'uploads':
+        return os.path.join(current_app.config['UPLOAD_FOLDER'], *rest.split('/'))
+    if root == 'blobs':
+        return os.path.join(current_app.config['BLOBS_FOLDER'], *rest.split('/'))
+    return os.path.join(current_app.static_folder, *relative_path.split('/'))
+
+
+def record_item_file(item, blob, original_filename):
+    """Add the manifest entry for a stored blob under the name it was uploaded with"""
+    item_file = ItemFile(
+        item=item,
+        blob=blob,
+        filename=blob.filename,
+        original_filename=original_filename,
+        mime_type=mimetypes.guess_type(original_filename)[0],
+        size=blob.size,
+        is_image=is_image_filename(original_filename)
+    )
+    db.session.add(item_file)
+    return item_file
+
+
+def add_item_file(item, blob, original_filename):
+    """Record an uploaded file, names taken by other content get a counter appended
+
+    Uploading the same content under the same name again returns the existing entry.
+    """
+    taken = {f.original_filename: f for f in ItemFile.query.filter_by(item_id=item.id)}
+    base, ext = os.path.splitext(original_filename)
+    name = original_filename
+    counter = 1
+    while name in taken:
+        if taken[name].blob_sha256 == blob.sha256:
+            return taken[name]
+        name = f'{base}_{counter}{ext}'
+        counter += 1
+    return record_item_file(item, blob, name)
+
+
+def delete_stored_file(relative_path):
+    """Delete a stored file from disk, manifest entries are left to the caller"""
+    file_path = absolute_storage_path(relative_path)
+    remove_thumbnails(file_path)
+    if os.path.isfile(file_path):
+        os.remove(file_path)
+    # Per-item upload folders are removed once they are empty
+    folder = os.path.dirname(file_path)
+    if relative_path.startswith('uploads/') and os.path.isdir(folder) and not os.listdir(folder):
+        os.rmdir(folder)
+
+
+def remove_item_file(item_file):
+    """Drop a manifest entry, its content is deleted on commit unless other entries share it"""
+    db.session.delete(item_file)
+    if item_file.blob_sha256:
+        release_blob(item_file.blob_sha256)
+    else:
+        delete_after_commit(delete_stored_file, item_file.filename)
+
+
+def _scan_disk(items_by_id, type_folders):
+    """Yield (item_id, relative_path, filename) for every attributable file on disk"""
+    upload_root = os.path.join(current_app.config['UPLOAD_FOLDER'], 'items')
+    for type_folder in type_folders:
+        type_path = os.path.join(upload_root, type_folder)
+        if not os.path.isdir(type_path):
+            continue
+        for item_id in os.listdir(type_path):
+            item_path = os.path.join(type_path, item_id)
+            if item_id not in items_by_id or not os.path.isdir(item_path):
+                continue
+            for filename in os.listdir(item_path):
+                if os.path.isfile(os.path.join(item_path, filename)):
+                    yield item_id, f'uploads/items/{type_folder}/{item_id}/{filename}', filename
+
+    # Item images are named after the item id
+    pictures_root = os.path.join(current_app.config['PICTURES_FOLDER'], 'items')
+    for type_folder in type_folders:
+        type_path = os.path.join(pictures_root, type_folder)
+        if not os.path.isdir(type_path):
+            continue
+        for filename in os.listdir(type_path):
+            item_id = os.path.splitext(filename)[0]
+            if item_id in items_by_id and os.path.isfile(os.path.join(type_path, filename)):
+                yield item_id, f'pictures/items/{type_folder}/{filename}', filename
+
+
+def reconcile_item_files():
+    """Rebuild the file manifest from the upload and picture folders
+
+    Entries whose file disappeared are dropped, files that are on disk but
+    missing from the manifest are added and sizes are refreshed. Returns a dict
+    with the number of added, updated and removed entries.
+    """
+    stats = {'added': 0, 'updated': 0, 'removed': 0}
+    type_names = {item_type.id: normalize_filename(item_type.name) for item_type in ItemType.query.all()}
+    items_by_id = {item_id: item_type_id for item_id, item_type_id in
+                   db.session.query(Item.id, Item.item_type_id)}
+    existing = {(f.item_id, f.filename): f for f in ItemFile.query.all()}
+
+    found = set()
+    for item_id, relative_path, filename in _scan_disk(items_by_id, set(type_names.values())):
+        # Only attribute files found under the item's current type folder
+        if relative_path.split('/')[2] != type_names.get(items_by_id[item_id]):
+            continue
+        found.add((item_id, relative_path))
+        size = os.path.getsize(absolute_storage_path(relative_path))
+        item_file = existing.get((item_id, relative_path))
+        if item_file is None:
+            db.session.add(ItemFile(
+                item_id=item_id,
+                filename=relative_path,
+                original_filename=filename,
+                mime_type=mimetypes.guess_type(filename)[0],
+                size=size,
+                is_image=is_image_filename(filename)
+            ))
+            stats['added'] += 1
+        elif item_file.size != size:
+            item_file.size = size
+            stats['updated'] += 1
+
+    for key, item_file in existing.items():
+        if key in found:
+            continue
+        # Files uploaded under their own name are not attributable by path alone
+        if os.path.isfile(absolute_storage_path(item_file.filename)):
+            continue
+        db.session.delete(item_file)
+        stats['removed'] += 1
+
+    db.session.commit()
+    return stats
+
+
+def migrate_item_files(batch_size=500):
+    """Move files of the per-type folder layout into the blob store
+
+    Files are copied into the store first and their originals deleted only once
+    the batch is committed, so an interrupted run can simply be started again.
+    Returns a dict with the number of migrated files, files whose content was
+    stored already and entries whose file is missing.
+    """
+    stats = {'migrated': 0, 'deduplicated': 0, 'missing': 0}
+    last_id = 0
+    while True:
+        batch = (ItemFile.query.filter(ItemFile.blob_sha256.is_(None), ItemFile.id > last_id)
+                 .order_by(ItemFile.id).limit(batch_size).all())
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        originals = []
+        for item_file in batch:
+            path = absolute_storage_path(item_file.filename)
+            if not os.path.isfile(path):
+                stats['missing'] += 1
+                continue
+            sha256 = hash_file(path)
+            blob = db.session.get(Blob, sha256)
+            if blob is not None and os.path.isfile(blob_path(blob)):
+                stats['deduplicated'] += 1
+            else:
+                blob = store_copy(path, os.path.splitext(path)[1], sha256)
+                stats['migrated'] += 1
+            originals.append(item_file.filename)
+            item_file.blob = blob
+            item_file.filename = blob.filename
+            item_file.size = blob.size
+        db.session.commit()
+
+        for relative_path in originals:
+            delete_stored_file(relative_path)
+    return stats
@@ -0,0 +1,147 @@
+import re
+from datetime import timedelta
+from sqlalchemy import select
+from models import Item, ItemType, ItemProperty, ItemPropertyValue, item_tags, parse_date_value, TRUE_VALUES, FALSE_VALUES
+from search import apply_search
+from location_tree import subtree_ids
+
+# property_<id>, property_<id>_min and property_<id>_max
+PROPERTY_FILTER = re.compile(r'^property_(\d+)(?:_(min|max))?$')
+
+
+class FilterError(ValueError):
+    """Raised for filter parameters that cannot be applied"""
+
+
+def _values(args, key):
+    """All values of a parameter, from request args (MultiDict) or a plain dict"""
+    if hasattr(args, 'getlist'):
+        return [value for value in args.getlist(key) if value != '']
+    value = args.get(key)
+    if value is None or value == '':
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def parse_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise FilterError(f'Invalid number: {value}')
+
+
+def parse_boolean(value):
+    if isinstance(value, bool):
+        return value
+    normalized = str(value).strip().lower()
+    if normalized in TRUE_VALUES:
+        return True
+    if normalized in FALSE_VALUES:
+        return False
+    raise FilterError(f'Invalid boolean: {value}')
+
+
+def parse_date(value, end_of_day=False):
+    """Parse a filter date; plain dates cover the whole day when end_of_day is set"""
+    parsed = parse_date_value(value)
+    if parsed is None:
+        raise FilterError(f'Invalid date: {value}')
+    if parsed.tzinfo is not None:
+        parsed = parsed.replace(tzinfo=None)
+    if end_of_day and isinstance(value, str) and len(value) == 10:
+        parsed += timedelta(days=1) - timedelta(microseconds=1)
+    return parsed
+
+
+def _property_condition(prop, values, bound):
+    """SQL condition on ItemPropertyValue for one property filter"""
+    property_type = prop.property_type
+
+    if bound is not None:
+        if property_type == 'number':
+            limit = parse_number(values[0])
+            column = ItemPropertyValue.value_number
+        elif property_type == 'date':
+            limit = parse_date(values[0], end_of_day=(bound == 'max'))
+            column = ItemPropertyValue.value_date
+        else:
+            raise FilterError(f'Range filters are not supported for {property_type} property {prop.name}')
+        return column >= limit if bound == 'min' else column <= limit
+
+    if property_type == 'number':
+        return ItemPropertyValue.value_number.in_([parse_number(value) for value in values])
+    if property_type == 'boolean':
+        return ItemPropertyValue.value_boolean == parse_boolean(values[0])
+    if property_type == 'date':
+        start = parse_date(values[0])
+        return ItemPropertyValue.value_date.between(start, parse_date(values[0], end_of_day=True))
+    if property_type == 'item_link':
+        return ItemPropertyValue.value_item_id.in_(values)
+    if prop.options:
+        # Select-style properties match their option values exactly
+        return ItemPropertyValue.value_text.in_(values)
+    return ItemPropertyValue.value_text.ilike(f'%{values[0]}%')
+
+
+def apply_property_filters(query, args):
+    """Apply property_<id>[_min|_max] filters to an item query or select"""
+    filters = {}
+    for key in args.keys():
+        match = PROPERTY_FILTER.match(key)
+        if match:
+            values = _values(args, key)
+            if values:
+                filters.setdefault(int(match.group(1)), []).append((match.group(2), values))
+    if not filters:
+        return query
+
+    # One lookup for the types of all filtered properties
+    properties = {prop.id: prop for prop in ItemProperty.query.filter(ItemProperty.id.in_(filters))}
+
+    for property_id, conditions in filters.items():
+        prop = properties.get(property_id)
+        if prop is None:
+            raise FilterError(f'Unknown property: {property_id}')
+        # Each property is an independent semi-join, so any number of them combine
+        # with AND; min and max of the same property share one index range scan
+        matching = select(ItemPropertyValue.item_id).where(
+            ItemPropertyValue.property_id == property_id,
+            *[_property_condition(prop, values, bound) for bound, values in conditions]
+        )
+        query = query.filter(Item.id.in_(matching))
+    return query
+
+
+def apply_item_filters(query, args):
+    """Apply the item list filters in args to an item query or select
+
+    Returns the filtered query and the search rank column, which is None when
+    no full-text search was requested.
+    """
+    rank = None
+    if args.get('search'):
+        query, rank = apply_search(query, args.get('search'))
+
+    if args.get('location_id'):
+        # include_descendants also matches items in every location below it
+        if parse_boolean(args.get('include_descendants', False)):
+            query = query.filter(Item.location_id.in_(subtree_ids(args.get('location_id'))))
+        else:
+            query = query.filter(Item.location_id == args.get('location_id'))
+
+    if args.get('item_type_id'):
+        query = query.filter(Item.item_type_id == args.get('item_type_id'))
+
+    if args.get('category_id'):
+        query = query.filter(Item.item_type_id.in_(
+            select(ItemType.id).where(ItemType.category_id == args.get('category_id'))
+        ))
+
+    # Repeated tag_id parameters match items carrying any of the tags
+    tag_ids = _values(args, 'tag_id')
+    if tag_ids:
+        query = query.filter(Item.id.in_(
+            select(item_tags.c.item_id).where(item_tags.c.tag_id.in_(tag_ids))
+        ))
+
+    return apply_property_filters(query, args), rank
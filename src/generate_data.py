@@ -0,0 +1,313 @@
+import argparse
+import io
+import random
+import time
+from datetime import datetime, timedelta
+import shortuuid
+from PIL import Image, ImageDraw
+from sqlalchemy import select
+from app import app, db
+from models import (ItemCategory, ItemType, ItemProperty, Location, Tag, Item, ItemPropertyValue, ItemFile,
+                    item_tags, item_subitems, item_links)
+from blobs import store_stream, blob_path
+from thumbnails import render_thumbnails, thumbnail_options
+from location_tree import rebuild_location_tree
+from search import rebuild_search_index
+from versions import mark_changed
+from bulk_load import executemany
+
+# category: (icon, color, [(item type, names, [(property, property type, required)])])
+CATALOGUE = {
+    'Requisiten': ('box', 'primary', [
+        ('Handrequisit', ['Schwert', 'Degen', 'Becher', 'Krone', 'Zepter', 'Laterne', 'Buch', 'Brief', 'Fächer',
+                          'Schädel', 'Pokal', 'Kerzenständer'],
+         [('Material', 'text', True), ('Maße (cm)', 'text', False), ('Gewicht (g)', 'number', False),
+          ('Zerbrechlich', 'boolean', False), ('Letzte Reparatur', 'date', False)]),
+        ('Möbelstück', ['Stuhl', 'Thron', 'Tisch', 'Sessel', 'Truhe', 'Schrank', 'Bank', 'Bett', 'Kommode'],
+         [('Material', 'text', True), ('Maße (cm)', 'text', True), ('Epoche', 'text', False),
+          ('Zerlegbar', 'boolean', False), ('Max. Belastung (kg)', 'number', False)]),
+    ]),
+    'Kostüme': ('person-badge', 'success', [
+        ('Kostüm', ['Kleid', 'Gehrock', 'Mantel', 'Uniform', 'Kutte', 'Wams', 'Rüstung', 'Anzug', 'Umhang'],
+         [('Größe', 'text', True), ('Epoche/Stil', 'text', False), ('Material', 'text', False),
+          ('Waschbar', 'boolean', False), ('Letzte Reinigung', 'date', False)]),
+        ('Accessoire', ['Hut', 'Perücke', 'Handschuhe', 'Stiefel', 'Gürtel', 'Maske', 'Schal', 'Fächer'],
+         [('Größe', 'text', False), ('Material', 'text', False), ('Epoche/Stil', 'text', False)]),
+    ]),
+    'Technik': ('lightbulb', 'warning', [
+        ('Scheinwerfer', ['Profilscheinwerfer', 'Stufenlinse', 'PAR-Scheinwerfer', 'Moving Head', 'Verfolger'],
+         [('Typ', 'text', True), ('Leistung (W)', 'number', True), ('DMX-Adresse', 'text', False),
+          ('Betriebsstunden', 'number', False), ('Letzte Wartung', 'date', False)]),
+        ('Tontechnik', ['Mikrofon', 'Lautsprecher', 'Mischpult', 'Funkstrecke', 'Kabeltrommel'],
+         [('Typ', 'text', True), ('Seriennummer', 'text', False), ('Letzte Wartung', 'date', False)]),
+    ]),
+    'Bühnenbau': ('building', 'info', [
+        ('Bühnenelement', ['Kulissenwand', 'Podest', 'Treppe', 'Prospekt', 'Säule', 'Tür', 'Fenster'],
+         [('Art', 'text', True), ('Maße (cm)', 'text', True), ('Material', 'text', False),
+          ('Gewicht (kg)', 'number', False), ('Feuergeschützt', 'boolean', False)]),
+    ]),
+}
+
+TEXT_VALUES = {
+    'Material': ['Holz', 'Metall', 'Samt', 'Seide', 'Leinen', 'Kunststoff', 'Pappmaché', 'Leder', 'Glas', 'Styropor'],
+    'Epoche': ['Antike', 'Mittelalter', 'Renaissance', 'Barock', 'Rokoko', 'Biedermeier', 'Gründerzeit', 'Moderne'],
+    'Epoche/Stil': ['Antike', 'Mittelalter', 'Renaissance', 'Barock', 'Rokoko', 'Biedermeier', '1920er', '1950er'],
+    'Größe': ['XS', 'S', 'M', 'L', 'XL', '36', '38', '40', '42', '44', '48', '52'],
+    'Typ': ['LED', 'Halogen', 'Entladungslampe', 'Dynamisch', 'Kondensator', 'Aktiv', 'Passiv'],
+    'Art': ['Kulissenwand', 'Podest', 'Versatzstück', 'Prospekt', 'Bühnenwagen'],
+}
+NUMBER_RANGES = {
+    'Gewicht (g)': (10, 5000), 'Max. Belastung (kg)': (20, 400), 'Leistung (W)': (50, 2000),
+    'Betriebsstunden': (0, 20000), 'Gewicht (kg)': (1, 300),
+}
+COLOURS = ['rot', 'blau', 'grün', 'schwarz', 'weiß', 'golden', 'silbern', 'braun', 'violett', 'grau']
+TAGS = [('Defekt', 'danger'), ('Neu', 'success'), ('In Verwendung', 'warning'), ('Wartung fällig', 'info'),
+        ('Wichtig', 'primary'), ('Archiviert', 'secondary'), ('Reinigung nötig', 'warning'),
+        ('Reparatur nötig', 'danger'), ('Ausgeliehen', 'info'), ('Historisch', 'dark')]
+# Names per level of the location tree, deeper levels repeat the last one
+LOCATION_LEVELS = ['Gebäude', 'Raum', 'Regal', 'Fach', 'Kiste']
+
+
+class Generator:
+    """Deterministic synthetic inventory, the same seed and count give the same data"""
+
+    def __init__(self, count, seed=0, image_ratio=0.3, kit_ratio=0.05, link_ratio=0.1, placeholders=12,
+                 chunk_size=10000):
+        self.count = count
+        self.random = random.Random(seed)
+        self.image_ratio = image_ratio
+        self.kit_ratio = kit_ratio
+        self.link_ratio = link_ratio
+        self.placeholders = placeholders
+        self.chunk_size = chunk_size
+        self.now = datetime.utcnow()
+        self.taken = None
+        self.stats = {'items': 0, 'locations': 0, 'property_values': 0, 'tags': 0, 'files': 0,
+                      'subitems': 0, 'links': 0}
+
+    def insert(self, table, rows):
+        """Insert rows (dicts) into a table or model, in one executemany"""
+        if rows:
+            executemany(db.session.connection(), getattr(table, '__table__', table), rows)
+
+    def new_ids(self, count):
+        """Random item or location ids, skipping the ones already in the database"""
+        if self.taken is None:
+            self.taken = set(db.session.execute(select(Item.id)).scalars())
+            self.taken.update(db.session.execute(select(Location.id)).scalars())
+        alphabet = shortuuid.get_alphabet()
+        ids = set()
+        while len(ids) < count:
+            new_id = ''.join(self.random.choices(alphabet, k=8))
+            if new_id not in self.taken:
+                ids.add(new_id)
+        self.taken.update(ids)
+        ids = sorted(ids)
+        self.random.shuffle(ids)
+        return ids
+
+    def timestamp(self, days=3 * 365):
+        return self.now - timedelta(seconds=self.random.randrange(days * 86400))
+
+    def reference_data(self):
+        """Categories, item types with properties and tags, existing ones are reused by name"""
+        types = []
+        for category_name, (icon, color, type_specs) in CATALOGUE.items():
+            category = ItemCategory.query.filter_by(name=category_name).first()
+            if category is None:
+                category = ItemCategory(name=category_name, icon=icon, color=color)
+                db.session.add(category)
+            for type_name, names, properties in type_specs:
+                item_type = ItemType.query.filter_by(name=type_name).first()
+                if item_type is None:
+                    item_type = ItemType(name=type_name, category=category)
+                    item_type.properties.extend(ItemProperty(name=name, property_type=property_type, required=required)
+                                                for name, property_type, required in properties)
+                    db.session.add(item_type)
+                types.append((item_type, names))
+        tags = []
+        for name, color in TAGS:
+            tag = Tag.query.filter_by(name=name).first()
+            if tag is None:
+                tag = Tag(name=name, color=color)
+                db.session.add(tag)
+            tags.append(tag)
+        db.session.commit()
+        self.types = [(item_type.id, names, [(prop.id, prop.name, prop.property_type, prop.required)
+                                             for prop in item_type.properties])
+                      for item_type, names in types]
+        self.tag_ids = [tag.id for tag in tags]
+
+    def locations(self):
+        """A tree of about count / 25 locations, 3-12 children per location"""
+        total = max(10, self.count // 25)
+        ids = self.new_ids(total)
+        rows = []
+        level = []
+        for index in range(min(3, total)):
+            rows.append({'id': ids[index], 'name': f'{LOCATION_LEVELS[0]} {chr(65 + index)}', 'parent_id': None})
+            level.append((ids[index], 0))
+        while len(rows) < total:
+            next_level = []
+            for parent_id, depth in level:
+                kind = LOCATION_LEVELS[min(depth + 1, len(LOCATION_LEVELS) - 1)]
+                for number in range(1, self.random.randint(3, 12) + 1):
+                    if len(rows) == total:
+                        break
+                    location_id = ids[len(rows)]
+                    rows.append({'id': location_id, 'name': f'{kind} {number}', 'parent_id': parent_id})
+                    next_level.append((location_id, depth + 1))
+            level = next_level
+        for row in rows:
+            row['description'] = None
+            row['created_at'] = row['updated_at'] = self.timestamp()
+        self.insert(Location, rows)
+        db.session.commit()
+        rebuild_location_tree()
+        self.location_ids = ids
+        self.stats['locations'] = total
+
+    def placeholder_images(self):
+        """A few distinct JPEGs in the blob store, items share them like duplicate uploads would"""
+        blobs = []
+        for number in range(self.placeholders):
+            hue = number * 360 // max(1, self.placeholders)
+            image = Image.new('RGB', (640, 480), f'hsl({hue}, 45%, 70%)')
+            draw = ImageDraw.Draw(image)
+            draw.ellipse((170, 90, 470, 390), fill=f'hsl({(hue + 180) % 360}, 45%, 40%)')
+            draw.text((20, 20), f'Platzhalter {number + 1}', fill='black')
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=80)
+            buffer.seek(0)
+            blob = store_stream(buffer, '.jpg')
+            render_thumbnails(blob_path(blob), *thumbnail_options())
+            blobs.append(blob)
+        db.session.commit()
+        self.blobs = [(blob.sha256, blob.filename, blob.size) for blob in blobs]
+
+    def property_value(self, property_id, name, property_type):
+        value = {'property_id': property_id, 'value_text': None, 'value_number': None, 'value_boolean': None,
+                 'value_date': None, 'value_item_id': None}
+        if property_type == 'text':
+            if name in TEXT_VALUES:
+                value['value_text'] = self.random.choice(TEXT_VALUES[name])
+            elif name == 'Maße (cm)':
+                value['value_text'] = 'x'.join(str(self.random.randint(5, 400)) for _ in range(3))
+            else:
+                value['value_text'] = f'{self.random.randrange(1000, 100000)}'
+        elif property_type == 'number':
+            low, high = NUMBER_RANGES.get(name, (0, 1000))
+            value['value_number'] = float(self.random.randint(low, high))
+        elif property_type == 'boolean':
+            value['value_boolean'] = self.random.random() < 0.5
+        elif property_type == 'date':
+            value['value_date'] = self.timestamp(5 * 365)
+        return value
+
+    def items(self, progress=None):
+        """Items with property values, tags, images and kits, committed chunk by chunk"""
+        ids = self.new_ids(self.count)
+        # Deeper locations hold most of the items
+        locations = self.location_ids[len(self.location_ids) // 10:] or self.location_ids
+        for start in range(0, self.count, self.chunk_size):
+            end = min(start + self.chunk_size, self.count)
+            items, values, tags, files, subitems = [], [], [], [], []
+            for index in range(start, end):
+                item_id = ids[index]
+                type_id, names, properties = self.random.choice(self.types)
+                created_at = self.timestamp()
+                items.append({
+                    'id': item_id,
+                    'name': f'{self.random.choice(names)} ({self.random.choice(COLOURS)}) #{index + 1}',
+                    'location_id': self.random.choice(locations) if self.random.random() < 0.95 else None,
+                    'item_type_id': type_id,
+                    'created_at': created_at,
+                    'updated_at': created_at
+                })
+                for property_id, name, property_type, required in properties:
+                    if required or self.random.random() < 0.6:
+                        values.append({**self.property_value(property_id, name, property_type), 'item_id': item_id,
+                                       'created_at': created_at, 'updated_at': created_at})
+                for tag_id in self.random.sample(self.tag_ids, self.random.choice([0, 0, 1, 1, 2, 3])):
+                    tags.append({'item_id': item_id, 'tag_id': tag_id})
+                if self.blobs and self.random.random() < self.image_ratio:
+                    sha256, filename, size = self.random.choice(self.blobs)
+                    files.append({'item_id': item_id, 'filename': filename, 'blob_sha256': sha256,
+                                  'original_filename': f'{item_id}.jpg', 'mime_type': 'image/jpeg', 'size': size,
+                                  'is_image': True, 'created_at': created_at, 'updated_at': created_at})
+                # Kits take their pieces from the items after them, so there are no cycles
+                if self.random.random() < self.kit_ratio:
+                    pieces = range(index + 1, min(end, index + 1 + self.random.randint(2, 8)))
+                    subitems.extend({'parent_id': item_id, 'child_id': ids[piece]} for piece in pieces)
+
+            self.insert(Item, items)
+            self.insert(ItemPropertyValue, values)
+            self.insert(item_tags, tags)
+            self.insert(ItemFile, files)
+            self.insert(item_subitems, subitems)
+            db.session.commit()
+            for key, rows in (('items', items), ('property_values', values), ('tags', tags), ('files', files),
+                              ('subitems', subitems)):
+                self.stats[key] += len(rows)
+            if progress:
+                progress(end, self.count)
+        self.item_ids = ids
+
+    def links(self):
+        """Productions: groups of 5-30 items, each linked to one of the group joined before it"""
+        linked = int(self.count * self.link_ratio)
+        members = self.random.sample(self.item_ids, min(linked, len(self.item_ids)))
+        rows = []
+        while members:
+            group = [members.pop() for _ in range(min(len(members), self.random.randint(5, 30)))]
+            rows.extend({'item_a_id': item_id, 'item_b_id': self.random.choice(group[:position])}
+                        for position, item_id in enumerate(group) if position)
+        for start in range(0, len(rows), self.chunk_size):
+            self.insert(item_links, rows[start:start + self.chunk_size])
+        db.session.commit()
+        self.stats['links'] = len(rows)
+
+    def run(self, progress=None):
+        self.reference_data()
+        self.locations()
+        self.blobs = []
+        if self.placeholders:
+            self.placeholder_images()
+        self.items(progress)
+        self.links()
+        rebuild_search_index()
+        # Written with Core statements, so caches and ETags only learn about it here
+        mark_changed(db.session, 'items', 'locations', 'item_types', 'tags', 'item_categories', 'item_links')
+        db.session.commit()
+        return self.stats
+
+
+def generate_inventory(count, seed=0, progress=None, **options):
+    """Add a synthetic inventory of count items to the database, returns row counts"""
+    return Generator(count, seed, **options).run(progress)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add a synthetic inventory to the database for load tests')
+    parser.add_argument('count', type=int, help='Number of items, e.g. 10000 to 1000000')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed gives the same data')
+    parser.add_argument('--images', type=float, default=0.3, help='Share of items with a placeholder image')
+    parser.add_argument('--kits', type=float, default=0.05, help='Share of items that are kits of sub-items')
+    parser.add_argument('--links', type=float, default=0.1, help='Share of items linked into productions')
+    parser.add_argument('--reset', action='store_true', help='Drop all tables first')
+    options = parser.parse_args()
+
+    with app.app_context():
+        if options.reset:
+            db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        progress = lambda done, total: print(f"{done}/{total} items", flush=True)
+        stats = generate_inventory(options.count, options.seed, progress, image_ratio=options.images,
+                                   kit_ratio=options.kits, link_ratio=options.links)
+        print(', '.join(f'{count} {name}' for name, count in stats.items()))
+        print(f"Generated in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
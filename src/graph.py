@@ -0,0 +1,171 @@
+import threading
+from collections import deque
+from sqlalchemy import event, select, insert, delete, case, or_, and_, bindparam
+from sqlalchemy.orm.attributes import get_history, PASSIVE_NO_INITIALIZE
+from models import db, Item, ItemType, item_links
+from versions import current_versions, mark_changed, on_tables_changed
+
+links = item_links.c
+
+MAX_HOPS = 6
+MAX_GRAPH_ITEMS = 1000
+
+# Everything reachable from item_id over links in either direction. Both
+# directions are matched in one recursive step, SQLite answers the OR with the
+# primary key and the item_b_id index. UNION ends the walk at known items.
+_reached = select(bindparam('item_id', type_=db.String).label('id')).cte('reached', recursive=True)
+_reached = _reached.union(
+    select(case((links.item_a_id == _reached.c.id, links.item_b_id), else_=links.item_a_id))
+    .select_from(item_links)
+    .join(_reached, or_(links.item_a_id == _reached.c.id, links.item_b_id == _reached.c.id))
+)
+COMPONENT_STATEMENT = select(links.item_a_id, links.item_b_id).where(links.item_a_id.in_(select(_reached.c.id)))
+
+
+class GraphError(ValueError):
+    """Raised for link changes or graph queries that cannot be carried out"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class LinkGraph:
+    """Undirected adjacency of item_links, loaded one connected component at a time
+
+    A component is fetched with one recursive query the first time any of its
+    items is asked for and shared by all of them afterwards. Commits that
+    change item_links drop everything, other processes' commits are noticed
+    through the change versions.
+    """
+
+    def __init__(self, max_items=200000):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._version = None
+        self._components = {}
+        self.hits = 0
+        self.misses = 0
+
+    def component(self, item_id):
+        """{item_id: set of neighbour ids} for the component item_id belongs to"""
+        version = current_versions().get('item_links', (0, None))[0]
+        with self._lock:
+            if self._version != version:
+                self._components.clear()
+                self._version = version
+            adjacency = self._components.get(item_id)
+            if adjacency is not None:
+                self.hits += 1
+                return adjacency
+            self.misses += 1
+
+        adjacency = {item_id: set()}
+        for item_a_id, item_b_id in db.session.execute(COMPONENT_STATEMENT, {'item_id': item_id}):
+            adjacency.setdefault(item_a_id, set()).add(item_b_id)
+            adjacency.setdefault(item_b_id, set()).add(item_a_id)
+
+        with self._lock:
+            if self._version == version:
+                if len(self._components) + len(adjacency) > self.max_items:
+                    self._components.clear()
+                self._components.update(dict.fromkeys(adjacency, adjacency))
+        return adjacency
+
+    def neighbourhood(self, item_id, hops=1):
+        """{item_id: distance} of the items at most hops links away (any number for None), without item_id"""
+        adjacency = self.component(item_id)
+        distances = {item_id: 0}
+        queue = deque([item_id])
+        while queue:
+            current = queue.popleft()
+            if hops is not None and distances[current] >= hops:
+                continue
+            for neighbour in adjacency[current]:
+                if neighbour not in distances:
+                    distances[neighbour] = distances[current] + 1
+                    queue.append(neighbour)
+        del distances[item_id]
+        return distances
+
+    def invalidate(self):
+        with self._lock:
+            self._components.clear()
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'items': len(self._components),
+                'components': len({id(adjacency) for adjacency in self._components.values()}),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+link_graph = LinkGraph()
+
+
+@on_tables_changed
+def drop_link_graph(tables):
+    if 'item_links' in tables:
+        link_graph.invalidate()
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_changed_links(session, flush_context):
+    """Links changed through the ORM relationships or with deleted items count as item_links writes"""
+    for obj in list(session.deleted) + list(session.new) + list(session.dirty):
+        if not isinstance(obj, Item):
+            continue
+        if obj in session.deleted or any(get_history(obj, key, passive=PASSIVE_NO_INITIALIZE).has_changes()
+                                         for key in ('linked_items', 'linked_by_items')):
+            mark_changed(session, 'item_links')
+            return
+
+
+def _link_condition(item_id, other_id):
+    return or_(and_(links.item_a_id == item_id, links.item_b_id == other_id),
+               and_(links.item_a_id == other_id, links.item_b_id == item_id))
+
+
+def add_link(item_id, other_id):
+    """Link two items, links have no direction so either order counts as existing"""
+    if not other_id:
+        raise GraphError('item_id is required')
+    if other_id == item_id:
+        raise GraphError('An item cannot be linked to itself')
+    if db.session.get(Item, other_id) is None:
+        raise GraphError('Linked item not found', 404)
+    if db.session.execute(select(links.item_a_id).where(_link_condition(item_id, other_id))).first():
+        raise GraphError('Items are already linked', 409)
+    db.session.execute(insert(item_links).values(item_a_id=item_id, item_b_id=other_id))
+    mark_changed(db.session, 'item_links')
+
+
+def remove_link(item_id, other_id):
+    """Returns whether the items were linked"""
+    result = db.session.execute(delete(item_links).where(_link_condition(item_id, other_id)))
+    mark_changed(db.session, 'item_links')
+    return result.rowcount > 0
+
+
+def unlink_items(item_ids):
+    """Remove all links of items that are about to be deleted"""
+    db.session.execute(delete(item_links).where(
+        or_(links.item_a_id.in_(item_ids), links.item_b_id.in_(item_ids))
+    ))
+    mark_changed(db.session, 'item_links')
+
+
+def item_summaries(distances, limit=MAX_GRAPH_ITEMS):
+    """Summaries of the closest items ordered by distance and name, and whether any were left out"""
+    closest = sorted(distances, key=lambda item_id: (distances[item_id], item_id))[:limit]
+    rows = db.session.execute(
+        select(Item.id, Item.name, ItemType.name.label('type'))
+        .outerjoin(ItemType, Item.item_type_id == ItemType.id)
+        .where(Item.id.in_(closest))
+    ).all()
+    summaries = [{'id': row.id, 'name': row.name, 'type': row.type, 'distance': distances[row.id]} for row in rows]
+    summaries.sort(key=lambda summary: (summary['distance'], summary['name'], summary['id']))
+    return summaries, len(distances) > limit
@@ -1,11 +1,20 @@
 from app import app, db
-from models import User, Role, Location, ItemType, ItemProperty, ItemCategory, Item, ItemPropertyValue, ItemFile
+from models import User, Role, Location, ItemType, ItemProperty, ItemCategory, Item, ItemPropertyValue
+from blobs import store_copy
+from file_manifest import record_item_file
+from bulk_load import load_seed_files, print_stats
 from werkzeug.security import generate_password_hash
+import argparse
 import os
 import shutil
 from datetime import datetime
 
-def init_db():
+def init_db(seed_paths=()):
+    """Recreate all tables with the default roles and admin user
+
+    The demo data is added unless seed files are given, those are bulk loaded
+    instead and their row counts returned.
+    """
     with app.app_context():
         # Drop all tables
         db.drop_all()
@@ -39,6 +48,10 @@ def init_db():
         )
         admin.roles.append(admin_role)
         db.session.add(admin)
+
+        if seed_paths:
+            db.session.commit()
+            return load_seed_files(seed_paths)
         
         # Create locations
         hauptlager = Location(name='Hauptlager', description='Hauptlagerraum für Kostüme und Requisiten')
@@ -186,19 +199,18 @@ def init_db():
             
             # Add image file if it exists
             if 'image' in item_data:
-                image_path = os.path.join('uploads', 'items', item_data['image'])
-                if os.path.exists(os.path.join(app.static_folder, image_path)):
-                    file = ItemFile(
-                        filename=image_path,
-                        original_filename=item_data['image'],
-                        mime_type='image/jpeg',
-                        size=os.path.getsize(os.path.join(app.static_folder, image_path)),
-                        item=item
-                    )
-                    db.session.add(file)
+                image_path = os.path.join(app.static_folder, 'uploads', 'items', item_data['image'])
+                if os.path.exists(image_path):
+                    blob = store_copy(image_path, os.path.splitext(image_path)[1])
+                    record_item_file(item, blob, item_data['image'])
         
         # Commit all changes
         db.session.commit()
 
 if __name__ == '__main__':
-    init_db() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Recreate the database with the admin user and demo data')
+    parser.add_argument('seed', nargs='*', help='JSON or CSV seed files to bulk load instead of the demo data')
+    options = parser.parse_args()
+    stats = init_db(options.seed)
+    if stats:
+        print_stats(stats) 
\ No newline at end of file
@@ -0,0 +1,234 @@
+import csv
+import io
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import insert
+from models import (db, Item, ItemPropertyValue, Location, Tag, item_tags, new_item_id, typed_value_columns,
+                    VALUE_COLUMNS)
+from search import index_items
+from versions import mark_changed
+
+# Row keys that describe the item itself, every other CSV column names a property
+ITEM_FIELDS = {'id', 'name', 'item_type', 'item_type_id', 'location', 'location_id', 'tags',
+               'properties', 'property_values', 'created_at', 'updated_at'}
+
+# Plain copy of an ItemProperty, instrumented attribute access adds up over 100k rows
+PropertySpec = namedtuple('PropertySpec', 'id name property_type options required')
+
+# Keep responses bounded when a whole file is rejected
+MAX_REPORTED_ERRORS = 1000
+
+
+def read_csv(data):
+    """Rows of a CSV upload as dicts, the delimiter (comma, semicolon or tab) is detected"""
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    try:
+        dialect = csv.Sniffer().sniff(data[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    return csv.DictReader(io.StringIO(data, newline=''), dialect=dialect)
+
+
+def scalar_field(row, key, errors):
+    """row[key] if it is missing, a string or a number, otherwise None with an error"""
+    value = row.get(key)
+    if value is None or (isinstance(value, (str, int, float)) and not isinstance(value, bool)):
+        return value
+    errors.append(f'{key} must be a string or number')
+    return None
+
+
+def _split_tags(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(tag).strip() for tag in value if str(tag).strip()]
+    return [tag.strip() for tag in str(value).split(';') if tag.strip()]
+
+
+class ItemImporter:
+    """Validates import rows for one item type against lookups loaded once up front"""
+
+    def __init__(self, item_type):
+        self.item_type_id = item_type.id
+        self.properties = [PropertySpec(prop.id, prop.name, prop.property_type, prop.options, prop.required)
+                           for prop in item_type.properties]
+        self.properties_by_id = {prop.id: prop for prop in self.properties}
+        self.properties_by_name = {prop.name.lower(): prop for prop in self.properties}
+        self._resolved = {}
+        self.location_ids = set()
+        self.locations_by_name = {}
+        for location_id, name in db.session.query(Location.id, Location.name):
+            self.location_ids.add(location_id)
+            self.locations_by_name.setdefault(name.lower(), location_id)
+        self.tags_by_name = {name.lower(): tag_id for tag_id, name in db.session.query(Tag.id, Tag.name)}
+
+    def _property(self, key):
+        # CSV rows repeat the same column names, resolve each one once
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+        if isinstance(key, int) or str(key).isdigit():
+            prop = self.properties_by_id.get(int(key))
+        else:
+            prop = self.properties_by_name.get(str(key).strip().lower())
+        self._resolved[key] = prop
+        return prop
+
+    def _raw_values(self, row, errors):
+        """(property, value) pairs of a row, from whichever form the row uses"""
+        pairs = []
+        property_values = row.get('property_values') or []
+        if not isinstance(property_values, list):
+            errors.append('property_values must be a list')
+            property_values = []
+        for entry in property_values:
+            if not isinstance(entry, dict):
+                errors.append('property_values entries must be objects')
+                continue
+            pairs.append((entry.get('property_id'), entry.get('value')))
+        properties = row.get('properties') or {}
+        if not isinstance(properties, dict):
+            errors.append('properties must be an object')
+            properties = {}
+        for key, value in properties.items():
+            pairs.append((key, value))
+        for key, value in row.items():
+            if key not in ITEM_FIELDS and key is not None:
+                pairs.append((key, value))
+
+        resolved = []
+        for key, value in pairs:
+            prop = self._property(key) if isinstance(key, (int, str)) else None
+            if prop is None:
+                errors.append(f'Unknown property: {key}')
+            elif value is not None and value != '':
+                resolved.append((prop, value))
+        return resolved
+
+    def validate(self, row):
+        """Item, property value and tag rows for one import row, or the list of its errors"""
+        if not isinstance(row, dict):
+            return None, ['Row must be an object']
+        errors = []
+
+        name = str(scalar_field(row, 'name', errors) or '').strip()
+        if not name:
+            errors.append('Name is required')
+        elif len(name) > 100:
+            errors.append('Name is longer than 100 characters')
+
+        location_id = scalar_field(row, 'location_id', errors) or None
+        location = scalar_field(row, 'location', errors)
+        if location_id and location_id not in self.location_ids:
+            errors.append(f'Unknown location: {location_id}')
+        elif not location_id and location:
+            location_id = self.locations_by_name.get(str(location).strip().lower())
+            if location_id is None:
+                errors.append(f'Unknown location: {location}')
+
+        tag_ids = []
+        for tag in _split_tags(row.get('tags')):
+            tag_id = self.tags_by_name.get(tag.lower())
+            if tag_id is None:
+                errors.append(f'Unknown tag: {tag}')
+            elif tag_id not in tag_ids:
+                tag_ids.append(tag_id)
+
+        item_id = new_item_id()
+        values = {}
+        given = set()
+        for prop, value in self._raw_values(row, errors):
+            given.add(prop.id)
+            if prop.options and str(value) not in prop.options:
+                errors.append(f'{prop.name}: {value} is not one of {", ".join(prop.options)}')
+                continue
+            try:
+                columns = typed_value_columns(prop.property_type, value)
+            except (TypeError, ValueError) as e:
+                errors.append(f'{prop.name}: {str(e)}')
+                continue
+            if columns:
+                # executemany needs the same keys in every row
+                values[prop.id] = dict(dict.fromkeys(VALUE_COLUMNS), item_id=item_id, property_id=prop.id, **columns)
+
+        for prop in self.properties:
+            if prop.required and prop.id not in given:
+                errors.append(f'{prop.name} is required')
+
+        if errors:
+            return None, errors
+        item = {'id': item_id, 'name': name, 'location_id': location_id, 'item_type_id': self.item_type_id}
+        tags = [{'item_id': item_id, 'tag_id': tag_id} for tag_id in tag_ids]
+        return (item, list(values.values()), tags), []
+
+
+def item_rows(chunk, now):
+    """Item, property value and item_tags rows of validated import rows, stamped with now"""
+    stamps = {'created_at': now, 'updated_at': now}
+    items = [dict(item, **stamps) for item, _, _ in chunk]
+    values = [dict(value, **stamps) for _, item_values, _ in chunk for value in item_values]
+    tags = [tag for _, _, item_tags_rows in chunk for tag in item_tags_rows]
+    return items, values, tags
+
+
+def insert_validated(connection, chunk):
+    """Insert validated rows with one executemany per table, returns the item ids
+
+    connection is the session or a Core connection; nothing is committed.
+    """
+    items, values, tags = item_rows(chunk, datetime.utcnow())
+    connection.execute(insert(Item.__table__), items)
+    if values:
+        connection.execute(insert(ItemPropertyValue.__table__), values)
+    if tags:
+        connection.execute(insert(item_tags), tags)
+    return [item['id'] for item in items]
+
+
+def _insert_chunk(chunk):
+    """Insert validated rows, index them for search and commit them"""
+    index_items(insert_validated(db.session, chunk), replace=False)
+    mark_changed(db.session, 'items')
+    db.session.commit()
+
+
+def import_items(item_type, rows, chunk_size=2000):
+    """Import rows as items of item_type, committing every chunk_size valid rows
+
+    Invalid rows are skipped and reported with their 1-based position; a chunk
+    the database rejects is rolled back and reported row by row.
+    """
+    importer = ItemImporter(item_type)
+    result = {'imported': 0, 'failed': 0, 'errors': []}
+
+    def fail(number, errors):
+        result['failed'] += 1
+        if len(result['errors']) < MAX_REPORTED_ERRORS:
+            result['errors'].append({'row': number, 'errors': errors})
+
+    def flush(chunk):
+        try:
+            _insert_chunk([validated for _, validated in chunk])
+            result['imported'] += len(chunk)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error importing items: {str(e)}")
+            for number, _ in chunk:
+                fail(number, [str(e)])
+
+    chunk = []
+    for number, row in enumerate(rows, start=1):
+        validated, errors = importer.validate(row)
+        if errors:
+            fail(number, errors)
+            continue
+        chunk.append((number, validated))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return result
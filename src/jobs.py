@@ -0,0 +1,212 @@
+import multiprocessing
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import event, select, update
+from models import db, Job
+
+# Identifies this process in Job.worker, the token tells a restarted server with the same pid apart
+WORKER = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def worker_alive(worker):
+    """Whether the process that claimed a job may still run it
+
+    Only processes on this host can be checked, anything else counts as alive
+    and is left to JOB_STALE_AFTER.
+    """
+    host, pid, token = worker.rsplit(':', 2)
+    if host != socket.gethostname() or os.name != 'posix':
+        return True
+    if int(pid) == os.getpid():
+        return worker == WORKER
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    """In-process job queue backed by the jobs table
+
+    Jobs are rows written in the caller's transaction and handed to a thread
+    pool once it commits. Handlers run with an application context; CPU bound
+    work is passed on to a process pool with run_cpu(). Jobs left queued by a
+    previous process, or running when it died, are picked up again on the
+    first request.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.handlers = {}
+        self._lock = threading.Condition()
+        self._threads = None
+        self._processes = None
+        self._pending = 0
+        self._recovered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('JOB_WORKERS', 2)
+        app.config.setdefault('JOB_PROCESS_WORKERS', min(4, os.cpu_count() or 1))
+        # Running jobs older than this are considered lost, also when their process cannot be checked
+        app.config.setdefault('JOB_STALE_AFTER', 600)
+        app.extensions['job_queue'] = self
+        app.before_request(self._recover_once)
+
+    def handler(self, kind):
+        """Register the function running jobs of kind, it is called with the Job"""
+        def decorator(fn):
+            self.handlers[kind] = fn
+            return fn
+        return decorator
+
+    def enqueue(self, kind, item_id=None, item_file=None, **payload):
+        """Queue a job in the current transaction, it starts once the transaction commits"""
+        if item_file is not None:
+            db.session.flush()
+            item_id = item_id or item_file.item_id
+        job = Job(kind=kind, payload=payload, item_id=item_id,
+                  item_file_id=item_file.id if item_file is not None else None)
+        db.session.add(job)
+        db.session.info.setdefault('queued_jobs', []).append(job)
+        return job
+
+    def _threads_executor(self):
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=max(1, self.app.config['JOB_WORKERS']),
+                                                   thread_name_prefix='jobs')
+            return self._threads
+
+    def _process_executor(self):
+        with self._lock:
+            if self._processes is None:
+                # Fresh interpreters instead of forks of a threaded server process
+                self._processes = ProcessPoolExecutor(max_workers=self.app.config['JOB_PROCESS_WORKERS'],
+                                                      mp_context=multiprocessing.get_context('spawn'))
+            return self._processes
+
+    def submit(self, job_id):
+        with self._lock:
+            self._pending += 1
+        self._threads_executor().submit(self._run, job_id)
+
+    def run_cpu(self, fn, *args):
+        """Run fn(*args) in a worker process and return its result, inline without process workers"""
+        if not self.app.config['JOB_PROCESS_WORKERS']:
+            return fn(*args)
+        return self._process_executor().submit(fn, *args).result()
+
+    def map_cpu(self, fn, *iterables):
+        """map() spread over the worker processes, results come back in order"""
+        if not self.app.config['JOB_PROCESS_WORKERS']:
+            return map(fn, *iterables)
+        return self._process_executor().map(fn, *iterables)
+
+    def _run(self, job_id):
+        try:
+            with self.app.app_context():
+                self._execute(job_id)
+        except Exception as e:
+            print(f"Error running job {job_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._lock.notify_all()
+
+    def _execute(self, job_id):
+        # Claim the job, another process may have picked it up already
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.status == 'queued')
+            .values(status='running', started_at=datetime.utcnow(), attempts=Job.attempts + 1, worker=WORKER)
+        )
+        db.session.commit()
+        if claimed.rowcount != 1:
+            return
+
+        job = db.session.get(Job, job_id)
+        try:
+            handler = self.handlers.get(job.kind)
+            if handler is None:
+                raise ValueError(f'No handler for job kind {job.kind}')
+            handler(job)
+            job.status = 'done'
+            job.error = None
+        except Exception as e:
+            db.session.rollback()
+            print(f"Job {job_id} ({job.kind}) failed: {str(e)}")
+            job = db.session.get(Job, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    def _recover_once(self):
+        if not self._recovered:
+            self._recovered = True
+            self.recover()
+
+    def recover(self):
+        """Queue jobs again that a previous process left queued or running"""
+        stale = datetime.utcnow() - timedelta(seconds=self.app.config['JOB_STALE_AFTER'])
+        # Jobs whose process is gone are lost right away, others once they are stale
+        running = db.session.execute(select(Job.id, Job.worker, Job.started_at).where(Job.status == 'running'))
+        lost = [job_id for job_id, worker, started_at in running
+                if (started_at is not None and started_at < stale) or (worker and not worker_alive(worker))]
+        if lost:
+            db.session.execute(update(Job).where(Job.id.in_(lost), Job.status == 'running').values(status='queued'))
+        db.session.commit()
+        for job_id in db.session.execute(select(Job.id).where(Job.status == 'queued').order_by(Job.id)).scalars():
+            self.submit(job_id)
+
+    def join(self, timeout=None):
+        """Wait until all submitted jobs finished, returns False on timeout"""
+        with self._lock:
+            return self._lock.wait_for(lambda: self._pending == 0, timeout)
+
+
+job_queue = JobQueue()
+
+
+@event.listens_for(db.session, 'before_commit')
+def collect_queued_jobs(session):
+    jobs = session.info.pop('queued_jobs', None)
+    if jobs:
+        session.flush()
+        session.info['queued_job_ids'] = [job.id for job in jobs]
+
+
+@event.listens_for(db.session, 'after_commit')
+def start_queued_jobs(session):
+    for job_id in session.info.pop('queued_job_ids', []):
+        job_queue.submit(job_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def drop_queued_jobs(session):
+    session.info.pop('queued_jobs', None)
+    session.info.pop('queued_job_ids', None)
+
+
+def serialize_job(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'error': job.error,
+        'attempts': job.attempts,
+        'item_id': job.item_id,
+        'item_file_id': job.item_file_id,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
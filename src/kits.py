@@ -0,0 +1,117 @@
+from sqlalchemy import select, insert, delete, literal, bindparam
+from models import db, Item, ItemType, Location, item_subitems
+from versions import mark_changed
+
+edges = item_subitems.c
+
+# The kit and everything below it as (parent_id, id) rows plus what a pack list
+# shows, the root comes with parent_id NULL. UNION instead of UNION ALL drops
+# repeated edges, which also ends the recursion in cycles older data may contain.
+_kit = select(literal(None, db.String).label('parent_id'),
+              bindparam('item_id', type_=db.String).label('child_id')).cte('kit', recursive=True)
+_kit = _kit.union(select(edges.parent_id, edges.child_id).join(_kit, edges.parent_id == _kit.c.child_id))
+EXPAND_STATEMENT = (
+    select(_kit.c.parent_id, Item.id, Item.name, ItemType.name.label('type'),
+           Item.location_id, Location.path.label('location_path'))
+    .select_from(_kit)
+    .join(Item, Item.id == _kit.c.child_id)
+    .outerjoin(ItemType, Item.item_type_id == ItemType.id)
+    .outerjoin(Location, Item.location_id == Location.id)
+)
+
+# Whether parent_id is child_id or somewhere below it, i.e. the edge would close a cycle
+_below = select(bindparam('child_id', type_=db.String).label('id')).cte('below', recursive=True)
+_below = _below.union(select(edges.child_id).join(_below, edges.parent_id == _below.c.id))
+CYCLE_STATEMENT = select(_below.c.id).where(_below.c.id == bindparam('parent_id')).limit(1)
+
+
+class KitError(ValueError):
+    """Raised for sub-item changes that cannot be made"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def add_subitem(parent_id, child_id):
+    """Make child_id a sub-item of parent_id, rejecting edges that would close a cycle"""
+    if not child_id:
+        raise KitError('subitem_id is required')
+    if db.session.get(Item, child_id) is None:
+        raise KitError('Sub-item not found', 404)
+    if db.session.execute(CYCLE_STATEMENT, {'child_id': child_id, 'parent_id': parent_id}).first():
+        raise KitError('An item cannot contain itself, not even through its sub-items')
+    if db.session.execute(select(edges.child_id).where(
+            edges.parent_id == parent_id, edges.child_id == child_id)).first():
+        raise KitError('Already a sub-item of this item', 409)
+    db.session.execute(insert(item_subitems).values(parent_id=parent_id, child_id=child_id))
+    mark_changed(db.session, 'items')
+
+
+def remove_subitem(parent_id, child_id):
+    """Returns whether child_id was a sub-item of parent_id"""
+    result = db.session.execute(delete(item_subitems).where(
+        edges.parent_id == parent_id, edges.child_id == child_id))
+    mark_changed(db.session, 'items')
+    return result.rowcount > 0
+
+
+def _piece(row):
+    return {
+        'id': row.id,
+        'name': row.name,
+        'type': row.type,
+        'location_id': row.location_id,
+        'location_path': row.location_path or []
+    }
+
+
+def expand_kit(item_id):
+    """The kit below item_id with a flattened pack list and counts, None for an unknown item
+
+    The whole tree comes from one query. Pieces are listed depth first with the
+    sub-items of each kit sorted by name; an item that is part of several
+    sub-kits is packed once, where it is reached first.
+    """
+    rows = {}
+    children = {}
+    for row in db.session.execute(EXPAND_STATEMENT, {'item_id': item_id}):
+        rows[row.id] = row
+        if row.parent_id is not None:
+            children.setdefault(row.parent_id, []).append(row.id)
+    if item_id not in rows:
+        return None
+    for child_ids in children.values():
+        child_ids.sort(key=lambda child_id: (rows[child_id].name, child_id))
+
+    pieces = []
+    seen = {item_id}
+    stack = [(child_id, item_id, 1) for child_id in reversed(children.get(item_id, []))]
+    while stack:
+        piece_id, parent_id, depth = stack.pop()
+        if piece_id in seen:
+            continue
+        seen.add(piece_id)
+        sub_ids = children.get(piece_id, [])
+        pieces.append({**_piece(rows[piece_id]), 'parent_id': parent_id, 'depth': depth, 'is_kit': bool(sub_ids)})
+        stack.extend((sub_id, piece_id, depth + 1) for sub_id in reversed(sub_ids))
+
+    by_type = {}
+    by_location = {}
+    for piece in pieces:
+        by_type[piece['type']] = by_type.get(piece['type'], 0) + 1
+        if piece['location_id']:
+            by_location[piece['location_id']] = by_location.get(piece['location_id'], 0) + 1
+    kits = sum(1 for piece in pieces if piece['is_kit'])
+    return {
+        **_piece(rows[item_id]),
+        'pieces': pieces,
+        'counts': {
+            'pieces': len(pieces),
+            'kits': kits,
+            'loose': len(pieces) - kits,
+            'max_depth': max((piece['depth'] for piece in pieces), default=0),
+            'by_type': by_type,
+            'by_location': by_location
+        }
+    }
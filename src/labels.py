@@ -0,0 +1,223 @@
+import io
+import re
+import zlib
+from functools import lru_cache
+import qrcode
+import qrcode.image.svg
+from PIL import Image, ImageDraw, ImageFont
+from sqlalchemy import select
+from models import db, Item, Location
+from filters import apply_item_filters
+
+QR_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+QR_SIZES = (64, 2048)
+SVG_SIZE = re.compile(rb'<svg width="[^"]*" height="[^"]*"')
+
+# Sheets are A4 rendered at LABEL_DPI, a 3 x 8 grid fits the common 70 x 37 mm labels
+A4_MM = (210, 297)
+LABEL_DPI = 200
+LABEL_GRID = (3, 8)
+MAX_LABELS = 10000
+# Found in the system font folders, without it labels fall back to Pillow's bitmap font
+LABEL_FONT = 'DejaVuSans.ttf'
+
+
+class LabelError(ValueError):
+    """Raised for label requests that cannot be carried out"""
+
+
+def qr_payload(kind, object_id):
+    """Text encoded in the codes, Scanner.vue splits it at the colon"""
+    return f'{kind}:{object_id}'
+
+
+def qr_image(data, size):
+    """Black on white QR code of size x size pixels, modules are whole pixels"""
+    # A fixed mask pattern is valid and saves scoring all eight for every code
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=2, mask_pattern=0)
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    modules = len(matrix)
+    box_size = max(1, size // modules)
+    # Scaling the module matrix up is far cheaper than drawing every module
+    code = Image.frombytes('L', (modules, modules), bytes(0 if dark else 255 for row in matrix for dark in row))
+    code = code.resize((modules * box_size, modules * box_size), Image.NEAREST).convert('1')
+    image = Image.new('1', (size, size), 1)
+    image.paste(code, ((size - code.width) // 2, (size - code.height) // 2))
+    return image
+
+
+@lru_cache(maxsize=4096)
+def render_qr(data, size, qr_format):
+    """Encoded QR code, cached since a code only depends on its arguments"""
+    buffer = io.BytesIO()
+    if qr_format == 'svg':
+        qrcode.make(data, image_factory=qrcode.image.svg.SvgPathImage, border=2).save(buffer)
+        # The code is drawn in module units of the viewBox, its outer size is ours to pick
+        return SVG_SIZE.sub(f'<svg width="{size}" height="{size}"'.encode(), buffer.getvalue(), count=1)
+    qr_image(data, size).save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def parse_label_request(data):
+    """Validate a label sheet request, returns (kind, ids, filter, columns, rows)"""
+    if not isinstance(data, dict):
+        raise LabelError('Expected a JSON object')
+    kind = data.get('kind', 'item')
+    if kind not in ('item', 'location'):
+        raise LabelError('kind must be item or location')
+    if ('ids' in data) == ('filter' in data):
+        raise LabelError('Specify either ids or filter')
+    if 'ids' in data and not isinstance(data['ids'], list):
+        raise LabelError('ids must be a list')
+    if 'filter' in data and (kind != 'item' or not isinstance(data['filter'], dict)):
+        raise LabelError('filter must be an object of item filters')
+    try:
+        columns = int(data.get('columns', LABEL_GRID[0]))
+        rows = int(data.get('rows', LABEL_GRID[1]))
+    except (TypeError, ValueError):
+        raise LabelError('columns and rows must be numbers')
+    if not (1 <= columns <= 6 and 1 <= rows <= 16):
+        raise LabelError('At most 6 columns and 16 rows fit on a sheet')
+    ids = [str(object_id) for object_id in data['ids']] if 'ids' in data else None
+    return kind, ids, data.get('filter'), columns, rows
+
+
+def label_rows(kind, ids=None, filters=None):
+    """(payload, name, id) of every label, in the order of ids or by name for a filter"""
+    model = Item if kind == 'item' else Location
+    statement = select(model.id, model.name)
+    if ids is not None:
+        statement = statement.where(model.id.in_(ids))
+    else:
+        statement, _ = apply_item_filters(statement, filters)
+        statement = statement.order_by(Item.name, Item.id)
+    rows = db.session.execute(statement.limit(MAX_LABELS + 1)).all()
+    if len(rows) > MAX_LABELS:
+        raise LabelError(f'At most {MAX_LABELS} labels per request')
+    if ids is not None:
+        names = dict(rows)
+        rows = [(object_id, names[object_id]) for object_id in dict.fromkeys(ids) if object_id in names]
+    return [(qr_payload(kind, object_id), name, object_id) for object_id, name in rows]
+
+
+@lru_cache(maxsize=None)
+def _font(size):
+    """(font, scale), the bitmap fallback font is drawn small and scaled up"""
+    try:
+        return ImageFont.truetype(LABEL_FONT, size), 1
+    except OSError:
+        return ImageFont.load_default(), max(1, size // 11)
+
+
+@lru_cache(maxsize=4096)
+def _glyph(char, size):
+    """A character rendered as wide as its advance, lines are pasted together from these"""
+    font, scale = _font(size)
+    height = font.getbbox('ÄÅgjpqy|')[3]
+    image = Image.new('1', (max(1, round(font.getlength(char))), max(1, height)), 1)
+    ImageDraw.Draw(image).text((0, 0), char, font=font, fill=0)
+    if scale > 1:
+        image = image.resize((image.width * scale, image.height * scale), Image.NEAREST)
+    return image
+
+
+def _text_width(text, size):
+    return sum(_glyph(char, size).width for char in text)
+
+
+def _fit(text, size, width, max_lines):
+    """Split text into at most max_lines lines no wider than width, shortening the last one"""
+    fits = lambda line: _text_width(line, size) <= width
+    lines = []
+    words = text.split()
+    while words and len(lines) < max_lines:
+        line = words.pop(0)
+        while words and fits(f'{line} {words[0]}'):
+            line = f'{line} {words.pop(0)}'
+        lines.append(line)
+    if words or (lines and not fits(lines[-1])):
+        last = lines[-1]
+        while last and not fits(f'{last}…'):
+            last = last[:-1]
+        lines[-1] = f'{last}…'
+    return lines
+
+
+def _draw_text(page, xy, text, size):
+    """Draw a line of text, returns its height"""
+    x, y = xy
+    for char in text:
+        glyph = _glyph(char, size)
+        page.paste(glyph, (x, y))
+        x += glyph.width
+    return _glyph(' ', size).height
+
+
+def render_sheet(labels, columns, rows):
+    """Render one sheet of labels, returns (width, height, zlib compressed 1-bit rows)
+
+    Runs in the job worker processes, so it only takes plain arguments.
+    """
+    width, height = (round(mm / 25.4 * LABEL_DPI) for mm in A4_MM)
+    page = Image.new('1', (width, height), 1)
+    cell_width, cell_height = width // columns, height // rows
+    padding = cell_height // 10
+    qr_size = min(cell_height, cell_width // 2) - 2 * padding
+    name_size, id_size = cell_height // 7, cell_height // 9
+    text_width = cell_width - qr_size - 3 * padding
+
+    for index, (payload, name, object_id) in enumerate(labels):
+        x = index % columns * cell_width
+        y = index // columns * cell_height
+        page.paste(qr_image(payload, qr_size), (x + padding, y + padding))
+        text_x = x + qr_size + 2 * padding
+        text_y = y + padding
+        for line in _fit(name, name_size, text_width, 3):
+            text_y += _draw_text(page, (text_x, text_y), line, name_size) + padding // 3
+        _draw_text(page, (text_x, y + cell_height - padding - id_size), object_id, id_size)
+    return width, height, zlib.compress(page.tobytes(), 6)
+
+
+def sheet_pdf(sheets):
+    """PDF with one A4 page per rendered sheet, the sheets are embedded as they are"""
+    width_pt, height_pt = (round(mm / 25.4 * 72, 2) for mm in A4_MM)
+    out = io.BytesIO()
+    offsets = []
+
+    def write_object(body):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n' % len(offsets) + body + b'\nendobj\n')
+
+    out.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    sheets = list(sheets)
+    # Objects: catalog, page tree, then page, contents and image per sheet
+    kids = ' '.join(f'{3 + index * 3} 0 R' for index in range(len(sheets)))
+    write_object(b'<< /Type /Catalog /Pages 2 0 R >>')
+    write_object(f'<< /Type /Pages /Kids [{kids}] /Count {len(sheets)} >>'.encode())
+    for index, (width, height, data) in enumerate(sheets):
+        page_id = 3 + index * 3
+        write_object(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt} {height_pt}] '
+                     f'/Resources << /XObject << /Sheet {page_id + 2} 0 R >> >> '
+                     f'/Contents {page_id + 1} 0 R >>'.encode())
+        content = f'q {width_pt} 0 0 {height_pt} 0 0 cm /Sheet Do Q'.encode()
+        write_object(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+        write_object(b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray '
+                     b'/BitsPerComponent 1 /Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream'
+                     % (width, height, len(data), data))
+
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(offsets) + 1))
+    for offset in offsets:
+        out.write(b'%010d 00000 n \n' % offset)
+    out.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(offsets) + 1, xref))
+    return out.getvalue()
+
+
+def render_label_sheets(labels, columns, rows, map_sheets=map):
+    """PDF of labels laid out columns x rows per sheet, map_sheets spreads the sheets over processes"""
+    per_sheet = columns * rows
+    chunks = [labels[start:start + per_sheet] for start in range(0, len(labels), per_sheet)] or [[]]
+    count = len(chunks)
+    return sheet_pdf(map_sheets(render_sheet, chunks, [columns] * count, [rows] * count))
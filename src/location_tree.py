@@ -0,0 +1,208 @@
+from sqlalchemy import event, select, insert, update, delete, func, literal, bindparam, case, inspect
+from sqlalchemy.orm.attributes import set_committed_value
+from models import db, Item, Location, location_closure
+from versions import mark_changed
+
+closure = location_closure.c
+
+
+class LocationError(ValueError):
+    """Raised for parents that would not leave a tree"""
+
+
+def subtree_ids(location_id):
+    """Select of the ids of a location and all locations below it"""
+    return select(closure.descendant_id).where(closure.ancestor_id == location_id)
+
+
+def _is_below(session, location_id, other_id):
+    """Whether other_id is location_id or one of its descendants"""
+    return session.execute(
+        select(closure.depth).where(closure.ancestor_id == location_id, closure.descendant_id == other_id)
+    ).first() is not None
+
+
+def check_parent(location, parent_id):
+    """Raise LocationError unless parent_id (None for a root) can be the parent of location"""
+    if parent_id is None:
+        return
+    if db.session.get(Location, parent_id) is None:
+        raise LocationError('Parent location not found')
+    if location.id is not None and (parent_id == location.id or _is_below(db.session, location.id, parent_id)):
+        raise LocationError('A location cannot be moved below itself')
+
+
+def _insert_new(session, locations):
+    """Closure rows of new locations, parents that are new themselves are resolved first"""
+    pending = {location.id: location.parent_id for location in locations}
+    known = {}
+    parents = {parent_id for parent_id in pending.values() if parent_id and parent_id not in pending}
+    for ancestor_id, descendant_id, depth in session.execute(
+            select(closure.ancestor_id, closure.descendant_id, closure.depth)
+            .where(closure.descendant_id.in_(parents))):
+        known.setdefault(descendant_id, []).append((ancestor_id, depth))
+
+    rows = []
+    for location_id in pending:
+        chain = []
+        current = location_id
+        while current in pending and current not in known:
+            if current in chain:
+                raise LocationError('A location cannot be moved below itself')
+            chain.append(current)
+            current = pending[current]
+        above = known.get(current, []) if current else []
+        for node in reversed(chain):
+            known[node] = [(node, 0)] + [(ancestor_id, depth + 1) for ancestor_id, depth in above]
+            rows.extend({'ancestor_id': ancestor_id, 'descendant_id': node, 'depth': depth}
+                        for ancestor_id, depth in known[node])
+            above = known[node]
+    session.execute(insert(location_closure), rows)
+
+
+def _move(session, location):
+    """Detach the subtree of location from its old ancestors and hang it below its parent_id"""
+    if location.parent_id is not None and _is_below(session, location.id, location.parent_id):
+        raise LocationError('A location cannot be moved below itself')
+    session.execute(delete(location_closure).where(
+        closure.descendant_id.in_(subtree_ids(location.id)),
+        closure.ancestor_id.in_(
+            select(closure.ancestor_id).where(closure.descendant_id == location.id, closure.depth > 0))
+    ))
+    if location.parent_id is None:
+        return
+    above = location_closure.alias('above')
+    below = location_closure.alias('below')
+    session.execute(insert(location_closure).from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+        .select_from(above.join(below, below.c.ancestor_id == location.id))
+        .where(above.c.descendant_id == location.parent_id)
+    ))
+
+
+def _store_paths(session, statement):
+    """Write the paths of the locations statement selects (descendant_id, ancestor name) rows for"""
+    paths = {}
+    for location_id, name in session.execute(statement.order_by(closure.descendant_id, closure.depth.desc())):
+        paths.setdefault(location_id, []).append(name)
+    if not paths:
+        return
+    table = Location.__table__
+    session.execute(
+        update(table).where(table.c.id == bindparam('location_id')).values(path=bindparam('new_path')),
+        [{'location_id': location_id, 'new_path': path} for location_id, path in paths.items()]
+    )
+    # Loaded locations see their new path without a reload
+    mapper = inspect(Location)
+    for location_id, path in paths.items():
+        obj = session.identity_map.get(mapper.identity_key_from_primary_key((location_id,)))
+        if obj is not None:
+            set_committed_value(obj, 'path', path)
+
+
+def _paths_statement():
+    return (select(closure.descendant_id, Location.name)
+            .join(Location, Location.id == closure.ancestor_id))
+
+
+@event.listens_for(db.session, 'before_flush')
+def move_up_children(session, flush_context, instances):
+    """Children of a deleted location move up to its nearest remaining ancestor"""
+    deleted = {obj for obj in session.deleted if isinstance(obj, Location)}
+    if not deleted:
+        return
+    with session.no_autoflush:
+        for location in deleted:
+            parent = location.parent
+            while parent in deleted:
+                parent = parent.parent
+            for child in list(location.children):
+                if child not in deleted:
+                    child.parent = parent
+
+
+@event.listens_for(db.session, 'after_flush')
+def update_location_tree(session, flush_context):
+    """Keep location_closure and the stored paths in step with the flushed locations"""
+    new = [obj for obj in session.new if isinstance(obj, Location)]
+    dirty = [obj for obj in session.dirty if isinstance(obj, Location) and session.is_modified(obj)]
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Location)]
+    if not (new or dirty or deleted):
+        return
+
+    if new:
+        _insert_new(session, new)
+
+    ancestors = {}
+    if dirty:
+        for descendant_id, ancestor_id, depth in session.execute(
+                select(closure.descendant_id, closure.ancestor_id, closure.depth)
+                .where(closure.descendant_id.in_([location.id for location in dirty]), closure.depth > 0)):
+            ancestors.setdefault(descendant_id, {})[depth] = ancestor_id
+    moved = [location for location in dirty
+             if ancestors.get(location.id, {}).get(1) != location.parent_id
+             or (location.parent_id is None and ancestors.get(location.id))]
+    for location in moved:
+        _move(session, location)
+
+    if deleted:
+        session.execute(delete(location_closure).where(
+            closure.ancestor_id.in_(deleted) | closure.descendant_id.in_(deleted)))
+
+    renamed = [location for location in dirty
+               if location not in moved and inspect(location).attrs.name.history.has_changes()]
+    roots = [location.id for location in new + moved + renamed]
+    if roots:
+        _store_paths(session, _paths_statement().where(
+            closure.descendant_id.in_(select(closure.descendant_id).where(closure.ancestor_id.in_(roots)))))
+
+
+def rebuild_location_tree():
+    """Recompute location_closure and all paths from parent_id, returns the number of locations"""
+    count = db.session.scalar(select(func.count()).select_from(Location))
+    db.session.execute(delete(location_closure))
+    tree = select(Location.id.label('ancestor_id'), Location.id.label('descendant_id'),
+                  literal(0).label('depth')).cte('tree', recursive=True)
+    # The depth bound stops the recursion in parent cycles older data may contain
+    tree = tree.union_all(
+        select(tree.c.ancestor_id, Location.id, tree.c.depth + 1)
+        .where(Location.parent_id == tree.c.descendant_id, tree.c.depth < count)
+    )
+    db.session.execute(insert(location_closure).from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(tree.c.ancestor_id, tree.c.descendant_id, func.min(tree.c.depth))
+        .group_by(tree.c.ancestor_id, tree.c.descendant_id)
+    ))
+    _store_paths(db.session, _paths_statement())
+    mark_changed(db.session, 'locations')
+    db.session.commit()
+    return count
+
+
+def item_counts():
+    """{location_id: {'items': n, 'total_items': m}}, total_items includes all locations below"""
+    direct = (select(Item.location_id, func.count().label('item_count'))
+              .where(Item.location_id.isnot(None))
+              .group_by(Item.location_id).subquery())
+    counts = {location_id: {'items': 0, 'total_items': 0}
+              for location_id in db.session.execute(select(Location.id)).scalars()}
+    for location_id, items, total in db.session.execute(
+            select(closure.ancestor_id,
+                   func.sum(case((closure.depth == 0, direct.c.item_count), else_=0)),
+                   func.sum(direct.c.item_count))
+            .join(direct, direct.c.location_id == closure.descendant_id)
+            .group_by(closure.ancestor_id)):
+        counts[location_id] = {'items': items, 'total_items': total}
+    return counts
+
+
+def serialize_location(location):
+    return {
+        'id': location.id,
+        'name': location.name,
+        'description': location.description,
+        'parent_id': location.parent_id,
+        'path': location.path or [location.name],
+        'created_at': location.created_at.isoformat() if location.created_at else None
+    }
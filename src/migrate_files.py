@@ -0,0 +1,15 @@
+from app import app
+from file_manifest import reconcile_item_files, migrate_item_files
+from blobs import collect_garbage
+
+if __name__ == '__main__':
+    with app.app_context():
+        # Files on disk without manifest entry are recorded first, so they are moved too
+        print("Reconciling file manifest with upload folders...")
+        stats = reconcile_item_files()
+        print(f"Added {stats['added']}, updated {stats['updated']}, removed {stats['removed']} entries")
+
+        print("Moving files into the blob store...")
+        stats = migrate_item_files()
+        print(f"Migrated {stats['migrated']} files, {stats['deduplicated']} duplicates, {stats['missing']} missing")
+        print(f"Removed {collect_garbage()} unreferenced blobs")
@@ -2,24 +2,40 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import shortuuid
 from werkzeug.security import generate_password_hash, check_password_hash
+from database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Spellings accepted for boolean values in filters and imports
+TRUE_VALUES = {'1', 'true', 'yes', 'ja', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'nein', 'off'}
+
+def new_item_id():
+    return shortuuid.uuid()[:8]
 
 # Association tables for many-to-many relationships
 item_tags = db.Table('item_tags',
     db.Column('item_id', db.String(22), db.ForeignKey('items.id')),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'))
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id')),
+    # Tags of an item (serializer, search index) and items of a tag (filters, facets)
+    db.Index('ix_item_tags_item_id_tag_id', 'item_id', 'tag_id'),
+    db.Index('ix_item_tags_tag_id_item_id', 'tag_id', 'item_id')
 )
 
 item_subitems = db.Table('item_subitems',
     db.Column('parent_id', db.String(22), db.ForeignKey('items.id')),
-    db.Column('child_id', db.String(22), db.ForeignKey('items.id'))
+    db.Column('child_id', db.String(22), db.ForeignKey('items.id')),
+    # Kits are expanded downwards from the parent, cycle checks and parent_items go upwards
+    db.Index('ix_item_subitems_parent_id_child_id', 'parent_id', 'child_id'),
+    db.Index('ix_item_subitems_child_id_parent_id', 'child_id', 'parent_id')
 )
 
 # Association table for item links
 item_links = db.Table('item_links',
     db.Column('item_a_id', db.String(22), db.ForeignKey('items.id', ondelete='CASCADE'), primary_key=True),
-    db.Column('item_b_id', db.String(22), db.ForeignKey('items.id', ondelete='CASCADE'), primary_key=True)
+    db.Column('item_b_id', db.String(22), db.ForeignKey('items.id', ondelete='CASCADE'), primary_key=True),
+    # Links are undirected, the primary key covers lookups from item_a_id and this one from item_b_id
+    db.Index('ix_item_links_item_b_id_item_a_id', 'item_b_id', 'item_a_id')
 )
 
 # User roles association table
@@ -28,12 +44,23 @@ user_roles = db.Table('user_roles',
     db.Column('role_id', db.Integer, db.ForeignKey('roles.id', ondelete='CASCADE'), primary_key=True)
 )
 
+# Every (ancestor, descendant) pair of the location tree, each location is its own
+# ancestor at depth 0. location_tree keeps it in step with parent_id on flush.
+location_closure = db.Table('location_closure',
+    db.Column('ancestor_id', db.String(22), db.ForeignKey('locations.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('descendant_id', db.String(22), db.ForeignKey('locations.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('depth', db.Integer, nullable=False),
+    db.Index('ix_location_closure_descendant_id', 'descendant_id', 'depth')
+)
+
 class Location(db.Model):
     __tablename__ = 'locations'
     id = db.Column(db.String(22), primary_key=True, default=lambda: shortuuid.uuid()[:8])
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     parent_id = db.Column(db.String(22), db.ForeignKey('locations.id'))
+    # Names from the root down to this location, maintained together with location_closure
+    path = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -94,12 +121,18 @@ class ItemProperty(db.Model):
 
 class Item(db.Model):
     __tablename__ = 'items'
-    id = db.Column(db.String(22), primary_key=True, default=lambda: shortuuid.uuid()[:8])
+    id = db.Column(db.String(22), primary_key=True, default=new_item_id)
     name = db.Column(db.String(100), nullable=False)
     location_id = db.Column(db.String(22), db.ForeignKey('locations.id'))
     item_type_id = db.Column(db.Integer, db.ForeignKey('item_types.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Keyset pagination of the item list sorts on (created_at, id), location filters and counts use location_id
+    __table_args__ = (
+        db.Index('ix_items_created_at_id', 'created_at', 'id'),
+        db.Index('ix_items_location_id', 'location_id'),
+    )
     
     # Relationships
     location = db.relationship('Location', back_populates='items')
@@ -108,6 +141,10 @@ class Item(db.Model):
                                    back_populates='item', 
                                    foreign_keys='ItemPropertyValue.item_id',
                                    cascade='all, delete-orphan')
+    files = db.relationship('ItemFile',
+                            back_populates='item',
+                            cascade='all, delete-orphan',
+                            order_by='(ItemFile.is_image.desc(), ItemFile.id)')
     
     # Many-to-many relationships
     tags = db.relationship('Tag', secondary=item_tags, back_populates='items')
@@ -172,6 +209,52 @@ class Tag(db.Model):
     def __repr__(self):
         return f'<Tag {self.name}>'
 
+def parse_date_value(value):
+    """Parse a timestamp, ISO date string or datetime into a datetime, None if invalid"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    if isinstance(value, str):
+        try:
+            # Try parsing as timestamp first
+            return datetime.fromtimestamp(float(value))
+        except ValueError:
+            # If that fails, try various date formats
+            try:
+                return datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                try:
+                    return datetime.strptime(value, '%a, %d %b %Y %H:%M:%S %Z')
+                except ValueError:
+                    return None
+    return None
+
+# Value columns of ItemPropertyValue, exactly one is set per row
+VALUE_COLUMNS = ('value_text', 'value_number', 'value_boolean', 'value_date', 'value_item_id')
+
+def typed_value_columns(property_type, value):
+    """Column values of an ItemPropertyValue storing value, raises ValueError for invalid values"""
+    if property_type == 'text':
+        return {'value_text': str(value)}
+    if property_type == 'number':
+        return {'value_number': float(value)}
+    if property_type == 'boolean':
+        if isinstance(value, str):
+            normalized = value.strip().lower()
+            if normalized not in TRUE_VALUES | FALSE_VALUES:
+                raise ValueError(f'Invalid boolean: {value}')
+            return {'value_boolean': normalized in TRUE_VALUES}
+        return {'value_boolean': bool(value)}
+    if property_type == 'date':
+        parsed = parse_date_value(value)
+        if parsed is None:
+            raise ValueError(f'Invalid date: {value}')
+        return {'value_date': parsed}
+    if property_type == 'item_link':
+        return {'value_item_id': str(value)}
+    return {}
+
 class ItemPropertyValue(db.Model):
     __tablename__ = 'item_property_values'
     id = db.Column(db.Integer, primary_key=True)
@@ -185,6 +268,17 @@ class ItemPropertyValue(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Property filters look up (property, value) and only need the item id,
+    # so each index covers the filter without touching the table
+    __table_args__ = (
+        db.Index('ix_item_property_values_item_id', 'item_id'),
+        db.Index('ix_item_property_values_text', 'property_id', 'value_text', 'item_id'),
+        db.Index('ix_item_property_values_number', 'property_id', 'value_number', 'item_id'),
+        db.Index('ix_item_property_values_date', 'property_id', 'value_date', 'item_id'),
+        db.Index('ix_item_property_values_boolean', 'property_id', 'value_boolean', 'item_id'),
+        db.Index('ix_item_property_values_item_link', 'property_id', 'value_item_id', 'item_id'),
+    )
+
     item = db.relationship('Item', 
                           back_populates='property_values', 
                           foreign_keys=[item_id])
@@ -213,25 +307,7 @@ class ItemPropertyValue(db.Model):
         elif self.property.property_type == 'boolean':
             self.value_boolean = bool(value)
         elif self.property.property_type == 'date':
-            if isinstance(value, (int, float)):
-                self.value_date = datetime.fromtimestamp(value)
-            elif isinstance(value, str):
-                try:
-                    # Try parsing as timestamp first
-                    self.value_date = datetime.fromtimestamp(float(value))
-                except ValueError:
-                    # If that fails, try various date formats
-                    try:
-                        self.value_date = datetime.fromisoformat(value.replace('Z', '+00:00'))
-                    except ValueError:
-                        try:
-                            self.value_date = datetime.strptime(value, '%a, %d %b %Y %H:%M:%S %Z')
-                        except ValueError:
-                            self.value_date = None
-            elif isinstance(value, datetime):
-                self.value_date = value
-            else:
-                self.value_date = None
+            self.value_date = parse_date_value(value)
         elif self.property.property_type == 'item_link':
             if isinstance(value, str):
                 self.value_item_id = value
@@ -243,6 +319,131 @@ class ItemPropertyValue(db.Model):
     def __repr__(self):
         return f'<ItemPropertyValue {self.property.name}: {self.get_typed_value()}>' 
 
+def update_property_values(item, submitted, partial=False):
+    """Bring the property values of item in line with submitted {property_id: value}
+
+    Values are compared with the stored ones so unchanged rows are left alone,
+    changed rows are updated in place and only new values are inserted. Values
+    that are not submitted are deleted unless partial is set; a None value
+    deletes in both modes. Raises ValueError for values that do not fit their
+    property. Returns whether anything changed.
+    """
+    properties = {prop.id: prop for prop in item.item_type.properties}
+    existing = {}
+    changed = False
+    for value in list(item.property_values):
+        if value.property_id in existing:
+            # Duplicates left over from older versions
+            item.property_values.remove(value)
+            changed = True
+        else:
+            existing[value.property_id] = value
+
+    for property_id, raw in submitted.items():
+        prop = properties.get(property_id)
+        if prop is None or prop.property_type == 'image':
+            continue
+        current = existing.pop(property_id, None)
+        if raw is None or raw == '':
+            if current is not None:
+                item.property_values.remove(current)
+                changed = True
+            continue
+        columns = dict.fromkeys(VALUE_COLUMNS)
+        columns.update(typed_value_columns(prop.property_type, raw))
+        if current is None:
+            item.property_values.append(ItemPropertyValue(property=prop, **columns))
+            changed = True
+            continue
+        for column, value in columns.items():
+            if getattr(current, column) != value:
+                setattr(current, column, value)
+                changed = True
+
+    if not partial:
+        for property_id, value in existing.items():
+            if properties.get(property_id) is None or properties[property_id].property_type != 'image':
+                item.property_values.remove(value)
+                changed = True
+    return changed
+
+def _is_image_default(context):
+    return (context.get_current_parameters().get('mime_type') or '').startswith('image/')
+
+class Blob(db.Model):
+    """File content stored once under its SHA-256, see blobs.py"""
+    __tablename__ = 'blobs'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    extension = db.Column(db.String(10), nullable=False, default='')  # Of the first upload, keeps files servable
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def filename(self):
+        """Path relative to the static folder, fanned out over two levels of directories"""
+        return f'blobs/{self.sha256[:2]}/{self.sha256[2:4]}/{self.sha256}{self.extension}'
+
+    def __repr__(self):
+        return f'<Blob {self.sha256}>'
+
+class ItemFile(db.Model):
+    """Manifest of the files stored for an item, so listings never touch the disk"""
+    __tablename__ = 'item_files'
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.String(22), db.ForeignKey('items.id'), nullable=False, index=True)
+    filename = db.Column(db.String(500), nullable=False)  # Path relative to the static folder
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey('blobs.sha256'), index=True)  # None for files not yet migrated
+    original_filename = db.Column(db.String(255), nullable=False)
+    mime_type = db.Column(db.String(100))
+    size = db.Column(db.Integer)
+    is_image = db.Column(db.Boolean, default=_is_image_default)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    item = db.relationship('Item', back_populates='files')
+    blob = db.relationship('Blob')
+
+    def __repr__(self):
+        return f'<ItemFile {self.filename}>'
+
+class UploadSession(db.Model):
+    """Chunked upload in progress, see upload_sessions.py"""
+    __tablename__ = 'upload_sessions'
+    id = db.Column(db.String(22), primary_key=True, default=shortuuid.uuid)
+    item_id = db.Column(db.String(22), db.ForeignKey('items.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.Integer, nullable=False)  # Announced total size in bytes
+    received = db.Column(db.Integer, nullable=False, default=0)  # Bytes on disk, where the next chunk starts
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Job(db.Model):
+    """Background work queued by requests, persisted so it survives restarts"""
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    item_id = db.Column(db.String(22), index=True)
+    item_file_id = db.Column(db.Integer, index=True)
+    worker = db.Column(db.String(100))  # host:pid:token of the process running the job
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_id', 'status', 'id'),
+    )
+
+class ChangeVersion(db.Model):
+    """Monotonic change counter per logical table, bumped by every commit touching it"""
+    __tablename__ = 'change_versions'
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,39 @@
+import base64
+import json
+from sqlalchemy import and_, or_
+
+
+class CursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(values):
+    """Encode the sort key values of the last row into an opaque cursor"""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Decode a cursor created by encode_cursor into a list of `size` values"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise CursorError('Invalid cursor') from e
+    if not isinstance(values, list) or len(values) != size:
+        raise CursorError('Invalid cursor')
+    return values
+
+
+def keyset_after(columns, values):
+    """Build a WHERE clause selecting rows that sort after `values` on `columns`
+
+    All columns are expected to be sorted ascending. The expanded OR/AND form is
+    used instead of a row-value comparison so every database can use the
+    composite index for it.
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, column > values[i]))
+    return or_(*clauses)
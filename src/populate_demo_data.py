@@ -1,9 +1,17 @@
 from app import app, db
 from models import ItemCategory, ItemType, ItemProperty, Location, Item, Tag
+from bulk_load import load_seed_files, print_stats
 from datetime import datetime, timedelta
+import argparse
 
-def populate_demo_data():
+def populate_demo_data(seed_paths=()):
+    """Add the demo catalogue, or bulk load seed files instead when given"""
     with app.app_context():
+        if seed_paths:
+            print("Bulk loading seed files...")
+            print_stats(load_seed_files(seed_paths))
+            return
+
         print("Creating categories...")
         props = ItemCategory(
             name="Requisiten",
@@ -205,4 +213,6 @@ def populate_demo_data():
         print("Demo data created successfully!")
 
 if __name__ == '__main__':
-    populate_demo_data() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Add demo data to the database')
+    parser.add_argument('seed', nargs='*', help='JSON or CSV seed files to bulk load instead of the demo data')
+    populate_demo_data(parser.parse_args().seed) 
\ No newline at end of file
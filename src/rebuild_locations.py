@@ -0,0 +1,13 @@
+from sqlalchemy import inspect, text
+from app import app, db
+from location_tree import rebuild_location_tree
+
+if __name__ == '__main__':
+    with app.app_context():
+        # Creates the closure table and the path column on databases that predate them
+        db.create_all()
+        if 'path' not in {column['name'] for column in inspect(db.engine).get_columns('locations')}:
+            db.session.execute(text('ALTER TABLE locations ADD COLUMN path JSON'))
+        print("Rebuilding location tree...")
+        count = rebuild_location_tree()
+        print(f"Location tree of {count} locations rebuilt successfully!")
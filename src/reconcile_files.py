@@ -0,0 +1,8 @@
+from app import app
+from file_manifest import reconcile_item_files
+
+if __name__ == '__main__':
+    with app.app_context():
+        print("Reconciling file manifest with upload folders...")
+        stats = reconcile_item_files()
+        print(f"Added {stats['added']}, updated {stats['updated']}, removed {stats['removed']} entries")
@@ -0,0 +1,10 @@
+from app import app, db
+from search import rebuild_search_index
+
+if __name__ == '__main__':
+    with app.app_context():
+        # Creates the full-text index table on databases that predate it
+        db.create_all()
+        print("Rebuilding search index...")
+        rebuild_search_index()
+        print("Search index rebuilt successfully!")
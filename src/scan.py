@@ -0,0 +1,69 @@
+from flask import url_for
+from sqlalchemy import select, literal, null, union_all, bindparam
+from models import db, Item, ItemType, ItemFile, Location
+from thumbnails import thumbnail_path, pick_size
+
+KINDS = ('item', 'location')
+MAX_CODES = 500
+THUMBNAIL_SIZE = 128
+
+# Built once, scans only bind the ids and hit SQLAlchemy's compiled statement cache
+_first_image = (select(ItemFile.filename)
+                .where(ItemFile.item_id == Item.id, ItemFile.is_image)
+                .order_by(ItemFile.id).limit(1).scalar_subquery())
+RESOLVE_STATEMENT = union_all(
+    select(literal('item').label('kind'), Item.id, Item.name, ItemType.name.label('type'),
+           Location.path.label('location_path'), _first_image.label('image'))
+    .outerjoin(ItemType, Item.item_type_id == ItemType.id)
+    .outerjoin(Location, Item.location_id == Location.id)
+    .where(Item.id.in_(bindparam('item_ids', expanding=True))),
+    select(literal('location'), Location.id, Location.name, null(), Location.path, null())
+    .where(Location.id.in_(bindparam('location_ids', expanding=True))),
+)
+
+
+def parse_code(code):
+    """(kind, id) of a scanned code, kind is None for a bare id that may be either"""
+    kind, separator, object_id = code.strip().partition(':')
+    if separator and kind in KINDS:
+        return kind, object_id
+    return None, code.strip()
+
+
+def resolve_codes(codes):
+    """Resolve scanned codes with one query, unknown codes map to None
+
+    Returns {code: row}, where row has kind, id, name, type, location_path and
+    image (the static-relative path of the item's first image).
+    """
+    parsed = {code: parse_code(code) for code in codes}
+    item_ids = {object_id for kind, object_id in parsed.values() if kind in (None, 'item')}
+    location_ids = {object_id for kind, object_id in parsed.values() if kind in (None, 'location')}
+
+    rows = db.session.execute(RESOLVE_STATEMENT, {'item_ids': list(item_ids), 'location_ids': list(location_ids)})
+    found = {(row.kind, row.id): row for row in rows}
+
+    resolved = {}
+    for code, (kind, object_id) in parsed.items():
+        # Items win over locations for bare ids, both use short ids of their own
+        candidates = [kind] if kind else list(KINDS)
+        resolved[code] = next((found[(candidate, object_id)] for candidate in candidates
+                               if (candidate, object_id) in found), None)
+    return resolved
+
+
+def serialize_scan(code, row):
+    if row is None:
+        return {'code': code, 'found': False}
+    return {
+        'code': code,
+        'found': True,
+        'kind': row.kind,
+        'id': row.id,
+        'name': row.name,
+        'type': row.type,
+        'location_path': row.location_path or [],
+        # Served statically like the files themselves, the upload job renders it
+        'thumbnail_url': url_for('static', filename=thumbnail_path(row.image, pick_size(THUMBNAIL_SIZE), 'jpeg'))
+        if row.image else None
+    }
@@ -0,0 +1,189 @@
+import re
+import sqlite3
+from sqlalchemy import event, text, select, literal_column, bindparam
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from models import db, Item
+from utils import fold_umlauts
+
+# FTS5 index over the searchable text of an item. Rows are identified by the
+# item id; the implicit rowid of items is not stable across VACUUM, it only
+# serves as the rowid of the index row while that one is still free.
+CREATE_INDEX_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    item_id UNINDEXED, name, item_type, location, tags, properties,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+# Column weights for bm25(): name matches count most, free text property values least
+RANK_EXPRESSION = 'bm25(items_fts, 0.0, 10.0, 4.0, 2.0, 3.0, 1.0)'
+
+INDEX_ROWS_SQL = """
+INSERT INTO items_fts (rowid, item_id, name, item_type, location, tags, properties)
+SELECT CASE WHEN EXISTS (SELECT 1 FROM items_fts WHERE items_fts.rowid = items.rowid) THEN NULL
+            ELSE items.rowid END,
+       items.id,
+       fold_text(items.name),
+       fold_text(item_types.name),
+       fold_text(locations.name),
+       fold_text((SELECT group_concat(tags.name, ' ')
+                  FROM item_tags JOIN tags ON tags.id = item_tags.tag_id
+                  WHERE item_tags.item_id = items.id)),
+       fold_text((SELECT group_concat(item_property_values.value_text, ' ')
+                  FROM item_property_values
+                  JOIN item_properties ON item_properties.id = item_property_values.property_id
+                  WHERE item_property_values.item_id = items.id
+                    AND item_properties.property_type = 'text'))
+FROM items
+JOIN item_types ON item_types.id = items.item_type_id
+LEFT JOIN locations ON locations.id = items.location_id
+"""
+
+# Stay well below SQLite's limit on bound parameters
+CHUNK_SIZE = 500
+
+_available = {}
+
+
+def fold_text(value):
+    """Fold text the way it is indexed and searched, None stays None"""
+    if value is None:
+        return None
+    return fold_umlauts(value)
+
+
+@event.listens_for(Engine, 'connect')
+def register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('fold_text', 1, fold_text, deterministic=True)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def create_search_index(target, connection, **kw):
+    if connection.dialect.name != 'sqlite':
+        return
+    try:
+        connection.execute(text(CREATE_INDEX_SQL))
+        _available[connection.engine.url] = True
+    except OperationalError as e:
+        # SQLite built without FTS5, search falls back to a name LIKE
+        print(f"Full-text search disabled: {str(e)}")
+        _available[connection.engine.url] = False
+
+
+@event.listens_for(db.metadata, 'after_drop')
+def drop_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text('DROP TABLE IF EXISTS items_fts'))
+        _available.pop(connection.engine.url, None)
+
+
+def search_index_available():
+    engine = db.engine
+    if engine.url not in _available:
+        if engine.dialect.name != 'sqlite':
+            _available[engine.url] = False
+        else:
+            found = db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_fts'"
+            )).first()
+            _available[engine.url] = found is not None
+    return _available[engine.url]
+
+
+def match_expression(term):
+    """Turn user input into an FTS5 query: every word must match as a prefix"""
+    tokens = re.findall(r'\w+', fold_umlauts(term))
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), CHUNK_SIZE):
+        yield values[start:start + CHUNK_SIZE]
+
+
+def _execute_for_ids(sql, item_ids):
+    """Run sql with its :ids parameter bound to chunks of a list of ids or an id select"""
+    if not isinstance(item_ids, (list, tuple, set)):
+        item_ids = db.session.execute(item_ids).scalars().all()
+    statement = text(sql).bindparams(bindparam('ids', expanding=True))
+    for chunk in _chunks(item_ids):
+        db.session.execute(statement, {'ids': chunk})
+
+
+def remove_items(item_ids):
+    """Drop items from the search index, call before the items themselves are deleted
+
+    Index rows are looked up by the rowid of their item first. item_id is not
+    indexed, so items whose rows moved to another rowid need a scan of the
+    index; rebuild_search_index() lines the rowids up again.
+    """
+    if not search_index_available():
+        return
+    if not isinstance(item_ids, (list, tuple, set)):
+        item_ids = db.session.execute(item_ids).scalars().all()
+    by_rowid = text(
+        'DELETE FROM items_fts WHERE item_id IN :ids '
+        'AND rowid IN (SELECT items.rowid FROM items WHERE items.id IN :ids)'
+    ).bindparams(bindparam('ids', expanding=True))
+    by_item_id = text('DELETE FROM items_fts WHERE item_id IN :ids').bindparams(bindparam('ids', expanding=True))
+    for chunk in _chunks(item_ids):
+        if db.session.execute(by_rowid, {'ids': chunk}).rowcount < len(chunk):
+            db.session.execute(by_item_id, {'ids': chunk})
+
+
+def index_items(item_ids, replace=True):
+    """(Re)index items by id list or id select within the current transaction
+
+    Pending ORM changes are flushed first so the index sees them. Pass
+    replace=False for freshly inserted items that cannot be indexed yet.
+    """
+    if not search_index_available():
+        return
+    db.session.flush()
+    if not isinstance(item_ids, (list, tuple, set)):
+        item_ids = db.session.execute(item_ids).scalars().all()
+    if replace:
+        remove_items(item_ids)
+    _execute_for_ids(INDEX_ROWS_SQL + ' WHERE items.id IN :ids', item_ids)
+
+
+def rebuild_search_index():
+    """Rebuild the whole index from the item tables
+
+    The table is created anew, so indexes of older versions get the current columns.
+    """
+    if not search_index_available():
+        return
+    db.session.execute(text('DROP TABLE items_fts'))
+    db.session.execute(text(CREATE_INDEX_SQL))
+    db.session.execute(text(INDEX_ROWS_SQL))
+    db.session.commit()
+
+
+def apply_search(query, term):
+    """Restrict an item query to items matching term
+
+    Returns the filtered query and the rank column to order by (lower is
+    better), or None as rank when full-text search is unavailable.
+    """
+    if not search_index_available():
+        return query.filter(Item.name.ilike(f'%{term}%')), None
+
+    expression = match_expression(term)
+    if expression is None:
+        return query, None
+
+    matches = (
+        select(literal_column('items_fts.item_id').label('item_id'),
+               literal_column(RANK_EXPRESSION).label('rank'))
+        .select_from(text('items_fts'))
+        .where(text('items_fts MATCH :match').bindparams(match=expression))
+        .subquery('search_matches')
+    )
+    query = query.join(matches, matches.c.item_id == Item.id)
+    return query, matches.c.rank
@@ -0,0 +1,83 @@
+from sqlalchemy.orm import joinedload, selectinload
+from models import Item, ItemPropertyValue
+from utils import normalize_filename
+
+
+def item_load_options():
+    """Eager loading options for everything serialize_item touches
+
+    Location and item type are joined into the item query, property values with
+    their properties and the file manifest are fetched with one extra
+    SELECT ... IN each per page, so the number of queries does not depend on the
+    number of items.
+    """
+    return (
+        joinedload(Item.location),
+        joinedload(Item.item_type),
+        selectinload(Item.property_values).joinedload(ItemPropertyValue.property),
+        selectinload(Item.files),
+    )
+
+
+def load_item(item_id):
+    """Load a single item with everything serialize_item needs or abort with 404"""
+    return Item.query.options(*item_load_options()).filter(Item.id == item_id).first_or_404()
+
+
+def typed_value(value):
+    """JSON-ready value of an ItemPropertyValue based on its property type"""
+    property_type = value.property.property_type
+    if property_type == 'text':
+        return value.value_text
+    elif property_type == 'number':
+        return value.value_number
+    elif property_type == 'boolean':
+        return value.value_boolean
+    elif property_type == 'date':
+        return int(value.value_date.timestamp()) if value.value_date else None
+    elif property_type == 'item_link':
+        # Only the id, resolving the linked item would cost a query per value
+        return value.value_item_id
+    return None
+
+
+def serialize_property_value(value):
+    return {
+        'property_id': value.property_id,
+        'property_name': value.property.name,
+        'property_type': value.property.property_type,
+        'value': typed_value(value)
+    }
+
+
+def serialize_file(item_file):
+    return {
+        'id': item_file.id,
+        'filename': item_file.filename,
+        'original_filename': item_file.original_filename,
+        'size': item_file.size,
+        'mime_type': item_file.mime_type,
+        'is_image': item_file.is_image
+    }
+
+
+def serialize_item(item):
+    """Serialize an item loaded with item_load_options() for API responses"""
+    return {
+        'id': item.id,
+        'name': item.name,
+        'location_id': item.location_id,
+        'item_type_id': item.item_type_id,
+        'created_at': item.created_at.isoformat(),
+        'location': {
+            'id': item.location.id,
+            'name': item.location.name
+        } if item.location else None,
+        'item_type': {
+            'id': item.item_type.id,
+            'name': item.item_type.name,
+            'normalized_name': normalize_filename(item.item_type.name)
+        },
+        'property_values': [serialize_property_value(value) for value in item.property_values],
+        'files': [serialize_file(item_file) for item_file in item.files]
+    }
@@ -0,0 +1,102 @@
+import os
+import glob
+import threading
+from flask import current_app
+from PIL import Image, ImageOps
+
+# Thumbnails live in a .thumbs folder next to their original
+THUMBS_FOLDER = '.thumbs'
+
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'webp': ('WEBP', 'webp'),
+}
+
+
+def thumbnail_sizes():
+    return sorted(current_app.config.get('THUMBNAIL_SIZES', (128, 512, 1280)))
+
+
+def pick_size(requested):
+    """Smallest configured size covering requested, the largest one for anything bigger"""
+    sizes = thumbnail_sizes()
+    for size in sizes:
+        if size >= requested:
+            return size
+    return sizes[-1]
+
+
+def thumbnail_path(original_path, size, thumbnail_format):
+    folder, filename = os.path.split(original_path)
+    # The original extension stays in the name, item.jpg and item.png get separate thumbnails
+    return os.path.join(folder, THUMBS_FOLDER, f'{filename}.{size}.{FORMATS[thumbnail_format][1]}')
+
+
+def _save(image, path, thumbnail_format, quality):
+    pil_format = FORMATS[thumbnail_format][0]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write next to the target and rename, readers never see half a file
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    image.save(temp_path, pil_format, quality=quality, optimize=True)
+    os.replace(temp_path, path)
+
+
+def _open(original_path, largest):
+    image = Image.open(original_path)
+    # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, far cheaper than a full decode
+    image.draft('RGB', (largest, largest))
+    return ImageOps.exif_transpose(image)
+
+
+def render_thumbnails(original_path, sizes, formats, quality):
+    """Render the thumbnails of an image, largest first, each downscaled from the previous one
+
+    Needs no application context, so it can run in a worker process.
+    """
+    sizes = sorted(sizes, reverse=True)
+    image = _open(original_path, sizes[0])
+    paths = []
+    for size in sizes:
+        # Never upscale, small originals are re-encoded at their own size
+        image.thumbnail((size, size), Image.LANCZOS)
+        for thumbnail_format in formats:
+            path = thumbnail_path(original_path, size, thumbnail_format)
+            _save(image, path, thumbnail_format, quality)
+            paths.append(path)
+    return paths
+
+
+def thumbnail_options():
+    """Arguments of render_thumbnails after the path, from the app config"""
+    return thumbnail_sizes(), list(FORMATS), current_app.config.get('THUMBNAIL_QUALITY', 82)
+
+
+def generate_thumbnails(original_path, sizes=None, formats=None):
+    default_sizes, default_formats, quality = thumbnail_options()
+    return render_thumbnails(original_path, sizes or default_sizes, formats or default_formats, quality)
+
+
+def get_thumbnail(original_path, size, thumbnail_format):
+    """Path of an up to date thumbnail, rendered on first use"""
+    path = thumbnail_path(original_path, size, thumbnail_format)
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(original_path):
+            return path
+    except OSError:
+        pass
+    generate_thumbnails(original_path, [size], [thumbnail_format])
+    return path
+
+
+def remove_thumbnails(original_path):
+    """Delete the cached thumbnails of an image, and their folder once it is empty"""
+    folder, filename = os.path.split(original_path)
+    thumbs_folder = os.path.join(folder, THUMBS_FOLDER)
+    for path in glob.glob(os.path.join(glob.escape(thumbs_folder), f'{glob.escape(filename)}.*')):
+        os.remove(path)
+    if os.path.isdir(thumbs_folder) and not os.listdir(thumbs_folder):
+        os.rmdir(thumbs_folder)
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from werkzeug.exceptions import ClientDisconnected
+from sqlalchemy import select
+from models import db, Item, UploadSession
+from blobs import temp_path, store_temp_file, delete_after_commit, CHUNK_SIZE
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+# Hash state of the uploads this process received chunks for, {session_id: (offset, sha256)}.
+# Another process or a restart only costs hashing the part on disk once more.
+_hashers = {}
+_locks = {}
+_lock = threading.Lock()
+
+
+class UploadError(ValueError):
+    """Raised for chunks or upload requests that cannot be accepted"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def part_path(upload):
+    return temp_path(f'upload-{upload.id}.part')
+
+
+def _session_lock(upload_id):
+    with _lock:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _forget(upload_id):
+    with _lock:
+        _hashers.pop(upload_id, None)
+        _locks.pop(upload_id, None)
+
+
+def create_session(item, filename, size):
+    """Start an upload of size bytes for item, the empty part file is created right away"""
+    if not isinstance(size, int) or size < 0:
+        raise UploadError('size must be a non-negative number of bytes')
+    if size > current_app.config['MAX_UPLOAD_SIZE']:
+        raise UploadError(f"File too large, at most {current_app.config['MAX_UPLOAD_SIZE']} bytes", 413)
+    upload = UploadSession(item_id=item.id, filename=filename, size=size)
+    db.session.add(upload)
+    db.session.flush()
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def parse_content_range(header, upload):
+    """(start, end) of a 'bytes start-end/total' header, end exclusive"""
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        raise UploadError('Content-Range header of the form bytes start-end/total required')
+    start, last, total = (int(group) for group in match.groups())
+    if total != upload.size or last < start or last >= total:
+        raise UploadError(f'Content-Range does not fit an upload of {upload.size} bytes', 416)
+    return start, last + 1
+
+
+def _hasher(upload):
+    """sha256 object fed with the bytes received so far"""
+    offset, hasher = _hashers.get(upload.id, (None, None))
+    if offset == upload.received:
+        return hasher
+    hasher = hashlib.sha256()
+    remaining = upload.received
+    with open(part_path(upload), 'rb') as f:
+        while remaining:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            remaining -= len(chunk)
+    return hasher
+
+
+def write_chunk(upload, stream, content_range):
+    """Append a chunk read from stream, which must start where the upload stands
+
+    The body is copied to the part file piece by piece and hashed on the way.
+    Whatever arrived before a dropped connection is kept, the client resumes
+    from the offset reported afterwards.
+    """
+    start, end = parse_content_range(content_range, upload)
+    with _session_lock(upload.id):
+        db.session.refresh(upload)
+        if start != upload.received:
+            raise UploadError(f'Upload continues at byte {upload.received}', 409)
+
+        hasher = _hasher(upload)
+        received = upload.received
+        disconnected = False
+        with open(part_path(upload), 'r+b') as f:
+            f.seek(received)
+            f.truncate()
+            try:
+                while received < end:
+                    chunk = stream.read(min(CHUNK_SIZE, end - received))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    received += len(chunk)
+            except ClientDisconnected:
+                disconnected = True
+
+        upload.received = received
+        _hashers[upload.id] = (received, hasher)
+        db.session.commit()
+    if disconnected or received < end:
+        raise UploadError(f'Chunk incomplete, upload continues at byte {received}')
+    return upload
+
+
+def finish_session(upload, expected_sha256=None):
+    """Move a completely received upload into the blob store, returns the blob"""
+    if upload.received != upload.size:
+        raise UploadError(f'Upload incomplete, {upload.received} of {upload.size} bytes received', 409)
+    with _session_lock(upload.id):
+        sha256 = _hasher(upload).hexdigest()
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise UploadError('Checksum mismatch, the upload has to be restarted')
+        blob = store_temp_file(part_path(upload), sha256, upload.size, os.path.splitext(upload.filename)[1])
+        db.session.delete(upload)
+    _forget(upload.id)
+    return blob
+
+
+def _remove_part(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def discard_session(upload):
+    """Delete an upload, its part file goes once the transaction commits"""
+    delete_after_commit(_remove_part, part_path(upload))
+    db.session.delete(upload)
+    _forget(upload.id)
+
+
+def expire_sessions():
+    """Discard uploads that saw no chunk for UPLOAD_SESSION_TTL seconds or whose item is gone"""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+    expired = UploadSession.query.filter(
+        (UploadSession.updated_at < cutoff) | ~UploadSession.item_id.in_(select(Item.id))
+    ).all()
+    for upload in expired:
+        discard_session(upload)
+    return len(expired)
+
+
+def serialize_upload(upload):
+    return {
+        'id': upload.id,
+        'item_id': upload.item_id,
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': upload.received,
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
+        'created_at': upload.created_at.isoformat() if upload.created_at else None
+    }
@@ -0,0 +1,23 @@
+from werkzeug.utils import secure_filename
+
+# German umlauts are spelled out the same way in file names and search terms
+UMLAUT_REPLACEMENTS = {
+    'ä': 'ae',
+    'ö': 'oe',
+    'ü': 'ue',
+    'ß': 'ss'
+}
+
+
+def fold_umlauts(text):
+    """Lowercase text and spell out umlauts (ä -> ae, ß -> ss, ...)"""
+    text = text.lower()
+    for char, replacement in UMLAUT_REPLACEMENTS.items():
+        text = text.replace(char, replacement)
+    return text
+
+
+def normalize_filename(filename):
+    """Normalize filename by replacing umlauts and special characters"""
+    filename = fold_umlauts(filename).replace(' ', '_')
+    return secure_filename(filename)
@@ -0,0 +1,176 @@
+import hashlib
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import request, make_response, current_app
+from sqlalchemy import event, select, update, insert
+from models import (db, ChangeVersion, Item, ItemPropertyValue, ItemFile, Location, ItemType,
+                    ItemProperty, Tag, ItemCategory, User, Role)
+
+# Logical table bumped when an instance of the model is written
+TRACKED_MODELS = {
+    Item: 'items',
+    ItemPropertyValue: 'items',
+    ItemFile: 'items',
+    Location: 'locations',
+    ItemType: 'item_types',
+    ItemProperty: 'item_types',
+    Tag: 'tags',
+    ItemCategory: 'item_categories',
+    User: 'users',
+    Role: 'roles',
+}
+
+# Everything the item serializer reads
+ITEM_TABLES = ('items', 'locations', 'item_types', 'tags', 'item_categories')
+
+_EPOCH = datetime(1970, 1, 1)
+
+_lock = threading.Lock()
+_snapshot = {}
+_loaded_at = None
+_listeners = []
+
+
+def mark_changed(session, *tables):
+    """Record tables changed by statements the ORM does not track (Core inserts, bulk updates)"""
+    session.info.setdefault('changed_tables', set()).update(tables)
+
+
+def on_tables_changed(listener):
+    """Register listener(tables) to run after a commit changed the given tables"""
+    _listeners.append(listener)
+    return listener
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_changed_tables(session, flush_context):
+    changed = set()
+    for obj in list(session.new) + list(session.deleted):
+        table = TRACKED_MODELS.get(type(obj))
+        if table:
+            changed.add(table)
+    for obj in session.dirty:
+        table = TRACKED_MODELS.get(type(obj))
+        if table and session.is_modified(obj):
+            changed.add(table)
+    if changed:
+        mark_changed(session, *changed)
+
+
+@event.listens_for(db.session, 'before_commit')
+def bump_versions(session):
+    session.flush()
+    changed = session.info.get('changed_tables')
+    if not changed:
+        return
+    now = datetime.utcnow()
+    existing = set(session.execute(
+        select(ChangeVersion.table_name).where(ChangeVersion.table_name.in_(changed))
+    ).scalars())
+    missing = [{'table_name': table, 'version': 0, 'updated_at': now} for table in changed - existing]
+    if missing:
+        session.execute(insert(ChangeVersion), missing)
+    session.execute(
+        update(ChangeVersion)
+        .where(ChangeVersion.table_name.in_(changed))
+        .values(version=ChangeVersion.version + 1, updated_at=now)
+    )
+    session.info['committed_versions'] = {
+        row.table_name: (row.version, row.updated_at)
+        for row in session.execute(select(ChangeVersion.table_name, ChangeVersion.version, ChangeVersion.updated_at))
+    }
+
+
+@event.listens_for(db.session, 'after_commit')
+def publish_versions(session):
+    global _loaded_at
+    changed = session.info.pop('changed_tables', None)
+    committed = session.info.pop('committed_versions', None)
+    if committed is not None:
+        with _lock:
+            _snapshot.clear()
+            _snapshot.update(committed)
+            _loaded_at = time.monotonic()
+    if changed:
+        for listener in _listeners:
+            listener(changed)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_changed_tables(session):
+    session.info.pop('changed_tables', None)
+    session.info.pop('committed_versions', None)
+
+
+@event.listens_for(db.metadata, 'after_create')
+@event.listens_for(db.metadata, 'after_drop')
+def reset_versions(*args, **kw):
+    """Forget the in-process snapshot, the next lookup reloads it"""
+    global _loaded_at
+    with _lock:
+        _snapshot.clear()
+        _loaded_at = None
+
+
+def current_versions():
+    """Versions per table as {table: (version, updated_at)}
+
+    Commits in this process update the snapshot directly. Commits by other
+    worker processes are picked up when the snapshot is older than
+    CHANGE_VERSION_TTL seconds.
+    """
+    global _loaded_at
+    ttl = current_app.config.get('CHANGE_VERSION_TTL', 1.0)
+    with _lock:
+        if _loaded_at is not None and time.monotonic() - _loaded_at < ttl:
+            return dict(_snapshot)
+    rows = db.session.execute(
+        select(ChangeVersion.table_name, ChangeVersion.version, ChangeVersion.updated_at)
+    ).all()
+    with _lock:
+        _snapshot.clear()
+        _snapshot.update({row.table_name: (row.version, row.updated_at) for row in rows})
+        _loaded_at = time.monotonic()
+        return dict(_snapshot)
+
+
+def conditional(*tables):
+    """Answer GET requests with 304 when none of tables changed since the client's copy
+
+    The strong ETag combines the request path and query string with the
+    versions of the tables the response is built from, so a match is decided
+    before the view runs any query.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return fn(*args, **kwargs)
+
+            versions = current_versions()
+            state = [(table, *versions.get(table, (0, _EPOCH))) for table in tables]
+            key = request.full_path + '|' + '|'.join(f'{table}:{version}' for table, version, _ in state)
+            etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+            last_modified = max(updated_at or _EPOCH for _, _, updated_at in state).replace(microsecond=0)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = (request.if_modified_since is not None and
+                                last_modified <= request.if_modified_since.replace(tzinfo=None))
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            # Clients may keep the copy but have to revalidate it on every use
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -1,24 +1,63 @@
 import pytest
 import os
+import sys
+import shutil
 import tempfile
-from src.app import app as flask_app
-from src.models import db, Location, Item, Tag
+
+# The backend modules import each other as top-level modules (run from src/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+# The engine is created when the app module is imported, so point it at a
+# temporary database before that happens
+db_fd, db_path = tempfile.mkstemp(suffix='.db')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+
+from flask_jwt_extended import create_access_token
+from app import app as flask_app
+from models import db, Location, Item, Tag, Role, User
+from jobs import job_queue
+
+def pytest_sessionfinish(session, exitstatus):
+    os.close(db_fd)
+    # The database runs in WAL mode, which keeps two files next to it
+    for path in (db_path, f'{db_path}-wal', f'{db_path}-shm'):
+        if os.path.exists(path):
+            os.unlink(path)
 
 @pytest.fixture
 def app():
-    db_fd, db_path = tempfile.mkstemp()
-    flask_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    storage_dir = tempfile.mkdtemp()
     flask_app.config['TESTING'] = True
     flask_app.config['WTF_CSRF_ENABLED'] = False
+    flask_app.config['UPLOAD_FOLDER'] = os.path.join(storage_dir, 'uploads')
+    flask_app.config['PICTURES_FOLDER'] = os.path.join(storage_dir, 'pictures')
+    flask_app.config['BLOBS_FOLDER'] = os.path.join(storage_dir, 'blobs')
 
     with flask_app.app_context():
         db.create_all()
         yield flask_app
+        job_queue.join()
         db.session.remove()
         db.drop_all()
 
-    os.close(db_fd)
-    os.unlink(db_path)
+    shutil.rmtree(storage_dir, ignore_errors=True)
+
+@pytest.fixture
+def auth_headers(app):
+    role = Role(name='admin', permissions=[
+        'manage_users', 'view_items', 'add_items', 'edit_items', 'delete_items', 'add_locations'
+    ])
+    user = User(username='admin', email='admin@example.com', is_active=True)
+    user.set_password('admin')
+    user.roles.append(role)
+    db.session.add(user)
+    db.session.commit()
+
+    token = create_access_token(
+        identity=str(user.id),
+        additional_claims={'roles': ['admin'], 'permissions': role.permissions}
+    )
+    return {'Authorization': f'Bearer {token}'}
 
 @pytest.fixture
 def client(app):
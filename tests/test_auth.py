@@ -0,0 +1,92 @@
+import sqlite3
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, update
+from sqlalchemy.engine import Engine
+from models import db, Role, User, ChangeVersion
+from versions import reset_versions
+
+def make_user(username, permissions):
+    role = Role(name=f'{username}-role', permissions=permissions)
+    user = User(username=username, email=f'{username}@example.com', roles=[role])
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    return user, role
+
+def token_for(user, permissions):
+    return {'Authorization': 'Bearer ' + create_access_token(
+        identity=str(user.id), additional_claims={'roles': [], 'permissions': permissions})}
+
+def backdate_auth_changes():
+    """Pretend users and roles were last edited before any token was issued"""
+    db.session.execute(update(ChangeVersion).values(updated_at=datetime.utcnow() - timedelta(hours=1)))
+    db.session.commit()
+    reset_versions()
+
+def auth_statements(app, client, url, headers):
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM users' in statement or 'FROM roles' in statement:
+            statements.append(statement)
+    event.listen(Engine, 'before_cursor_execute', count)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count)
+    return response, statements
+
+def test_fresh_claims_need_no_user_lookup(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHANGE_VERSION_TTL', 60)
+    user, _ = make_user('inspizienz', ['view_items'])
+    backdate_auth_changes()
+    headers = token_for(user, ['view_items'])
+
+    response, statements = auth_statements(app, client, '/api/tags', headers)
+    assert response.status_code == 200
+    assert statements == []
+
+def test_role_edit_overrides_older_claims(app, client):
+    user, role = make_user('requisite', ['view_items'])
+    headers = token_for(user, ['view_items'])
+    backdate_auth_changes()
+    assert client.get('/api/tags', headers=headers).status_code == 200
+
+    role.permissions = []
+    db.session.commit()
+    assert client.get('/api/tags', headers=headers).status_code == 403
+
+    role.permissions = ['view_items']
+    db.session.commit()
+    assert client.get('/api/tags', headers=headers).status_code == 200
+
+def test_deactivated_user_loses_permissions(app, client):
+    user, _ = make_user('gast', ['view_items'])
+    headers = token_for(user, ['view_items'])
+    user.is_active = False
+    db.session.commit()
+    assert client.get('/api/tags', headers=headers).status_code == 403
+
+def test_permissions_per_method(app, client):
+    user, _ = make_user('leser', ['view_items'])
+    headers = token_for(user, ['view_items'])
+    assert client.get('/api/locations', headers=headers).status_code == 200
+    response = client.post('/api/locations', json={'name': 'Bühne'}, headers=headers)
+    assert response.status_code == 403
+
+def test_role_edit_in_another_process_reaches_the_permission_cache(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHANGE_VERSION_TTL', 0)
+    user, role = make_user('souffleuse', ['view_items'])
+    # Without permission claims every request goes through the permission cache
+    headers = {'Authorization': 'Bearer ' + create_access_token(identity=str(user.id))}
+    assert client.get('/api/tags', headers=headers).status_code == 200
+
+    # A commit of another worker, which this process sees only through the change versions
+    other = sqlite3.connect(db.engine.url.database)
+    with other:
+        other.execute("UPDATE roles SET permissions = '[]' WHERE id = ?", (role.id,))
+        other.execute("UPDATE change_versions SET version = version + 1 WHERE table_name = 'roles'")
+    other.close()
+    # The test client shares this session, a real request starts with a fresh one
+    db.session.expire_all()
+    assert client.get('/api/tags', headers=headers).status_code == 403
@@ -0,0 +1,99 @@
+import json
+import os
+import pytest
+from models import db, Item, ItemType, ItemFile, ItemPropertyValue, ItemProperty, Location, Tag, UploadSession
+from upload_sessions import part_path
+
+@pytest.fixture
+def stage(app):
+    kulisse = ItemType(name='Kulisse')
+    art = ItemProperty(name='Art', property_type='text')
+    kulisse.properties.append(art)
+    lager = Location(name='Bühnenbildlager')
+    buehne = Location(name='Bühne')
+    faust = Tag(name='Faust')
+    hamlet = Tag(name='Hamlet')
+    items = []
+    for index in range(7):
+        item = Item(name=f'Wand {index}', item_type=kulisse, location=lager, tags=[hamlet])
+        ItemPropertyValue(item=item, property=art).set_typed_value('Seitenteil')
+        items.append(item)
+    items.append(Item(name='Thron', item_type=kulisse, location=buehne))
+    db.session.add_all(items + [faust])
+    db.session.commit()
+    return {'lager': lager, 'buehne': buehne, 'faust': faust, 'hamlet': hamlet, 'items': items}
+
+def test_move_and_retag_by_filter(client, auth_headers, stage, monkeypatch):
+    monkeypatch.setitem(client.application.config, 'ITEMS_BULK_CHUNK_SIZE', 3)
+    response = client.post('/api/items/bulk', headers=auth_headers, json={
+        'filter': {'location_id': stage['lager'].id},
+        'set_location': stage['buehne'].id,
+        'add_tags': [stage['faust'].id],
+        'remove_tags': [stage['hamlet'].id],
+    })
+    assert response.status_code == 200
+    assert response.json == {'processed': 7, 'total': 7}
+
+    db.session.expire_all()
+    assert Item.query.filter_by(location_id=stage['buehne'].id).count() == 8
+    wand = Item.query.filter_by(name='Wand 0').one()
+    assert [tag.name for tag in wand.tags] == ['Faust']
+    assert Item.query.filter_by(name='Thron').one().tags == []
+
+    # Adding a tag twice does not duplicate the link
+    client.post('/api/items/bulk', headers=auth_headers, json={
+        'ids': [wand.id], 'add_tags': [stage['faust'].id]
+    })
+    db.session.expire_all()
+    assert len(Item.query.filter_by(name='Wand 0').one().tags) == 1
+
+    # The search index follows the new location
+    found = client.get('/api/items?search=wand buehne', headers=auth_headers).json
+    assert len(found) == 7
+
+def test_delete_streams_progress_and_removes_files(client, auth_headers, stage, monkeypatch):
+    monkeypatch.setitem(client.application.config, 'ITEMS_BULK_CHUNK_SIZE', 3)
+    ids = [item.id for item in stage['items'][:5]]
+    stored = os.path.join(client.application.config['UPLOAD_FOLDER'], 'items', 'kulisse', ids[0])
+    os.makedirs(stored, exist_ok=True)
+    with open(os.path.join(stored, 'plan.pdf'), 'wb') as handle:
+        handle.write(b'%PDF')
+    db.session.add(ItemFile(item_id=ids[0], filename=f'uploads/items/kulisse/{ids[0]}/plan.pdf',
+                            original_filename='plan.pdf', mime_type='application/pdf', size=4))
+    db.session.commit()
+    upload = client.post(f'/api/items/{ids[1]}/uploads', headers=auth_headers,
+                         json={'filename': 'plan.pdf', 'size': 4}).json
+    part = part_path(db.session.get(UploadSession, upload['id']))
+    assert os.path.exists(part)
+
+    response = client.post('/api/items/bulk?format=ndjson', headers=auth_headers,
+                           json={'ids': ids + ['missing'], 'delete': True})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['processed'] for line in lines] == [0, 3, 5]
+
+    assert Item.query.count() == 3
+    assert ItemPropertyValue.query.count() == 2
+    assert ItemFile.query.count() == 0
+    assert not os.path.exists(stored)
+    assert UploadSession.query.count() == 0
+    assert not os.path.exists(part)
+
+def test_bulk_validation(client, auth_headers, stage):
+    assert client.post('/api/items/bulk', headers=auth_headers, json={'ids': []}).status_code == 400
+    response = client.post('/api/items/bulk', headers=auth_headers,
+                           json={'ids': [], 'filter': {}, 'delete': True})
+    assert response.status_code == 400
+    response = client.post('/api/items/bulk', headers=auth_headers,
+                           json={'filter': {}, 'add_tags': [999]})
+    assert response.json['error'] == 'Unknown tags: 999'
+    response = client.post('/api/items/bulk', headers=auth_headers,
+                           json={'filter': {'property_999': 'x'}, 'delete': True})
+    assert response.status_code == 400
+    for empty in ({}, {'search': '', 'tag_id': []}):
+        response = client.post('/api/items/bulk', headers=auth_headers, json={'filter': empty, 'delete': True})
+        assert response.status_code == 400
+    assert Item.query.count() == 8
+
+    response = client.post('/api/items/bulk', headers=auth_headers, json={'filter': {}, 'delete': True, 'all': True})
+    assert response.status_code == 200
+    assert Item.query.count() == 0
@@ -0,0 +1,97 @@
+import json
+from datetime import datetime
+import pytest
+from sqlalchemy import select, text
+from models import db, Item, ItemPropertyValue, Location, User, location_closure
+from bulk_load import load_seed_files, SeedError, DEFERRED_INDEX_TABLES
+from init_db import init_db
+
+SEED = {
+    'categories': [{'name': 'Kostüme', 'icon': 'person-badge', 'color': 'success'}],
+    'item_types': [{'name': 'Kostüm', 'category': 'Kostüme', 'properties': [
+        {'name': 'Größe', 'property_type': 'text', 'required': True, 'options': ['S', 'M', 'L']},
+        {'name': 'Gewicht (g)', 'property_type': 'number'},
+        {'name': 'Waschbar', 'property_type': 'boolean'},
+        {'name': 'Letzte Reinigung', 'property_type': 'date'},
+    ]}],
+    'locations': [{'name': 'Fundus'}, {'name': 'Regal 1', 'parent': 'Fundus'}],
+    'tags': [{'name': 'Neu', 'color': 'success'}, {'name': 'Defekt', 'color': 'danger'}],
+}
+
+ITEMS_CSV = """name;item_type;location;tags;Größe;Gewicht (g);Waschbar;Letzte Reinigung
+Ballkleid;Kostüm;Regal 1;Neu;M;850;nein;2024-03-01
+Gehrock;kostüm;Fundus;"Neu;Defekt";L;1200;ja;2023-11-15
+Umhang;Kostüm;Regal 1;;XL;;;
+Wams;Requisite;Fundus;;S;;;
+"""
+
+@pytest.fixture
+def seed_files(tmp_path):
+    seed = tmp_path / 'seed.json'
+    seed.write_text(json.dumps(SEED), encoding='utf-8')
+    items = tmp_path / 'items.csv'
+    items.write_text(ITEMS_CSV, encoding='utf-8')
+    return [str(items), str(seed)]
+
+def index_names():
+    return set(db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+
+def test_seed_files_load_with_values_tags_and_indexes(client, auth_headers, seed_files):
+    indexes = index_names()
+    stats = load_seed_files(seed_files, chunk_size=1)
+    assert (stats['items'], stats['property_values'], stats['locations'], stats['properties']) == (2, 8, 2, 4)
+    assert stats['failed'] == 2
+    assert stats['errors'][0] == {'row': 3, 'errors': ['Größe: XL is not one of S, M, L']}
+    assert stats['errors'][1] == {'row': 4, 'errors': ['Unknown item type: requisite']}
+
+    # Indexes are back and the connection settings restored
+    assert index_names() == indexes
+    assert all(index.name in indexes for table in DEFERRED_INDEX_TABLES for index in table.indexes)
+    assert db.session.execute(text('PRAGMA journal_mode')).scalar() != 'off'
+
+    gehrock = Item.query.filter_by(name='Gehrock').one()
+    assert sorted(tag.name for tag in gehrock.tags) == ['Defekt', 'Neu']
+    values = {value.property.name: value for value in ItemPropertyValue.query.filter_by(item_id=gehrock.id)}
+    assert values['Gewicht (g)'].value_number == 1200.0 and values['Waschbar'].value_boolean is True
+    assert values['Letzte Reinigung'].value_date == datetime(2023, 11, 15)
+
+    regal = Location.query.filter_by(name='Regal 1').one()
+    assert regal.path == ['Fundus', 'Regal 1']
+    assert db.session.execute(select(location_closure).where(location_closure.c.descendant_id == regal.id)).all()
+
+    response = client.get('/api/items?search=Ballkleid', headers=auth_headers)
+    assert [item['name'] for item in response.json] == ['Ballkleid']
+
+    # Loading again keeps the reference data and only adds the items
+    again = load_seed_files(seed_files)
+    assert (again['categories'], again['item_types'], again['tags'], again['items']) == (0, 0, 0, 2)
+
+def test_invalid_seeds_are_rejected(app, tmp_path):
+    seed = tmp_path / 'seed.json'
+    seed.write_text(json.dumps({'item_types': [{'name': 'Kostüm', 'properties': [
+        {'name': 'Größe', 'property_type': 'colour'}]}]}), encoding='utf-8')
+    with pytest.raises(SeedError):
+        load_seed_files([str(seed)])
+    seed.write_text(json.dumps({'locations': [{'name': 'Regal', 'parent': 'Nirgendwo'}]}), encoding='utf-8')
+    with pytest.raises(SeedError):
+        load_seed_files([str(seed)])
+    with pytest.raises(SeedError):
+        load_seed_files([str(tmp_path / 'seed.xml')])
+
+def test_init_db_bulk_loads_seed_files_instead_of_demo_data(app, seed_files):
+    stats = init_db(seed_files)
+    assert stats['items'] == 2
+    assert User.query.filter_by(username='admin').count() == 1
+    assert sorted(item.name for item in Item.query) == ['Ballkleid', 'Gehrock']
+
+def test_seed_items_with_malformed_rows_are_reported(app, tmp_path):
+    seed = tmp_path / 'seed.json'
+    seed.write_text(json.dumps({**SEED, 'items': [
+        'Ballkleid',
+        {'name': 'Gehrock', 'item_type': ['Kostüm'], 'properties': {'Größe': 'M'}},
+        {'name': 'Umhang', 'item_type': 'Kostüm', 'properties': {'Größe': 'M'}},
+    ]}), encoding='utf-8')
+    stats = load_seed_files([str(seed)])
+    assert (stats['items'], stats['failed']) == (1, 2)
+    assert stats['errors'] == [{'row': 1, 'errors': ['Row must be an object']},
+                               {'row': 2, 'errors': ['item_type must be a string or number']}]
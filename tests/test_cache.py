@@ -0,0 +1,53 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models import db, Tag, ItemCategory
+from cache import reference_cache
+
+def test_reference_lists_are_served_from_cache(app, client, auth_headers, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHANGE_VERSION_TTL', 60)
+    reference_cache.invalidate()
+    db.session.add(ItemCategory(name='Kostüme'))
+    db.session.commit()
+
+    first = client.get('/api/categories', headers=auth_headers)
+    assert [c['name'] for c in first.json] == ['Kostüme']
+    hits = reference_cache.hits
+
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        # Only the authorization lookups may still reach the database
+        if 'item_categories' in statement:
+            statements.append(statement)
+    event.listen(Engine, 'before_cursor_execute', count)
+    try:
+        second = client.get('/api/categories', headers=auth_headers)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count)
+    assert second.status_code == 200
+    assert second.json == first.json
+    assert statements == []
+    assert reference_cache.hits == hits + 1
+
+def test_writes_invalidate_cached_lists(app, client, auth_headers):
+    reference_cache.invalidate()
+    assert client.get('/api/tags', headers=auth_headers).json == []
+
+    response = client.post('/api/tags', json={'name': 'Faust'}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [t['name'] for t in client.get('/api/tags', headers=auth_headers).json] == ['Faust']
+
+    tag = Tag.query.first()
+    tag.name = 'Hamlet'
+    db.session.commit()
+    assert [t['name'] for t in client.get('/api/tags', headers=auth_headers).json] == ['Hamlet']
+
+def test_cache_stats(client, auth_headers):
+    response = client.get('/api/cache/stats', headers=auth_headers)
+    assert response.status_code == 200
+    assert set(response.json['reference_data']) == {'entries', 'hits', 'misses', 'hit_rate'}
+
+def test_query_strings_do_not_add_entries(app, client, auth_headers):
+    reference_cache.invalidate()
+    for number in range(5):
+        assert client.get(f'/api/tags?junk={number}', headers=auth_headers).status_code == 200
+    assert reference_cache.stats()['entries'] == 1
@@ -0,0 +1,70 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models import db, Item, ItemType, Location, Tag, ChangeVersion
+
+def version_of(table):
+    row = db.session.get(ChangeVersion, table)
+    return row.version if row else 0
+
+def test_commit_bumps_versions_of_touched_tables(app):
+    db.session.add(Location(name='Bühne'))
+    db.session.commit()
+    assert version_of('locations') == 1
+    assert version_of('items') == 0
+
+    location = Location.query.first()
+    location.name = 'Hinterbühne'
+    db.session.commit()
+    assert version_of('locations') == 2
+
+    # A commit without changes leaves the versions alone
+    db.session.commit()
+    assert version_of('locations') == 2
+
+def test_item_list_revalidates_with_etag(app, client, auth_headers, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHANGE_VERSION_TTL', 60)
+    kostuem = ItemType(name='Kostüm')
+    db.session.add(Item(name='Ballkleid', item_type=kostuem))
+    db.session.commit()
+
+    first = client.get('/api/items', headers=auth_headers)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Last-Modified']
+
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(Engine, 'before_cursor_execute', count)
+    try:
+        cached = client.get('/api/items', headers={**auth_headers, 'If-None-Match': etag})
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count)
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == etag
+    assert statements == []
+
+    # Other filters are other representations
+    filtered = client.get('/api/items?search=ball', headers={**auth_headers, 'If-None-Match': etag})
+    assert filtered.status_code == 200
+
+    db.session.add(Item(name='Gehrock', item_type=kostuem))
+    db.session.commit()
+    changed = client.get('/api/items', headers={**auth_headers, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert len(changed.json) == 2
+
+def test_reference_lists_depend_on_their_own_table(app, client, auth_headers):
+    db.session.add(Tag(name='Faust'))
+    db.session.commit()
+    tags = client.get('/api/tags', headers=auth_headers)
+    etag = tags.headers['ETag']
+
+    db.session.add(Location(name='Bühne'))
+    db.session.commit()
+    assert client.get('/api/tags', headers={**auth_headers, 'If-None-Match': etag}).status_code == 304
+
+    db.session.add(Tag(name='Hamlet'))
+    db.session.commit()
+    assert client.get('/api/tags', headers={**auth_headers, 'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,78 @@
+import threading
+from sqlalchemy import event, select, text
+from sqlalchemy.exc import OperationalError
+from models import db, ItemType
+from database import READ_BIND
+
+def pragma(engine, name):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+
+def test_engines_use_wal_and_the_reader_is_read_only(app):
+    writer, reader = db.engines[None], db.engines[READ_BIND]
+    for engine in (writer, reader):
+        assert pragma(engine, 'journal_mode') == 'wal'
+        assert pragma(engine, 'busy_timeout') == app.config['SQLITE_BUSY_TIMEOUT']
+    assert pragma(reader, 'query_only') == 1
+    assert writer.pool.size() == 1
+    with reader.connect() as connection:
+        try:
+            connection.exec_driver_sql("INSERT INTO tags (name) VALUES ('x')")
+            assert False, 'reader connections must not write'
+        except OperationalError:
+            pass
+
+def test_reads_go_to_the_reader_until_the_transaction_writes(app, client, auth_headers):
+    # The first request recovers stale jobs, a write
+    client.get('/api/items', headers=auth_headers)
+    used = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        used.append((conn.engine is db.engines[READ_BIND], statement.split()[0]))
+    for engine in db.engines.values():
+        event.listen(engine, 'before_cursor_execute', record)
+    try:
+        assert client.get('/api/items', headers=auth_headers).status_code == 200
+        assert used and all(on_reader for on_reader, _ in used)
+
+        used.clear()
+        db.session.add(ItemType(name='Requisite'))
+        db.session.flush()
+        # Uncommitted rows are only visible on the writer, where the session stays now
+        assert db.session.scalar(select(ItemType.id).where(ItemType.name == 'Requisite'))
+        assert not any(on_reader for on_reader, _ in used)
+        db.session.commit()
+
+        used.clear()
+        assert db.session.scalar(select(ItemType.name)) == 'Requisite'
+        assert [on_reader for on_reader, _ in used] == [True]
+    finally:
+        for engine in db.engines.values():
+            event.remove(engine, 'before_cursor_execute', record)
+
+def test_concurrent_writes_queue_instead_of_failing(app, client, auth_headers):
+    item_type = ItemType(name='Requisite')
+    db.session.add(item_type)
+    db.session.commit()
+    type_id = item_type.id
+    statuses = []
+
+    def write(worker):
+        for number in range(8):
+            response = client.post('/api/items', headers=auth_headers,
+                                   json={'name': f'Stuhl {worker}-{number}', 'item_type_id': type_id})
+            statuses.append(response.status_code)
+
+    def read():
+        for _ in range(8):
+            statuses.append(client.get('/api/items?limit=5', headers=auth_headers).status_code)
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    threads += [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(set(statuses)) == [200, 201]
+    assert statuses.count(201) == 32
+    assert db.session.scalar(text('SELECT count(*) FROM items')) == 32
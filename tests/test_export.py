@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+import pytest
+from datetime import datetime
+from models import db, Item, ItemType, ItemProperty, ItemPropertyValue, Location, Tag
+
+@pytest.fixture
+def kostueme(app):
+    kostuem = ItemType(name='Kostüm')
+    epoche = ItemProperty(name='Epoche', property_type='text')
+    gewicht = ItemProperty(name='Gewicht', property_type='number')
+    gereinigt = ItemProperty(name='Gereinigt', property_type='boolean')
+    angeschafft = ItemProperty(name='Angeschafft', property_type='date')
+    kostuem.properties.extend([epoche, gewicht, gereinigt, angeschafft])
+    lager = Location(name='Kostümlager')
+    faust = Tag(name='Faust')
+    hamlet = Tag(name='Hamlet')
+
+    ballkleid = Item(name='Ballkleid', item_type=kostuem, location=lager, tags=[faust, hamlet])
+    for prop, value in [(epoche, 'Rokoko'), (gewicht, 1.5), (gereinigt, True), (angeschafft, datetime(2023, 5, 1))]:
+        ItemPropertyValue(item=ballkleid, property=prop).set_typed_value(value)
+    gehrock = Item(name='Gehrock', item_type=kostuem)
+    ItemPropertyValue(item=gehrock, property=epoche).set_typed_value('Barock')
+    db.session.add_all([ballkleid, gehrock, Item(name='Schwert', item_type=ItemType(name='Requisite'))])
+    db.session.commit()
+    return {'kostuem': kostuem, 'lager': lager}
+
+def test_csv_export_has_a_column_per_property(client, auth_headers, kostueme):
+    response = client.get(f"/api/items/export?item_type_id={kostueme['kostuem'].id}", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert list(rows[0]) == ['id', 'name', 'location', 'tags', 'created_at',
+                             'Epoche', 'Gewicht', 'Gereinigt', 'Angeschafft']
+    by_name = {row['name']: row for row in rows}
+    assert set(by_name) == {'Ballkleid', 'Gehrock'}
+    ballkleid = by_name['Ballkleid']
+    assert ballkleid['location'] == 'Kostümlager'
+    assert sorted(ballkleid['tags'].split(';')) == ['Faust', 'Hamlet']
+    assert (ballkleid['Epoche'], ballkleid['Gewicht'], ballkleid['Gereinigt'], ballkleid['Angeschafft']) == \
+        ('Rokoko', '1.5', 'true', '2023-05-01T00:00:00')
+    assert by_name['Gehrock']['Gewicht'] == ''
+
+def test_jsonl_export_applies_list_filters(client, auth_headers, kostueme):
+    response = client.get('/api/items/export', headers=auth_headers, query_string={
+        'item_type_id': kostueme['kostuem'].id, 'format': 'jsonl', 'location_id': kostueme['lager'].id
+    })
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(line['name'], line['Gewicht'], line['Gereinigt']) for line in lines] == [('Ballkleid', 1.5, True)]
+
+    response = client.get('/api/items/export', headers=auth_headers, query_string={
+        'item_type_id': kostueme['kostuem'].id, 'property_999': 'x'
+    })
+    assert response.status_code == 400
+
+def test_export_can_be_imported_again(client, auth_headers, kostueme):
+    exported = client.get(f"/api/items/export?item_type_id={kostueme['kostuem'].id}", headers=auth_headers)
+    response = client.post('/api/items/import', headers=auth_headers, data={
+        'item_type_id': str(kostueme['kostuem'].id),
+        'file': (io.BytesIO(exported.get_data()), 'export.csv')
+    })
+    assert response.json == {'imported': 2, 'failed': 0, 'errors': []}
+    assert Item.query.filter_by(name='Ballkleid').count() == 2
+
+def test_export_command_applies_filters(app, kostueme, tmp_path, monkeypatch):
+    from export_items import main
+    from search import rebuild_search_index
+    rebuild_search_index()
+    output = tmp_path / 'export.csv'
+    monkeypatch.setattr('sys.argv', ['export_items.py', 'Kostüm', '-o', str(output),
+                                     '-f', f"location_id={kostueme['lager'].id}", '-f', 'search=Ballkleid'])
+    main()
+    rows = list(csv.DictReader(io.StringIO(output.read_text(encoding='utf-8'))))
+    assert [row['name'] for row in rows] == ['Ballkleid']
+
+    monkeypatch.setattr('sys.argv', ['export_items.py', str(kostueme['kostuem'].id), '-o', str(output),
+                                     '-f', 'item_type_id=', '-f', 'search=Gehrock'])
+    main()
+    rows = list(csv.DictReader(io.StringIO(output.read_text(encoding='utf-8'))))
+    assert [row['name'] for row in rows] == ['Gehrock']
@@ -0,0 +1,68 @@
+import pytest
+from datetime import datetime
+from models import db, Item, ItemType, ItemCategory, ItemProperty, ItemPropertyValue, Location, Tag
+
+@pytest.fixture
+def catalogue(app):
+    kostueme = ItemCategory(name='Kostüme')
+    kostuem = ItemType(name='Kostüm', category=kostueme)
+    epoche = ItemProperty(name='Epoche', property_type='text', options=['Barock', 'Rokoko', 'Mittelalter'])
+    gewicht = ItemProperty(name='Gewicht (kg)', property_type='number')
+    reinigung = ItemProperty(name='Letzte Reinigung', property_type='date')
+    kostuem.properties.extend([epoche, gewicht, reinigung])
+    requisite = ItemType(name='Requisite')
+    lager = Location(name='Kostümlager')
+    buehne = Location(name='Bühne')
+    faust = Tag(name='Faust')
+
+    rows = [
+        ('Ballkleid', lager, 'Rokoko', 1.0, datetime(2024, 1, 1)),
+        ('Gehrock', lager, 'Barock', 2.0, datetime(2024, 1, 11)),
+        ('Wams', buehne, 'Barock', 5.0, datetime(2024, 1, 21)),
+    ]
+    for name, location, *values in rows:
+        item = Item(name=name, item_type=kostuem, location=location)
+        for prop, value in zip([epoche, gewicht, reinigung], values):
+            ItemPropertyValue(item=item, property=prop).set_typed_value(value)
+        db.session.add(item)
+        if name != 'Ballkleid':
+            item.tags.append(faust)
+    db.session.add(Item(name='Schwert', item_type=requisite, location=buehne))
+    db.session.commit()
+    return {'kostuem': kostuem, 'epoche': epoche, 'gewicht': gewicht, 'lager': lager, 'faust': faust}
+
+def get_facets(client, headers, **params):
+    response = client.get('/api/items/facets', query_string=params, headers=headers)
+    assert response.status_code == 200, response.json
+    return response.json
+
+def test_facet_counts_for_all_items(client, auth_headers, catalogue):
+    facets = get_facets(client, auth_headers)
+    assert facets['total'] == 4
+    assert {l['name']: l['count'] for l in facets['locations']} == {'Kostümlager': 2, 'Bühne': 2}
+    assert {t['name']: t['count'] for t in facets['item_types']} == {'Kostüm': 3, 'Requisite': 1}
+    assert {c['name']: c['count'] for c in facets['categories']} == {'Kostüme': 3, None: 1}
+    assert facets['tags'] == [{'id': catalogue['faust'].id, 'name': 'Faust', 'count': 2}]
+    assert facets['properties'] == []
+
+def test_property_facets_follow_filters(client, auth_headers, catalogue):
+    facets = get_facets(client, auth_headers, item_type_id=catalogue['kostuem'].id,
+                        location_id=catalogue['lager'].id, buckets=2)
+    assert facets['total'] == 2
+    by_name = {prop['name']: prop for prop in facets['properties']}
+    assert by_name['Epoche']['options'] == [
+        {'value': 'Barock', 'count': 1}, {'value': 'Rokoko', 'count': 1}, {'value': 'Mittelalter', 'count': 0}
+    ]
+    gewicht = by_name['Gewicht (kg)']
+    assert (gewicht['min'], gewicht['max']) == (1.0, 2.0)
+    assert [b['count'] for b in gewicht['buckets']] == [1, 1]
+    reinigung = by_name['Letzte Reinigung']
+    assert reinigung['min'] == int(datetime(2024, 1, 1).timestamp())
+    assert [b['count'] for b in reinigung['buckets']] == [1, 1]
+
+def test_facets_respect_tag_and_property_filters(client, auth_headers, catalogue):
+    facets = get_facets(client, auth_headers, tag_id=catalogue['faust'].id,
+                        item_type_id=catalogue['kostuem'].id,
+                        **{f'property_{catalogue["gewicht"].id}_min': 3})
+    assert facets['total'] == 1
+    assert facets['locations'] == [{'id': facets['locations'][0]['id'], 'name': 'Bühne', 'count': 1}]
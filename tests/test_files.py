@@ -0,0 +1,134 @@
+import io
+import os
+import pytest
+from models import db, Item, ItemType, ItemFile, Blob
+from file_manifest import absolute_storage_path, reconcile_item_files, migrate_item_files, remove_item_file
+
+@pytest.fixture
+def item(app):
+    item_type = ItemType(name='Requisite')
+    item = Item(name='Venezianische Maske', item_type=item_type)
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+def upload(client, headers, item_id, *files):
+    data = {'files[]': [(io.BytesIO(content), name) for name, content in files]}
+    return client.post(f'/api/items/{item_id}/files', data=data, headers=headers,
+                       content_type='multipart/form-data')
+
+def write_legacy_file(relative_path, content):
+    path = absolute_storage_path(relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+def test_upload_records_manifest_and_listing_reads_it(client, auth_headers, item):
+    response = upload(client, auth_headers, item.id, ('plan.pdf', b'%PDF-1.4'), ('plan.pdf', b'%PDF-1.5!'))
+    assert response.status_code == 200
+    names = [f['original_filename'] for f in response.json['files']]
+    assert names == ['plan.pdf', 'plan_1.pdf']
+
+    listed = client.get(f'/api/items/{item.id}/files', headers=auth_headers).json['files']
+    blobs = {blob.size: blob for blob in Blob.query.all()}
+    assert [f['filename'] for f in listed] == [blobs[8].filename, blobs[9].filename]
+    assert listed[0]['filename'] == f'blobs/{blobs[8].sha256[:2]}/{blobs[8].sha256[2:4]}/{blobs[8].sha256}.pdf'
+    assert listed[1]['size'] == 9
+    assert listed[0]['mime_type'] == 'application/pdf'
+
+    detail = client.get(f'/api/items/{item.id}', headers=auth_headers).json
+    assert len(detail['files']) == 2
+
+    response = client.get(f'/api/items/{item.id}/files/plan_1.pdf', headers=auth_headers)
+    assert response.data == b'%PDF-1.5!'
+    assert 'plan_1.pdf' in response.headers['Content-Disposition']
+
+def test_identical_uploads_are_stored_once(client, auth_headers, item):
+    other = Item(name='Zweite Maske', item_type=item.item_type)
+    db.session.add(other)
+    db.session.commit()
+
+    upload(client, auth_headers, item.id, ('plan.pdf', b'%PDF'))
+    upload(client, auth_headers, item.id, ('plan.pdf', b'%PDF'))
+    upload(client, auth_headers, other.id, ('grundriss.pdf', b'%PDF'))
+    assert Blob.query.count() == 1
+    assert ItemFile.query.count() == 2
+    path = absolute_storage_path(Blob.query.one().filename)
+
+    # Shared content stays until its last reference is gone
+    client.delete(f'/api/items/{item.id}/files/plan.pdf', headers=auth_headers)
+    assert os.path.exists(path)
+    client.delete(f'/api/items/{other.id}', headers=auth_headers)
+    assert not os.path.exists(path)
+    assert Blob.query.count() == 0
+
+def test_delete_file_removes_disk_and_manifest(client, auth_headers, item):
+    upload(client, auth_headers, item.id, ('plan.pdf', b'%PDF'))
+    path = absolute_storage_path(ItemFile.query.one().filename)
+    assert os.path.exists(path)
+
+    response = client.delete(f'/api/items/{item.id}/files/plan.pdf', headers=auth_headers)
+    assert response.status_code == 200
+    assert not os.path.exists(path)
+    assert ItemFile.query.count() == 0
+
+def test_image_replacement_keeps_one_entry(client, auth_headers, item):
+    for name, content in (('maske.png', b'png'), ('maske.jpg', b'jpg')):
+        response = client.post(f'/api/items/{item.id}/image', headers=auth_headers,
+                               data={'image': (io.BytesIO(content), name)},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+
+    files = ItemFile.query.filter_by(item_id=item.id).all()
+    assert [f.original_filename for f in files] == [f'{item.id}.jpg']
+    assert files[0].is_image
+    assert [blob.filename for blob in Blob.query.all()] == [files[0].filename]
+
+    # Renaming the type leaves stored files alone
+    item.item_type.name = 'Masken'
+    db.session.commit()
+    assert client.get(f'/api/items/{item.id}/image', headers=auth_headers).data == b'jpg'
+
+def test_reconcile_rebuilds_manifest_from_disk(client, auth_headers, item):
+    write_legacy_file(f'uploads/items/requisite/{item.id}/plan.pdf', b'%PDF')
+    upload(client, auth_headers, item.id, ('notes.doc', b'doc'))
+    os.remove(absolute_storage_path(ItemFile.query.one().filename))
+
+    stats = reconcile_item_files()
+    assert stats == {'added': 1, 'updated': 0, 'removed': 1}
+    assert [f.original_filename for f in ItemFile.query.all()] == ['plan.pdf']
+
+def test_migration_moves_old_layout_into_blob_store(app, item):
+    image = write_legacy_file(f'pictures/items/requisite/{item.id}.jpg', b'image')
+    plan = write_legacy_file(f'uploads/items/requisite/{item.id}/plan.pdf', b'%PDF')
+    copy = write_legacy_file(f'uploads/items/requisite/{item.id}/kopie.pdf', b'%PDF')
+    reconcile_item_files()
+
+    stats = migrate_item_files(batch_size=2)
+    assert stats == {'migrated': 2, 'deduplicated': 1, 'missing': 0}
+    assert not any(os.path.exists(path) for path in (image, plan, copy))
+    assert not os.path.exists(os.path.dirname(plan))
+
+    files = {f.original_filename: f for f in ItemFile.query.all()}
+    assert files['plan.pdf'].blob_sha256 == files['kopie.pdf'].blob_sha256
+    assert files['plan.pdf'].filename.startswith('blobs/')
+    with open(absolute_storage_path(files[f'{item.id}.jpg'].filename), 'rb') as f:
+        assert f.read() == b'image'
+    assert migrate_item_files() == {'migrated': 0, 'deduplicated': 0, 'missing': 0}
+
+def test_files_stay_until_the_removal_commits(client, auth_headers, item):
+    upload(client, auth_headers, item.id, ('plan.pdf', b'%PDF'))
+    item_file = ItemFile.query.one()
+    path = absolute_storage_path(item_file.filename)
+
+    remove_item_file(item_file)
+    db.session.rollback()
+    assert os.path.exists(path)
+    assert ItemFile.query.count() == 1
+
+    remove_item_file(ItemFile.query.one())
+    assert os.path.exists(path)
+    db.session.commit()
+    assert not os.path.exists(path)
+    assert Blob.query.count() == 0
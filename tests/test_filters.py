@@ -0,0 +1,72 @@
+import pytest
+from datetime import datetime
+from models import db, Item, ItemType, ItemProperty, ItemPropertyValue
+
+@pytest.fixture
+def props(app):
+    requisite = ItemType(name='Requisite')
+    material = ItemProperty(name='Material', property_type='text', options=['Holz', 'Metall', 'Stoff'])
+    masse = ItemProperty(name='Maße (cm)', property_type='text')
+    gewicht = ItemProperty(name='Gewicht (kg)', property_type='number')
+    reinigung = ItemProperty(name='Letzte Reinigung', property_type='date')
+    zerbrechlich = ItemProperty(name='Zerbrechlich', property_type='boolean')
+    requisite.properties.extend([material, masse, gewicht, reinigung, zerbrechlich])
+    db.session.add(requisite)
+
+    rows = [
+        ('Kerzenleuchter', 'Metall', '30x30x50', 2.5, datetime(2023, 12, 1, 15, 30), False),
+        ('Maske', 'Stoff', '20x15x10', 0.2, datetime(2023, 11, 15), True),
+        ('Truhe', 'Holz', '90x50x60', 18.0, datetime(2024, 2, 1), False),
+        ('Holzschwert', 'Holz', '100x15x5', 0.8, None, True),
+    ]
+    for name, *values in rows:
+        item = Item(name=name, item_type=requisite)
+        for prop, value in zip([material, masse, gewicht, reinigung, zerbrechlich], values):
+            if value is not None:
+                ItemPropertyValue(item=item, property=prop).set_typed_value(value)
+        db.session.add(item)
+    db.session.commit()
+    return {'material': material, 'masse': masse, 'gewicht': gewicht,
+            'reinigung': reinigung, 'zerbrechlich': zerbrechlich}
+
+def names(client, headers, params):
+    response = client.get('/api/items', query_string=params, headers=headers)
+    assert response.status_code == 200, response.json
+    return sorted(item['name'] for item in response.json)
+
+def test_number_range(client, auth_headers, props):
+    pid = props['gewicht'].id
+    assert names(client, auth_headers, {f'property_{pid}_min': 1}) == ['Kerzenleuchter', 'Truhe']
+    assert names(client, auth_headers, {f'property_{pid}_min': 0.5, f'property_{pid}_max': 2.5}) == \
+        ['Holzschwert', 'Kerzenleuchter']
+
+def test_date_range_includes_whole_max_day(client, auth_headers, props):
+    pid = props['reinigung'].id
+    params = {f'property_{pid}_min': '2023-11-20', f'property_{pid}_max': '2023-12-01'}
+    assert names(client, auth_headers, params) == ['Kerzenleuchter']
+    assert names(client, auth_headers, {f'property_{pid}': '2023-11-15'}) == ['Maske']
+
+def test_boolean_and_option_filters_combine(client, auth_headers, props):
+    params = {f'property_{props["zerbrechlich"].id}': 'true', f'property_{props["material"].id}': 'Holz'}
+    assert names(client, auth_headers, params) == ['Holzschwert']
+
+def test_option_filter_is_exact_and_repeatable(client, auth_headers, props):
+    pid = props['material'].id
+    assert names(client, auth_headers, {f'property_{pid}': 'Hol'}) == []
+    query = f'property_{pid}=Holz&property_{pid}=Metall'
+    response = client.get(f'/api/items?{query}', headers=auth_headers)
+    assert sorted(item['name'] for item in response.json) == ['Holzschwert', 'Kerzenleuchter', 'Truhe']
+
+def test_free_text_filter_matches_substring(client, auth_headers, props):
+    assert names(client, auth_headers, {f'property_{props["masse"].id}': 'x15x'}) == ['Holzschwert', 'Maske']
+
+@pytest.mark.parametrize('params', [
+    {'property_999': 'x'},
+    {'property_{gewicht}': 'schwer'},
+    {'property_{zerbrechlich}_min': '1'},
+])
+def test_invalid_filters_are_rejected(client, auth_headers, props, params):
+    params = {key.format(gewicht=props['gewicht'].id, zerbrechlich=props['zerbrechlich'].id): value
+              for key, value in params.items()}
+    response = client.get('/api/items', query_string=params, headers=auth_headers)
+    assert response.status_code == 400
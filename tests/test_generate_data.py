@@ -0,0 +1,61 @@
+from sqlalchemy import select, func
+from models import db, Item, Location, ItemFile, location_closure, item_subitems, item_links
+from location_tree import rebuild_location_tree
+from kits import CYCLE_STATEMENT
+from generate_data import generate_inventory
+from benchmark import percentile, run_benchmarks, compare
+
+def count(table):
+    return db.session.scalar(select(func.count()).select_from(table))
+
+def test_generated_inventory_is_consistent(client, auth_headers):
+    stats = generate_inventory(300, seed=7, placeholders=2, kit_ratio=0.1, link_ratio=0.2)
+    assert count(Item) == stats['items'] == 300
+    assert count(item_subitems) == stats['subitems'] > 0
+    assert count(item_links) == stats['links'] > 0
+    assert count(ItemFile) == stats['files'] > 0
+
+    # The closure table and paths are complete, a rebuild changes nothing
+    maintained = set(db.session.execute(select(location_closure)).all())
+    rebuild_location_tree()
+    assert set(db.session.execute(select(location_closure)).all()) == maintained
+    assert all(location.path and location.path[-1] == location.name for location in Location.query)
+
+    # Kits never contain themselves
+    for parent_id, child_id in db.session.execute(select(item_subitems)).all():
+        assert not db.session.execute(CYCLE_STATEMENT, {'child_id': child_id, 'parent_id': parent_id}).first()
+
+    word = Item.query.first().name.split()[0]
+    response = client.get(f'/api/items?search={word}', headers=auth_headers)
+    assert response.status_code == 200 and response.json
+
+def test_same_seed_gives_same_names(app):
+    generate_inventory(50, seed=3, placeholders=0)
+    names = [name for name, in db.session.execute(select(Item.name).order_by(Item.id))]
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    generate_inventory(50, seed=3, placeholders=0)
+    assert [name for name, in db.session.execute(select(Item.name).order_by(Item.id))] == names
+
+def test_benchmarks_report_percentiles_and_queries(app):
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile([1, 2, 3, 4], 99) == 4
+    generate_inventory(100, seed=1, placeholders=0)
+
+    results = run_benchmarks(app, iterations=3, warmup=1, only=['item_detail', 'scan', 'kit'])
+    assert set(results) == {'item_detail', 'scan', 'kit'}
+    for summary in results.values():
+        assert summary['requests'] == 3 and summary['errors'] == 0
+        assert summary['p50_ms'] <= summary['p99_ms'] <= summary['max_ms']
+        assert summary['queries_max'] >= 1
+
+    slower = {name: {**summary, 'queries_mean': summary['queries_mean'] + 1} for name, summary in results.items()}
+    assert compare({'benchmarks': results}, {'benchmarks': slower}, tolerance=0.25) == list(results)
+
+def test_generating_again_adds_to_the_inventory(app):
+    generate_inventory(50, seed=3, placeholders=0)
+    locations = count(Location)
+    generate_inventory(50, seed=3, placeholders=0)
+    assert count(Item) == 100
+    assert count(Location) == 2 * locations
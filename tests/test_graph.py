@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
+from models import db, Item, ItemType, item_links
+from graph import link_graph
+
+@pytest.fixture
+def faust(app):
+    """Two productions: Mantel - Degen - Schädel - Pudel, Schädel - Buch, and Krone - Zepter"""
+    requisite = ItemType(name='Requisite')
+    items = {name: Item(name=name, item_type=requisite)
+             for name in ('Mantel', 'Degen', 'Schädel', 'Pudel', 'Buch', 'Krone', 'Zepter', 'Stuhl')}
+    db.session.add_all(items.values())
+    db.session.commit()
+    # Links have no direction, the stored order must not matter
+    db.session.execute(insert(item_links), [
+        {'item_a_id': items[a].id, 'item_b_id': items[b].id}
+        for a, b in [('Mantel', 'Degen'), ('Schädel', 'Degen'), ('Schädel', 'Pudel'), ('Buch', 'Schädel'),
+                     ('Krone', 'Zepter')]
+    ])
+    db.session.commit()
+    link_graph.invalidate()
+    return items
+
+def names(response):
+    return [(item['name'], item['distance']) for item in response.json['items']]
+
+def test_neighbours_hops_and_components(client, auth_headers, faust):
+    schaedel = faust['Schädel'].id
+    response = client.get(f'/api/items/{schaedel}/links', headers=auth_headers)
+    assert response.status_code == 200
+    assert names(response) == [('Buch', 1), ('Degen', 1), ('Pudel', 1)]
+    response = client.get(f"/api/items/{faust['Mantel'].id}/links?hops=2", headers=auth_headers)
+    assert names(response) == [('Degen', 1), ('Schädel', 2)]
+
+    response = client.get(f"/api/items/{faust['Pudel'].id}/component", headers=auth_headers)
+    assert response.json['size'] == 5
+    assert response.json['links'] == 4
+    assert {item['name'] for item in response.json['items']} == {'Mantel', 'Degen', 'Schädel', 'Pudel', 'Buch'}
+
+    # The other items of the component come from the cache, without a query for the graph
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        assert link_graph.neighbourhood(faust['Buch'].id, None).keys() == \
+            {faust[name].id for name in ('Mantel', 'Degen', 'Schädel', 'Pudel')}
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+    assert not [statement for statement in statements if 'item_links' in statement]
+
+    response = client.get(f"/api/items/{faust['Stuhl'].id}/component", headers=auth_headers)
+    assert (response.json['size'], response.json['items'][0]['name']) == (1, 'Stuhl')
+    assert client.get(f'/api/items/{schaedel}/links?hops=0', headers=auth_headers).status_code == 400
+    assert client.get('/api/items/unknown/component', headers=auth_headers).status_code == 404
+
+def test_link_writes_invalidate_the_cache(client, auth_headers, faust):
+    pudel, krone = faust['Pudel'].id, faust['Krone'].id
+    assert client.get(f'/api/items/{pudel}/component', headers=auth_headers).json['size'] == 5
+
+    assert client.post(f'/api/items/{krone}/links', headers=auth_headers, json={'item_id': pudel}).status_code == 201
+    assert client.post(f'/api/items/{pudel}/links', headers=auth_headers, json={'item_id': krone}).status_code == 409
+    assert client.post(f'/api/items/{pudel}/links', headers=auth_headers, json={'item_id': pudel}).status_code == 400
+    assert client.get(f'/api/items/{pudel}/component', headers=auth_headers).json['size'] == 7
+
+    assert client.delete(f'/api/items/{pudel}/links/{krone}', headers=auth_headers).status_code == 200
+    assert client.get(f'/api/items/{krone}/component', headers=auth_headers).json['size'] == 2
+
+    # Deleting an item drops its links and splits the component
+    assert client.delete(f"/api/items/{faust['Schädel'].id}", headers=auth_headers).status_code == 200
+    assert client.get(f'/api/items/{pudel}/component', headers=auth_headers).json['size'] == 1
+    assert client.get(f"/api/items/{faust['Mantel'].id}/links", headers=auth_headers).json['count'] == 1
@@ -0,0 +1,96 @@
+import io
+import pytest
+from datetime import datetime
+from models import db, Item, ItemType, ItemProperty, ItemPropertyValue, Location, Tag
+
+@pytest.fixture
+def kostuem(app):
+    item_type = ItemType(name='Kostüm')
+    item_type.properties.extend([
+        ItemProperty(name='Epoche', property_type='text', options=['Barock', 'Rokoko'], required=True),
+        ItemProperty(name='Gewicht', property_type='number'),
+        ItemProperty(name='Gereinigt', property_type='boolean'),
+        ItemProperty(name='Angeschafft', property_type='date'),
+    ])
+    db.session.add_all([item_type, Location(name='Kostümlager'), Tag(name='Faust')])
+    db.session.commit()
+    return item_type
+
+def test_json_import_reports_row_errors(client, auth_headers, kostuem, monkeypatch):
+    monkeypatch.setitem(client.application.config, 'ITEMS_IMPORT_CHUNK_SIZE', 2)
+    gewicht = next(prop for prop in kostuem.properties if prop.name == 'Gewicht')
+    rows = [
+        {'name': 'Ballkleid', 'location': 'Kostümlager', 'tags': ['Faust'],
+         'properties': {'Epoche': 'Rokoko', 'Gereinigt': 'nein'}},
+        {'name': 'Gehrock', 'property_values': [{'property_id': gewicht.id, 'value': 2.5}],
+         'properties': {'Epoche': 'Barock'}},
+        {'name': 'Wams', 'properties': {'Epoche': 'Gotik', 'Gewicht': 'schwer'}},
+        {'properties': {'Epoche': 'Barock'}},
+        {'name': 'Mantel', 'properties': {'Epoche': 'Barock', 'Angeschafft': '2023-05-01'}},
+    ]
+    response = client.post(f'/api/items/import?item_type_id={kostuem.id}', json=rows, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json['imported'] == 3
+    assert response.json['failed'] == 2
+    errors = {error['row']: error['errors'] for error in response.json['errors']}
+    assert set(errors) == {3, 4}
+    assert len(errors[3]) == 2
+    assert errors[4] == ['Name is required']
+
+    ballkleid = Item.query.filter_by(name='Ballkleid').one()
+    assert ballkleid.location.name == 'Kostümlager'
+    assert [tag.name for tag in ballkleid.tags] == ['Faust']
+    values = {value.property.name: value.get_typed_value() for value in ballkleid.property_values}
+    assert values == {'Epoche': 'Rokoko', 'Gereinigt': False}
+    mantel = Item.query.filter_by(name='Mantel').one()
+    assert datetime(2023, 5, 1) in [value.value_date for value in mantel.property_values]
+
+    # Imported items are searchable right away
+    found = client.get('/api/items?search=gehrock', headers=auth_headers).json
+    assert [item['name'] for item in found] == ['Gehrock']
+
+def test_csv_import(client, auth_headers, kostuem):
+    data = 'name;location;tags;Epoche;Gewicht\nBallkleid;Kostümlager;Faust;Rokoko;1,5\nGehrock;;;Barock;2\n'
+    response = client.post('/api/items/import', headers=auth_headers, data={
+        'item_type_id': str(kostuem.id),
+        'file': (io.BytesIO(data.encode('utf-8-sig')), 'kostueme.csv')
+    })
+    assert response.json['imported'] == 1
+    assert response.json['errors'][0]['row'] == 1
+    assert ItemPropertyValue.query.filter_by(value_number=2.0).count() == 1
+
+def test_import_requires_item_type(client, auth_headers, kostuem):
+    response = client.post('/api/items/import', json=[{'name': 'Ballkleid'}], headers=auth_headers)
+    assert response.status_code == 400
+    response = client.post('/api/items/import', json={'item_type_id': kostuem.id, 'items': [{'name': 'Wams'}]},
+                           headers=auth_headers)
+    assert response.status_code == 400
+    assert response.json['errors'][0]['errors'] == ['Epoche is required']
+
+def test_malformed_property_containers_are_row_errors(client, auth_headers, kostuem):
+    rows = [
+        {'name': 'Ballkleid', 'properties': ['Rokoko']},
+        {'name': 'Gehrock', 'properties': {'Epoche': 'Barock'}, 'property_values': {'Gewicht': 2}},
+        {'name': 'Wams', 'properties': {'Epoche': 'Barock'}, 'property_values': ['2', {'property_id': [1]}]},
+        {'name': 'Mantel', 'properties': {'Epoche': 'Barock'}},
+    ]
+    response = client.post(f'/api/items/import?item_type_id={kostuem.id}', json=rows, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json['imported'] == 1
+    errors = {error['row']: error['errors'] for error in response.json['errors']}
+    assert errors[1] == ['properties must be an object', 'Epoche is required']
+    assert errors[2] == ['property_values must be a list']
+    assert errors[3] == ['property_values entries must be objects', 'Unknown property: [1]']
+
+def test_non_scalar_fields_are_row_errors(client, auth_headers, kostuem):
+    rows = [
+        {'name': 'Ballkleid', 'location_id': ['x'], 'properties': {'Epoche': 'Rokoko'}},
+        {'name': ['Gehrock'], 'location': {'name': 'Kostümlager'}, 'properties': {'Epoche': 'Barock'}},
+        {'name': 'Mantel', 'location': 'Kostümlager', 'properties': {'Epoche': 'Barock'}},
+    ]
+    response = client.post(f'/api/items/import?item_type_id={kostuem.id}', json=rows, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json['imported'] == 1
+    errors = {error['row']: error['errors'] for error in response.json['errors']}
+    assert errors[1] == ['location_id must be a string or number']
+    assert errors[2] == ['name must be a string or number', 'Name is required', 'location must be a string or number']
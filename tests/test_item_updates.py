@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models import db, Item, ItemType, ItemProperty, ItemPropertyValue
+
+@pytest.fixture
+def ballkleid(app):
+    kostuem = ItemType(name='Kostüm')
+    epoche = ItemProperty(name='Epoche', property_type='text')
+    gewicht = ItemProperty(name='Gewicht', property_type='number')
+    gereinigt = ItemProperty(name='Gereinigt', property_type='boolean')
+    kostuem.properties.extend([epoche, gewicht, gereinigt])
+    item = Item(name='Ballkleid', item_type=kostuem)
+    ItemPropertyValue(item=item, property=epoche).set_typed_value('Rokoko')
+    ItemPropertyValue(item=item, property=gewicht).set_typed_value(1.5)
+    db.session.add(item)
+    db.session.commit()
+    return {'item': item, 'epoche': epoche, 'gewicht': gewicht, 'gereinigt': gereinigt}
+
+def value_rows(item_id):
+    db.session.expire_all()
+    return {value.property.name: (value.id, value.get_typed_value())
+            for value in ItemPropertyValue.query.filter_by(item_id=item_id)}
+
+def test_put_updates_only_changed_values(client, auth_headers, ballkleid):
+    item_id = ballkleid['item'].id
+    before = value_rows(item_id)
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith(('INSERT INTO item_property_values', 'UPDATE item_property_values',
+                                 'DELETE FROM item_property_values')):
+            statements.append(statement.split(' (')[0].split(' SET')[0])
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        response = client.put(f'/api/items/{item_id}', headers=auth_headers, json={
+            'name': 'Ballkleid',
+            'property_values': [
+                {'property_id': ballkleid['epoche'].id, 'value': 'Rokoko'},
+                {'property_id': ballkleid['gewicht'].id, 'value': 2},
+            ]
+        })
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    assert statements == ['UPDATE item_property_values']
+
+    after = value_rows(item_id)
+    assert after['Epoche'] == before['Epoche']
+    assert after['Gewicht'] == (before['Gewicht'][0], 2.0)
+
+def test_put_drops_missing_values_and_patch_keeps_them(client, auth_headers, ballkleid):
+    item_id = ballkleid['item'].id
+    epoche_id = value_rows(item_id)['Epoche'][0]
+
+    response = client.patch(f'/api/items/{item_id}', headers=auth_headers, json={
+        'property_values': {str(ballkleid['gereinigt'].id): 'ja', str(ballkleid['gewicht'].id): None}
+    })
+    assert response.status_code == 200
+    assert {name: value for name, (_, value) in value_rows(item_id).items()} == \
+        {'Epoche': 'Rokoko', 'Gereinigt': True}
+    assert value_rows(item_id)['Epoche'][0] == epoche_id
+
+    response = client.put(f'/api/items/{item_id}', headers=auth_headers, json={
+        'property_values': [{'property_id': ballkleid['epoche'].id, 'value': 'Barock'}]
+    })
+    assert response.status_code == 200
+    assert value_rows(item_id) == {'Epoche': (epoche_id, 'Barock')}
+
+def test_invalid_value_is_rejected(client, auth_headers, ballkleid):
+    item_id = ballkleid['item'].id
+    response = client.patch(f'/api/items/{item_id}', headers=auth_headers, json={
+        'name': 'Umbenannt',
+        'property_values': [{'property_id': ballkleid['gewicht'].id, 'value': 'schwer'}]
+    })
+    assert response.status_code == 400
+    db.session.expire_all()
+    assert db.session.get(Item, item_id).name == 'Ballkleid'
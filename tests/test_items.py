@@ -0,0 +1,108 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models import db, Item, ItemType, ItemProperty, ItemPropertyValue, Location
+
+@pytest.fixture
+def inventory(app):
+    location = Location(name='Kostümlager')
+    item_type = ItemType(name='Historisches Kostüm')
+    item_type.properties.extend([
+        ItemProperty(name='Epoche', property_type='text'),
+        ItemProperty(name='Gewicht (kg)', property_type='number'),
+    ])
+    db.session.add_all([location, item_type])
+    db.session.flush()
+
+    start = datetime(2024, 1, 1)
+    items = []
+    for i in range(25):
+        item = Item(name=f'Kostüm {i}', location=location, item_type=item_type,
+                    created_at=start + timedelta(minutes=i // 2))
+        for prop, value in zip(item_type.properties, ['Barock', i]):
+            value_row = ItemPropertyValue(item=item, property=prop)
+            value_row.set_typed_value(value)
+        items.append(item)
+    db.session.add_all(items)
+    db.session.commit()
+    return {'location': location, 'item_type': item_type, 'items': items}
+
+def test_items_list_without_limit_returns_all(client, auth_headers, inventory):
+    response = client.get('/api/items', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.json) == 25
+
+def test_items_keyset_pagination_visits_every_item_once(client, auth_headers, inventory):
+    seen = []
+    cursor = None
+    while True:
+        params = {'limit': 7}
+        if cursor:
+            params['cursor'] = cursor
+        response = client.get('/api/items', query_string=params, headers=auth_headers)
+        assert response.status_code == 200
+        page = response.json
+        assert len(page['items']) <= 7
+        seen.extend(entry['id'] for entry in page['items'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    assert len(seen) == 25
+    assert set(seen) == {item.id for item in inventory['items']}
+
+def test_items_invalid_cursor(client, auth_headers, inventory):
+    response = client.get('/api/items?cursor=not-a-cursor', headers=auth_headers)
+    assert response.status_code == 400
+
+def test_items_ndjson_stream(client, auth_headers, inventory):
+    response = client.get('/api/items?format=ndjson', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) == 25
+    assert lines[0]['property_values'][0]['value'] == 'Barock'
+
+def count_queries(app, fn):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = Engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements)
+
+def test_item_list_query_count_independent_of_page_size(app, client, auth_headers, inventory):
+    def fetch(limit):
+        db.session.expunge_all()
+        response = client.get(f'/api/items?limit={limit}', headers=auth_headers)
+        assert response.status_code == 200
+        assert len(response.json['items']) == limit
+
+    small = count_queries(app, lambda: fetch(2))
+    large = count_queries(app, lambda: fetch(20))
+    assert small == large
+
+def test_item_detail_and_create_share_serializer(client, auth_headers, inventory):
+    item = inventory['items'][0]
+    detail = client.get(f'/api/items/{item.id}', headers=auth_headers).json
+    assert detail['item_type']['normalized_name'] == 'historisches_kostuem'
+    assert [v['property_name'] for v in detail['property_values']] == ['Epoche', 'Gewicht (kg)']
+
+    prop = inventory['item_type'].properties[1]
+    response = client.post('/api/items', headers=auth_headers, json={
+        'name': 'Neues Kostüm',
+        'item_type_id': inventory['item_type'].id,
+        'property_values': [{'property_id': prop.id, 'value': '2.5'}]
+    })
+    assert response.status_code == 201
+    created = response.json
+    assert set(created) == set(detail)
+    assert created['property_values'][0]['value'] == 2.5
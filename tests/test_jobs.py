@@ -0,0 +1,102 @@
+import io
+import os
+import socket
+import subprocess
+import sys
+from datetime import datetime, timedelta
+import pytest
+from PIL import Image
+from models import db, Item, ItemType, ItemFile, Job
+from file_manifest import absolute_storage_path
+from thumbnails import thumbnail_path
+from jobs import job_queue, WORKER
+
+@pytest.fixture
+def item(app):
+    item = Item(name='Degen', item_type=ItemType(name='Waffe'))
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+def jpeg_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (900, 600), 'green').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+def test_upload_returns_jobs_that_render_thumbnails(client, auth_headers, item):
+    response = client.post(f'/api/items/{item.id}/files', headers=auth_headers, content_type='multipart/form-data',
+                           data={'files[]': [(io.BytesIO(jpeg_bytes()), 'degen.jpg'),
+                                             (io.BytesIO(b'%PDF-1.4'), 'anleitung.pdf')]})
+    assert response.status_code == 200
+    jobs = response.json['jobs']
+    assert [job['kind'] for job in jobs] == ['process_file', 'process_file']
+    assert job_queue.join(timeout=30)
+
+    response = client.get(f'/api/items/{item.id}/jobs', headers=auth_headers)
+    states = {entry['original_filename']: entry['status'] for entry in response.json['files']}
+    assert states == {'degen.jpg': 'done', 'anleitung.pdf': 'done'}
+
+    response = client.get(f"/api/jobs/{jobs[0]['id']}", headers=auth_headers)
+    assert response.json['status'] == 'done'
+    assert response.json['attempts'] == 1
+    original = absolute_storage_path(ItemFile.query.filter_by(original_filename='degen.jpg').one().filename)
+    assert os.path.exists(thumbnail_path(original, 128, 'webp'))
+
+def test_failed_job_reports_error(client, auth_headers, item):
+    response = client.post(f'/api/items/{item.id}/files', headers=auth_headers, content_type='multipart/form-data',
+                           data={'files[]': [(io.BytesIO(b'not an image'), 'kaputt.jpg')]})
+    assert response.status_code == 200
+    assert job_queue.join(timeout=30)
+
+    response = client.get(f"/api/jobs/{response.json['jobs'][0]['id']}", headers=auth_headers)
+    assert response.json['status'] == 'failed'
+    assert response.json['error']
+    assert ItemFile.query.filter_by(item_id=item.id).count() == 1
+
+def test_recover_requeues_interrupted_jobs(app, item):
+    item_file = ItemFile(item_id=item.id, filename='blobs/ab/cd/notiz.pdf',
+                         original_filename='notiz.pdf', is_image=False)
+    db.session.add(item_file)
+    db.session.flush()
+    long_ago = datetime.utcnow() - timedelta(hours=1)
+    queued = Job(kind='process_file', item_id=item.id, item_file_id=item_file.id)
+    lost = Job(kind='process_file', item_id=item.id, item_file_id=item_file.id, status='running', started_at=long_ago)
+    busy = Job(kind='process_file', item_id=item.id, item_file_id=item_file.id,
+               status='running', started_at=datetime.utcnow())
+    db.session.add_all([queued, lost, busy])
+    db.session.commit()
+
+    job_queue.recover()
+    assert job_queue.join(timeout=30)
+    db.session.expire_all()
+    assert [queued.status, lost.status, busy.status] == ['done', 'done', 'running']
+
+def test_recover_requeues_jobs_of_dead_processes_right_away(app, item):
+    item_file = ItemFile(item_id=item.id, filename='blobs/ab/cd/notiz.pdf',
+                         original_filename='notiz.pdf', is_image=False)
+    db.session.add(item_file)
+    db.session.flush()
+    finished = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                              capture_output=True, text=True, check=True)
+    host, pid = socket.gethostname(), os.getpid()
+    dead = Job(kind='process_file', item_id=item.id, item_file_id=item_file.id, status='running',
+               started_at=datetime.utcnow(), worker=f'{host}:{finished.stdout.strip()}:0000')
+    # A restarted server may get the pid of its predecessor back
+    restarted = Job(kind='process_file', item_id=item.id, item_file_id=item_file.id, status='running',
+                    started_at=datetime.utcnow(), worker=f'{host}:{pid}:0000')
+    alive = Job(kind='process_file', item_id=item.id, item_file_id=item_file.id, status='running',
+                started_at=datetime.utcnow(), worker=WORKER)
+    db.session.add_all([dead, restarted, alive])
+    db.session.commit()
+
+    job_queue.recover()
+    assert job_queue.join(timeout=30)
+    db.session.expire_all()
+    assert [dead.status, restarted.status, alive.status] == ['done', 'done', 'running']
+
+def test_rolled_back_jobs_are_not_started(app, item):
+    job_queue.enqueue('process_file', item_id=item.id)
+    db.session.rollback()
+    db.session.commit()
+    assert job_queue.join(timeout=30)
+    assert Job.query.count() == 0
@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
+from models import db, Item, ItemType, Location, item_subitems
+
+@pytest.fixture
+def costume(app):
+    """Kostüm > (Hut, Mantel > (Knopf, Gürtel), Stiefel)"""
+    kostuem = ItemType(name='Kostüm')
+    zubehoer = ItemType(name='Zubehör')
+    fundus = Location(name='Fundus')
+    items = {name: Item(name=name, item_type=kostuem if name in ('Kostüm', 'Mantel') else zubehoer,
+                        location=fundus)
+             for name in ('Kostüm', 'Hut', 'Mantel', 'Knopf', 'Gürtel', 'Stiefel')}
+    db.session.add_all(items.values())
+    db.session.commit()
+    db.session.execute(insert(item_subitems), [
+        {'parent_id': items[parent].id, 'child_id': items[child].id}
+        for parent, child in [('Kostüm', 'Hut'), ('Kostüm', 'Mantel'), ('Kostüm', 'Stiefel'),
+                              ('Mantel', 'Knopf'), ('Mantel', 'Gürtel')]
+    ])
+    db.session.commit()
+    return items
+
+def test_kit_expands_in_one_query(client, auth_headers, costume):
+    kit_url = f"/api/items/{costume['Kostüm'].id}/kit"
+    client.get(kit_url, headers=auth_headers)
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(kit_url, headers=auth_headers)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    assert len([statement for statement in statements if 'RECURSIVE' in statement]) == 1
+    assert not [statement for statement in statements if 'item_subitems' in statement and 'RECURSIVE' not in statement]
+
+    kit = response.json
+    assert kit['name'] == 'Kostüm'
+    assert [(piece['name'], piece['depth'], piece['is_kit']) for piece in kit['pieces']] == [
+        ('Hut', 1, False), ('Mantel', 1, True), ('Gürtel', 2, False), ('Knopf', 2, False), ('Stiefel', 1, False)
+    ]
+    assert kit['pieces'][2]['parent_id'] == costume['Mantel'].id
+    assert kit['pieces'][0]['location_path'] == ['Fundus']
+    assert kit['counts'] == {'pieces': 5, 'kits': 1, 'loose': 4, 'max_depth': 2,
+                             'by_type': {'Zubehör': 4, 'Kostüm': 1},
+                             'by_location': {costume['Hut'].location_id: 5}}
+
+    assert client.get('/api/items/unknown/kit', headers=auth_headers).status_code == 404
+
+def test_subitems_reject_cycles(client, auth_headers, costume):
+    mantel, knopf = costume['Mantel'].id, costume['Knopf'].id
+    for parent, child in [(knopf, costume['Kostüm'].id), (knopf, mantel), (mantel, mantel)]:
+        response = client.post(f'/api/items/{parent}/subitems', headers=auth_headers, json={'subitem_id': child})
+        assert response.status_code == 400
+    assert client.post(f'/api/items/{mantel}/subitems', headers=auth_headers,
+                       json={'subitem_id': knopf}).status_code == 409
+
+    # Shared pieces are fine as long as nothing contains itself
+    hut = costume['Hut'].id
+    assert client.post(f'/api/items/{mantel}/subitems', headers=auth_headers,
+                       json={'subitem_id': hut}).status_code == 201
+    kit = client.get(f"/api/items/{costume['Kostüm'].id}/kit", headers=auth_headers).json
+    assert [piece['name'] for piece in kit['pieces']].count('Hut') == 1
+
+    assert client.delete(f'/api/items/{mantel}/subitems/{hut}', headers=auth_headers).status_code == 200
+    assert client.delete(f'/api/items/{mantel}/subitems/{hut}', headers=auth_headers).status_code == 404
@@ -0,0 +1,66 @@
+import io
+import re
+import pytest
+from PIL import Image
+from models import db, Item, ItemType, Location
+
+@pytest.fixture
+def stock(app):
+    fundus = Location(name='Fundus')
+    kostuem = ItemType(name='Kostüm')
+    items = [Item(name=f'Kleid {number}', item_type=kostuem, location=fundus) for number in range(30)]
+    db.session.add_all(items)
+    db.session.commit()
+    return {'location': fundus, 'items': items}
+
+def pdf_pages(data):
+    """Page count of a PDF, after checking its cross-reference table points at the objects"""
+    assert data.startswith(b'%PDF-')
+    xref = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', data).group(1))
+    entries = re.findall(rb'(\d{10}) 00000 n ', data[xref:])
+    for number, offset in enumerate(entries, start=1):
+        assert data[int(offset):].startswith(b'%d 0 obj' % number)
+    return int(re.search(rb'/Count (\d+)', data).group(1))
+
+def test_item_and_location_qr_codes(client, auth_headers, stock):
+    item_id = stock['items'][0].id
+    response = client.get(f'/api/items/{item_id}/qr', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert Image.open(io.BytesIO(response.data)).size == (256, 256)
+
+    cached = client.get(f'/api/items/{item_id}/qr', headers={**auth_headers, 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+    response = client.get(f"/api/locations/{stock['location'].id}/qr?size=128", headers=auth_headers)
+    image = Image.open(io.BytesIO(response.data))
+    assert image.size == (128, 128)
+    assert image.convert('L').getpixel((64, 64)) in (0, 255)
+
+    response = client.get(f'/api/items/{item_id}/qr?format=svg', headers=auth_headers)
+    assert response.mimetype == 'image/svg+xml'
+    assert b'<svg width="256" height="256"' in response.data
+    response = client.get(f'/api/items/{item_id}/qr?format=svg&size=512', headers=auth_headers)
+    assert b'<svg width="512" height="512"' in response.data and b'viewBox=' in response.data
+
+    assert client.get('/api/items/unknown/qr', headers=auth_headers).status_code == 404
+    assert client.get(f'/api/items/{item_id}/qr?size=5', headers=auth_headers).status_code == 400
+
+def test_label_sheets_for_ids_and_filters(client, auth_headers, stock):
+    ids = [item.id for item in stock['items']]
+    response = client.post('/api/labels', headers=auth_headers, json={'ids': ids})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert pdf_pages(response.data) == 2
+
+    response = client.post('/api/labels', headers=auth_headers,
+                           json={'filter': {'location_id': stock['location'].id}, 'columns': 2, 'rows': 5})
+    assert pdf_pages(response.data) == 3
+
+    response = client.post('/api/labels', headers=auth_headers, json={'kind': 'location', 'ids': [stock['location'].id]})
+    assert pdf_pages(response.data) == 1
+
+    assert client.post('/api/labels', headers=auth_headers, json={'ids': ['unknown']}).status_code == 404
+    assert client.post('/api/labels', headers=auth_headers, json={'ids': ids, 'rows': 40}).status_code == 400
+    assert client.post('/api/labels', headers=auth_headers,
+                       json={'kind': 'location', 'filter': {}}).status_code == 400
@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import select
+from models import db, Item, ItemType, Location, location_closure
+from location_tree import rebuild_location_tree
+
+@pytest.fixture
+def tree(app):
+    """Theater > Fundus > (Regal > Kiste, Keller)"""
+    theater = Location(name='Theater')
+    fundus = Location(name='Fundus', parent=theater)
+    regal = Location(name='Regal', parent=fundus)
+    kiste = Location(name='Kiste', parent=regal)
+    keller = Location(name='Keller', parent=fundus)
+    requisite = ItemType(name='Requisite')
+    db.session.add_all([
+        Item(name='Krone', item_type=requisite, location=kiste),
+        Item(name='Zepter', item_type=requisite, location=regal),
+        Item(name='Fass', item_type=requisite, location=keller),
+        Item(name='Vorhang', item_type=requisite, location=theater),
+    ])
+    db.session.commit()
+    return {location.name: location for location in (theater, fundus, regal, kiste, keller)}
+
+def closure_rows():
+    return set(db.session.execute(select(location_closure)).all())
+
+def item_names(client, auth_headers, query):
+    response = client.get(f'/api/items?{query}', headers=auth_headers)
+    assert response.status_code == 200
+    return sorted(item['name'] for item in response.json)
+
+def test_subtree_filter_and_rolled_up_counts(client, auth_headers, tree):
+    fundus = tree['Fundus'].id
+    assert item_names(client, auth_headers, f'location_id={fundus}') == []
+    assert item_names(client, auth_headers, f'location_id={fundus}&include_descendants=1') == ['Fass', 'Krone', 'Zepter']
+    assert item_names(client, auth_headers, f"location_id={tree['Regal'].id}&include_descendants=true") == \
+        ['Krone', 'Zepter']
+
+    counts = client.get('/api/locations/counts', headers=auth_headers).json
+    assert counts[tree['Theater'].id] == {'items': 1, 'total_items': 4}
+    assert counts[fundus] == {'items': 0, 'total_items': 3}
+    assert counts[tree['Kiste'].id] == {'items': 1, 'total_items': 1}
+
+    locations = {location['name']: location for location in
+                 client.get('/api/locations', headers=auth_headers).json}
+    assert locations['Kiste']['path'] == ['Theater', 'Fundus', 'Regal', 'Kiste']
+
+def test_moves_renames_and_deletes_keep_the_tree(client, auth_headers, tree):
+    regal, keller = tree['Regal'].id, tree['Keller'].id
+    response = client.put(f'/api/locations/{regal}', headers=auth_headers, json={'parent_id': keller})
+    assert response.status_code == 200
+    response = client.put(f"/api/locations/{tree['Theater'].id}", headers=auth_headers, json={'name': 'Oper'})
+    assert response.status_code == 200
+    assert client.get(f"/api/locations/{tree['Kiste'].id}", headers=auth_headers).json['path'] == \
+        ['Oper', 'Fundus', 'Keller', 'Regal', 'Kiste']
+    assert item_names(client, auth_headers, f'location_id={keller}&include_descendants=1') == \
+        ['Fass', 'Krone', 'Zepter']
+
+    # A location cannot end up below itself
+    response = client.put(f"/api/locations/{tree['Fundus'].id}", headers=auth_headers, json={'parent_id': regal})
+    assert response.status_code == 400
+    response = client.post('/api/locations', headers=auth_headers, json={'name': 'Lose', 'parent_id': 'unknown'})
+    assert response.status_code == 400
+
+    assert client.delete(f'/api/locations/{keller}', headers=auth_headers).status_code == 200
+    assert client.get(f'/api/locations/{regal}', headers=auth_headers).json['path'] == ['Oper', 'Fundus', 'Regal']
+
+    # Incremental maintenance ends where a full rebuild does
+    maintained = closure_rows()
+    rebuild_location_tree()
+    assert closure_rows() == maintained
@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models import db, Item, ItemType, ItemFile, Location
+
+@pytest.fixture
+def stage(app):
+    haus = Location(name='Theater')
+    db.session.add(haus)
+    db.session.flush()
+    fundus = Location(name='Fundus', parent_id=haus.id)
+    krone = Item(name='Krone', item_type=ItemType(name='Requisite'), location=fundus)
+    db.session.add(krone)
+    db.session.flush()
+    db.session.add(ItemFile(item_id=krone.id, filename='blobs/ab/cd/abcd.jpg', original_filename=f'{krone.id}.jpg',
+                            is_image=True))
+    db.session.commit()
+    return {'haus': haus, 'fundus': fundus, 'krone': krone}
+
+def test_scan_resolves_items_and_locations(client, auth_headers, stage):
+    krone = stage['krone']
+    response = client.get(f'/api/scan/item:{krone.id}', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json == {
+        'code': f'item:{krone.id}',
+        'found': True,
+        'kind': 'item',
+        'id': krone.id,
+        'name': 'Krone',
+        'type': 'Requisite',
+        'location_path': ['Theater', 'Fundus'],
+        'thumbnail_url': '/static/blobs/ab/cd/.thumbs/abcd.jpg.128.jpg'
+    }
+
+    response = client.get(f"/api/scan/location:{stage['fundus'].id}", headers=auth_headers)
+    assert response.json['kind'] == 'location'
+    assert response.json['location_path'] == ['Theater', 'Fundus']
+    assert response.json['thumbnail_url'] is None
+
+    assert client.get(f'/api/scan/location:{krone.id}', headers=auth_headers).status_code == 404
+
+def test_batch_scan_uses_one_query_and_keeps_order(client, auth_headers, stage):
+    codes = [f"location:{stage['haus'].id}", 'item:unknown', stage['krone'].id]
+    client.post('/api/scan', headers=auth_headers, json={'codes': codes})
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        response = client.post('/api/scan', headers=auth_headers, json={'codes': codes})
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    assert [(result['found'], result.get('name')) for result in response.json['results']] == \
+        [(True, 'Theater'), (False, None), (True, 'Krone')]
+    assert len([statement for statement in statements if 'UNION ALL' in statement]) == 1
+
+    # Renaming a location shows up in the cached paths
+    stage['haus'].name = 'Stadttheater'
+    db.session.commit()
+    response = client.get(f"/api/scan/item:{stage['krone'].id}", headers=auth_headers)
+    assert response.json['location_path'] == ['Stadttheater', 'Fundus']
+
+    assert client.post('/api/scan', headers=auth_headers, json={'codes': 'item:1'}).status_code == 400
@@ -0,0 +1,90 @@
+import sqlite3
+import pytest
+from models import db, Item, ItemType, ItemProperty, Location, Tag
+from search import index_items, match_expression
+
+@pytest.fixture
+def costumes(client, auth_headers):
+    kostuem = ItemType(name='Historisches Kostüm')
+    kostuem.properties.append(ItemProperty(name='Material', property_type='text'))
+    requisite = ItemType(name='Requisite')
+    db.session.add_all([kostuem, requisite, Location(name='Schneiderei')])
+    db.session.commit()
+    material = kostuem.properties[0]
+
+    def create(name, item_type, material_value=None):
+        payload = {'name': name, 'item_type_id': item_type.id}
+        if material_value:
+            payload['property_values'] = [{'property_id': material.id, 'value': material_value}]
+        response = client.post('/api/items', json=payload, headers=auth_headers)
+        assert response.status_code == 201
+        return response.json['id']
+
+    return {
+        'ballkleid': create('Rokoko Ballkleid', kostuem, 'Seide, Spitze'),
+        'gewandung': create('Mittelalter Gewandung', kostuem, 'Leinen, Wolle'),
+        'maske': create('Venezianische Maske', requisite),
+        'kostuem_type': kostuem,
+    }
+
+def search(client, headers, term, **params):
+    response = client.get('/api/items', query_string={'search': term, **params}, headers=headers)
+    assert response.status_code == 200
+    return response.json
+
+def test_match_expression_folds_umlauts():
+    assert match_expression('Kostüm Größe') == '"kostuem"* "groesse"*'
+    assert match_expression('  !! ') is None
+
+def test_search_folds_umlauts_and_type_names(client, auth_headers, costumes):
+    names = {item['name'] for item in search(client, auth_headers, 'Kostuem')}
+    assert names == {'Rokoko Ballkleid', 'Mittelalter Gewandung'}
+
+def test_search_matches_text_property_values(client, auth_headers, costumes):
+    assert [item['id'] for item in search(client, auth_headers, 'seide')] == [costumes['ballkleid']]
+
+def test_search_ranks_name_matches_first(client, auth_headers, costumes):
+    response = client.post('/api/items', headers=auth_headers, json={
+        'name': 'Maske aus Seide', 'item_type_id': costumes['kostuem_type'].id
+    })
+    results = search(client, auth_headers, 'seide')
+    assert [item['name'] for item in results] == ['Maske aus Seide', 'Rokoko Ballkleid']
+
+    page = search(client, auth_headers, 'seide', limit=1)
+    assert page['items'][0]['name'] == 'Maske aus Seide'
+    rest = search(client, auth_headers, 'seide', limit=1, cursor=page['next_cursor'])
+    assert [item['name'] for item in rest['items']] == ['Rokoko Ballkleid']
+    assert rest['next_cursor'] is None
+
+def test_search_index_follows_updates_and_deletes(client, auth_headers, costumes):
+    item_id = costumes['maske']
+    client.put(f'/api/items/{item_id}', json={'name': 'Pestdoktor Maske'}, headers=auth_headers)
+    assert [item['id'] for item in search(client, auth_headers, 'pestdoktor')] == [item_id]
+    assert search(client, auth_headers, 'venezianische') == []
+
+    client.delete(f'/api/items/{item_id}', headers=auth_headers)
+    assert search(client, auth_headers, 'pestdoktor') == []
+
+def test_search_index_survives_renumbered_rowids(client, auth_headers, costumes):
+    client.delete(f"/api/items/{costumes['ballkleid']}", headers=auth_headers)
+    db.session.commit()
+    # VACUUM or a table rebuild may renumber the implicit rowids of items
+    other = sqlite3.connect(db.engine.url.database)
+    with other:
+        other.execute('UPDATE items SET rowid = -rowid')
+    other.close()
+
+    assert [item['id'] for item in search(client, auth_headers, 'maske')] == [costumes['maske']]
+    assert [item['id'] for item in search(client, auth_headers, 'leinen')] == [costumes['gewandung']]
+    client.delete(f"/api/items/{costumes['maske']}", headers=auth_headers)
+    assert search(client, auth_headers, 'maske') == []
+    assert [item['id'] for item in search(client, auth_headers, 'gewandung')] == [costumes['gewandung']]
+
+def test_search_index_covers_tags_and_locations(client, auth_headers, costumes):
+    item = db.session.get(Item, costumes['gewandung'])
+    item.tags.append(Tag(name='Faust'))
+    item.location = Location.query.filter_by(name='Schneiderei').one()
+    index_items([item.id])
+    db.session.commit()
+
+    assert [i['id'] for i in search(client, auth_headers, 'faust schneiderei')] == [item.id]
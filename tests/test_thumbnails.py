@@ -0,0 +1,75 @@
+import io
+import os
+import pytest
+from PIL import Image
+from models import db, Item, ItemType, ItemFile
+from file_manifest import absolute_storage_path
+from thumbnails import thumbnail_path
+from jobs import job_queue
+
+@pytest.fixture
+def item(app):
+    item = Item(name='Venezianische Maske', item_type=ItemType(name='Requisite'))
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+def image_path(item_id, name):
+    return absolute_storage_path(ItemFile.query.filter_by(item_id=item_id, original_filename=name).one().filename)
+
+def image_bytes(size, image_format='JPEG', color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, image_format)
+    return buffer.getvalue()
+
+def upload_image(client, headers, item_id, name, content):
+    return client.post(f'/api/items/{item_id}/image', headers=headers, content_type='multipart/form-data',
+                       data={'image': (io.BytesIO(content), name)})
+
+def test_upload_renders_thumbnails_in_all_sizes(client, auth_headers, item):
+    assert upload_image(client, auth_headers, item.id, 'maske.jpg', image_bytes((2000, 1500))).status_code == 200
+    assert job_queue.join(timeout=30)
+    original = image_path(item.id, f'{item.id}.jpg')
+    for size in (128, 512, 1280):
+        for thumbnail_format in ('jpeg', 'webp'):
+            with Image.open(thumbnail_path(original, size, thumbnail_format)) as thumbnail:
+                assert max(thumbnail.size) == size
+                assert thumbnail.size[0] > thumbnail.size[1]
+
+def test_size_parameter_serves_negotiated_thumbnail(client, auth_headers, item):
+    upload_image(client, auth_headers, item.id, 'maske.jpg', image_bytes((2000, 1500)))
+
+    response = client.get(f'/api/items/{item.id}/image?size=300',
+                          headers={**auth_headers, 'Accept': 'image/webp,*/*'})
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'Accept' in response.headers['Vary']
+    assert Image.open(io.BytesIO(response.data)).size == (512, 384)
+
+    response = client.get(f'/api/items/{item.id}/files/{item.id}.jpg?size=100&format=jpeg', headers=auth_headers)
+    assert response.mimetype == 'image/jpeg'
+    assert Image.open(io.BytesIO(response.data)).size == (128, 96)
+
+    response = client.get(f'/api/items/{item.id}/image', headers=auth_headers)
+    assert Image.open(io.BytesIO(response.data)).size == (2000, 1500)
+
+    response = client.get(f'/api/items/{item.id}/image?size=100&format=gif', headers=auth_headers)
+    assert response.status_code == 400
+
+def test_replacing_the_image_replaces_thumbnails(client, auth_headers, item):
+    upload_image(client, auth_headers, item.id, 'maske.jpg', image_bytes((800, 600)))
+    assert job_queue.join(timeout=30)
+    jpeg = image_path(item.id, f'{item.id}.jpg')
+    assert os.path.exists(thumbnail_path(jpeg, 128, 'jpeg'))
+
+    upload_image(client, auth_headers, item.id, 'maske.png', image_bytes((300, 600), 'PNG', 'blue'))
+    assert not os.path.exists(thumbnail_path(jpeg, 128, 'jpeg'))
+
+    response = client.get(f'/api/items/{item.id}/image?size=512&format=jpeg', headers=auth_headers)
+    with Image.open(io.BytesIO(response.data)) as thumbnail:
+        assert thumbnail.size == (256, 512)
+        assert thumbnail.getpixel((10, 10))[2] > 200
+
+    # Smaller originals are not upscaled
+    response = client.get(f'/api/items/{item.id}/image?size=1280&format=jpeg', headers=auth_headers)
+    assert Image.open(io.BytesIO(response.data)).size == (300, 600)
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import pytest
+import upload_sessions
+from models import db, Item, ItemType, ItemFile, UploadSession
+from file_manifest import absolute_storage_path
+
+CONTENT = bytes(range(256)) * 40
+
+@pytest.fixture
+def item(app):
+    item = Item(name='Bühnenplan', item_type=ItemType(name='Dokument'))
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+def start(client, headers, item_id, size=len(CONTENT), filename='buehnenplan.pdf'):
+    return client.post(f'/api/items/{item_id}/uploads', headers=headers,
+                       json={'filename': filename, 'size': size})
+
+def put_chunk(client, headers, upload_id, start, end, data=None):
+    return client.put(f'/api/uploads/{upload_id}', data=CONTENT[start:end] if data is None else data,
+                      headers={**headers, 'Content-Range': f'bytes {start}-{end - 1}/{len(CONTENT)}'})
+
+def test_chunked_upload_is_stored_as_item_file(client, auth_headers, item, app):
+    response = start(client, auth_headers, item.id)
+    assert response.status_code == 201
+    upload_id = response.json['id']
+    assert response.json['offset'] == 0
+
+    for chunk_start in range(0, len(CONTENT), 4000):
+        response = put_chunk(client, auth_headers, upload_id, chunk_start, min(chunk_start + 4000, len(CONTENT)))
+        assert response.status_code == 200
+        # Another process continuing the upload hashes the part on disk again
+        upload_sessions._hashers.clear()
+    assert response.json['offset'] == len(CONTENT)
+
+    response = client.post(f'/api/uploads/{upload_id}/complete', headers=auth_headers,
+                           json={'sha256': hashlib.sha256(CONTENT).hexdigest()})
+    assert response.status_code == 200
+    assert response.json['file']['original_filename'] == 'buehnenplan.pdf'
+    assert response.json['file']['size'] == len(CONTENT)
+    with open(absolute_storage_path(ItemFile.query.one().filename), 'rb') as f:
+        assert f.read() == CONTENT
+    assert UploadSession.query.count() == 0
+    assert not os.listdir(os.path.join(app.config['BLOBS_FOLDER'], 'tmp'))
+
+def test_interrupted_chunk_resumes_from_reported_offset(client, auth_headers, item):
+    upload_id = start(client, auth_headers, item.id).json['id']
+    assert put_chunk(client, auth_headers, upload_id, 0, 5000).status_code == 200
+
+    # The connection dropped after 1000 of 5000 bytes
+    response = put_chunk(client, auth_headers, upload_id, 5000, 10000, data=CONTENT[5000:6000])
+    assert response.status_code == 400
+    assert response.json['offset'] == 6000
+
+    response = put_chunk(client, auth_headers, upload_id, 0, 5000)
+    assert response.status_code == 409
+    assert response.json['offset'] == 6000
+
+    offset = client.get(f'/api/uploads/{upload_id}', headers=auth_headers).json['offset']
+    assert put_chunk(client, auth_headers, upload_id, offset, len(CONTENT)).status_code == 200
+    response = client.post(f'/api/uploads/{upload_id}/complete', headers=auth_headers,
+                           json={'sha256': hashlib.sha256(CONTENT).hexdigest()})
+    assert response.status_code == 200
+
+def test_incomplete_oversized_and_corrupt_uploads_are_rejected(client, auth_headers, item, app):
+    response = start(client, auth_headers, item.id, size=app.config['MAX_UPLOAD_SIZE'] + 1)
+    assert response.status_code == 413
+    assert start(client, auth_headers, item.id, filename='skript.exe').status_code == 400
+
+    upload_id = start(client, auth_headers, item.id).json['id']
+    put_chunk(client, auth_headers, upload_id, 0, 5000)
+    response = client.post(f'/api/uploads/{upload_id}/complete', headers=auth_headers)
+    assert response.status_code == 409
+
+    put_chunk(client, auth_headers, upload_id, 5000, len(CONTENT))
+    response = client.post(f'/api/uploads/{upload_id}/complete', headers=auth_headers, json={'sha256': '0' * 64})
+    assert response.status_code == 400
+
+    assert client.delete(f'/api/uploads/{upload_id}', headers=auth_headers).status_code == 200
+    assert UploadSession.query.count() == 0
+    assert ItemFile.query.count() == 0